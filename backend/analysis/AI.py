@@ -4,19 +4,53 @@
 # Here we will connect with an OpenAI through its SDK. This will allow us to directly access a 
 # functionality that ChatGPT would directly do.
 
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from openai import OpenAI, AuthenticationError # pip install openai
 from backend.utils.support import get_secret
+from backend.utils.rate_limit import RateLimiter
+from backend.analysis.cache import PromptCache, fingerprint
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+def build_summary_prompt(ticker:str, stats:dict) -> str:
+    '''
+    The prompt used to ask for the commentary of a single ticker.
+    '''
+    return (
+        f"Give a short analysis of {ticker} based on these summary statistics "
+        f"(mean, std, median, low, max per OHLCV column): {json.dumps(stats, sort_keys=True, default=str)}"
+    )
 
 class AI:
     
-    def __init__(self) -> None:
+    def __init__(self, client=None, model:str = DEFAULT_MODEL, cache:PromptCache = None, rate_limiter:RateLimiter = None) -> None:
+        '''
+        Parameters:
+        - client: An already built client. When omitted, an OpenAI client is created from the OPENAI_KEY secret.
+          The same client (and its connection pool) is reused by every request, including concurrent ones.
+        - model: Chat model used for every request.
+        - cache: Optional PromptCache. Repeated prompts are answered from it instead of the API.
+        - rate_limiter: Optional RateLimiter shared by all requests sent through `request_many`/`stream_many`.
+        '''
+        self.model = model
+        self.cache = cache
+        self.rate_limiter = rate_limiter
         
-        self.key = get_secret("OPENAI_KEY")
-        self.client = self.__set_client()
+        if client is None:
+            self.key = get_secret("OPENAI_KEY")
+            self.client = self.__set_client()
+        else:
+            self.key = None
+            self.client = client
 
     def __set_client(self):
         try:
-            return # TODO: we are accessing the client via OpenAI SDK
+            return OpenAI(api_key=self.key)
         except Exception as error:
             print(f"Error ocurred when intializing the client. Error: {error}")
     
@@ -30,27 +64,269 @@ class AI:
             return True
         return False
     
-    def request_query(self, prompt):
+    def request_query(self, prompt, ticker:str = None, stats:dict = None, use_cache:bool = True, timeout:float = None):
+        '''
+        Sends one prompt and returns {"message": ..., "response": content}.
         
+        With a cache, the answer is looked up by model + normalized prompt first. Passing the
+        `ticker` and the `stats` the prompt was built from ties the cached answer to them, so it is
+        no longer served once the statistics change. New answers are only marked in the cache; call
+        `self.cache.flush()` to write them out (batches and fan-outs do so once when they finish).
+        '''
         if not self.client:
             return {"message": "There was an error getting OpenAI client started", "response": {}}
         if not prompt:
             return {"message": "Prompt set is invalid", "response":{}}
+        
+        key = PromptCache.key(self.model, prompt)
+        stats_fingerprint = fingerprint(stats) if stats is not None else None
+        use_cache = use_cache and self.cache is not None
+        
+        if use_cache:
+            cached = self.cache.get(key, stats_fingerprint)
+            if cached is not None:
+                return {"message": "success", "response": cached, "cached": True}
+        
         try:
-            # TODO: Use our client to access a response given the prompt.
-            # validate response using our method
-            content = ...
-            return {"message": "success", "response" : content}
+            options = {"timeout": timeout} if timeout is not None else {}
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                **options
+            )
+            content = completion.choices[0].message.content
+            result = {"message": "success", "response" : content}
         
         except AuthenticationError:
             return {"message":"API key is incorrect. Authentication is invalid", "response":{}}
         except Exception:
             return {"message":"There was an error initializing the prompt.", "response":{}}
-
         
+        if use_cache and self.__is_valid_response(result):
+            self.cache.put(key, content, ticker=ticker, stats_fingerprint=stats_fingerprint)
         
+        return result
     
+    def request_summaries(self, summaries:dict, batch_size:int = 20) -> dict:
+        '''
+        Asks for the commentary of many tickers using as few requests as possible.
+        
+        Cached answers are reused. The remaining tickers are grouped `batch_size` at a time into one
+        structured request that must answer with a JSON object keyed by ticker, and that answer is
+        split back out and cached per ticker (under the same key a single `request_query` would use).
+        
+        Parameters:
+        - summaries: ticker -> statistics dictionary (e.g. the output of `get_data_details` for that ticker)
+        - batch_size: Maximum number of tickers per request
+        
+        Returns:
+        - ticker -> {"message": ..., "response": ...}
+        '''
+        results = {}
+        missing = []
+        
+        for ticker, stats in summaries.items():
+            prompt = build_summary_prompt(ticker, stats)
+            cached = self.cache.get(PromptCache.key(self.model, prompt), fingerprint(stats)) if self.cache is not None else None
+            if cached is not None:
+                results[ticker] = {"message": "success", "response": cached, "cached": True}
+            else:
+                missing.append(ticker)
+        
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            prompt = (
+                "Answer with a single JSON object whose keys are exactly the tickers below and whose values "
+                "are the analysis text for that ticker. Do not add any other text.\n\n"
+                + "\n".join(build_summary_prompt(ticker, summaries[ticker]) for ticker in batch)
+            )
+            
+            # the combined prompt itself is never cached, only the per-ticker answers
+            response = self.request_query(prompt, use_cache=False)
+            if not self.__is_valid_response(response):
+                answers, failure = {}, response["message"]
+            else:
+                answers = self.__split_batch(response)
+                failure = "Ticker missing from batched answer" if answers else "Batched answer could not be parsed"
             
+            for ticker in batch:
+                content = answers.get(ticker)
+                if content is None:
+                    results[ticker] = {"message": failure, "response": {}}
+                    continue
+                
+                results[ticker] = {"message": "success", "response": content}
+                if self.cache is not None:
+                    stats = summaries[ticker]
+                    key = PromptCache.key(self.model, build_summary_prompt(ticker, stats))
+                    self.cache.put(key, content, ticker=ticker, stats_fingerprint=fingerprint(stats))
+        
+        if self.cache is not None:
+            self.cache.flush()
         
+        return results
     
-    
\ No newline at end of file
+    # ___________________ Streaming & Fan-out ___________________ #
+    
+    def stream_query(self, prompt, on_token=None, cancel_event:threading.Event = None, timeout:float = None):
+        '''
+        Sends one prompt as a streaming request and hands every partial token to `on_token` as it arrives.
+        
+        Parameters:
+        - prompt: The prompt to send
+        - on_token: Optional callable(token) invoked for each piece of text
+        - cancel_event: Setting this event stops reading the stream; the partial text is returned
+        - timeout: Seconds the whole request may take
+        
+        Returns:
+        - {"message": "success" | "cancelled" | "timeout" | error, "response": text received so far}
+        '''
+        if not self.client:
+            return {"message": "There was an error getting OpenAI client started", "response": {}}
+        if not prompt:
+            return {"message": "Prompt set is invalid", "response":{}}
+        
+        key = PromptCache.key(self.model, prompt)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if on_token:
+                    on_token(cached)
+                return {"message": "success", "response": cached, "cached": True}
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pieces = []
+        status = "success"
+        
+        try:
+            options = {"timeout": timeout} if timeout is not None else {}
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **options
+            )
+            
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    status = "cancelled"
+                elif deadline is not None and time.monotonic() > deadline:
+                    status = "timeout"
+                if status != "success":
+                    if hasattr(stream, "close"):
+                        stream.close()
+                    break
+                
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    pieces.append(token)
+                    if on_token:
+                        on_token(token)
+        
+        except AuthenticationError:
+            return {"message":"API key is incorrect. Authentication is invalid", "response":{}}
+        except Exception:
+            return {"message":"There was an error initializing the prompt.", "response": "".join(pieces)}
+        
+        content = "".join(pieces)
+        if status == "success" and self.cache is not None:
+            self.cache.put(key, content)
+        
+        return {"message": status, "response": content}
+    
+    def request_many(self, prompts:dict, concurrency:int = 8, timeout:float = 60, on_token=None, cancel_event:threading.Event = None, on_result=None) -> dict:
+        '''
+        Fans many prompts out over a bounded pool of worker threads that share one client.
+        
+        Parameters:
+        - prompts: key (e.g. ticker) -> prompt
+        - concurrency: Maximum number of requests in flight at once
+        - timeout: Seconds each single request may take
+        - on_token: Optional callable(key, token). When given, requests are streamed and tokens are
+          forwarded as they arrive; otherwise plain requests are sent.
+        - cancel_event: Setting this event stops pending requests and cuts running streams short
+        - on_result: Optional callable(key, result) invoked as soon as each prompt finishes
+        
+        Returns:
+        - key -> {"message": ..., "response": ...}
+        '''
+        cancel_event = cancel_event or threading.Event()
+        
+        def run(key, prompt):
+            if cancel_event.is_set():
+                return {"message": "cancelled", "response": {}}
+            if self.rate_limiter and not self.rate_limiter.acquire(timeout=timeout, cancel_event=cancel_event):
+                return {"message": "cancelled" if cancel_event.is_set() else "timeout", "response": {}}
+            
+            if on_token:
+                return self.stream_query(prompt, lambda token: on_token(key, token), cancel_event, timeout)
+            return self.request_query(prompt, timeout=timeout)
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+            futures = {pool.submit(run, key, prompt): key for key, prompt in prompts.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                results[key] = future.result()
+                if on_result:
+                    on_result(key, results[key])
+        
+        # one write for the whole fan-out rather than one per answer
+        if self.cache is not None:
+            self.cache.flush()
+        
+        return {key: results[key] for key in prompts}
+    
+    def stream_many(self, prompts:dict, concurrency:int = 8, timeout:float = 60):
+        '''
+        Generator version of `request_many` for callers that forward tokens (e.g. to the frontend).
+        
+        Yields ("token", key, text) events as tokens arrive and one ("done", key, result) event per prompt.
+        Closing the generator early cancels everything that is still running.
+        '''
+        events = queue.Queue()
+        cancel_event = threading.Event()
+        
+        def on_token(key, token):
+            events.put(("token", key, token))
+        
+        def on_result(key, result):
+            events.put(("done", key, result))
+        
+        def produce():
+            try:
+                self.request_many(prompts, concurrency, timeout, on_token, cancel_event, on_result)
+            finally:
+                events.put(None)
+        
+        worker = threading.Thread(target=produce, daemon=True)
+        worker.start()
+        
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            cancel_event.set()
+    
+    def __split_batch(self, response) -> dict:
+        text = response["response"].strip()
+        
+        # models like to wrap JSON in a markdown fence
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.index("\n") + 1:] if "\n" in text else text
+        
+        try:
+            answers = json.loads(text)
+        except ValueError:
+            print("Batched answer was not valid JSON")
+            return {}
+        
+        if not isinstance(answers, dict):
+            return {}
+        return {str(ticker): str(content) for ticker, content in answers.items()}
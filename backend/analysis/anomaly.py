@@ -0,0 +1,190 @@
+
+# _____________________________________ Anomaly Detection _____________________________________ #
+
+# Streaming detector for price and volume shocks. Every ticker keeps a handful of numbers: exponentially
+# weighted (EWMA) mean and variance of its close-to-close log returns and of its log volume. A new bar is
+# scored against the state *before* it is folded in, so checking a bar costs O(1) and never rereads history.
+#
+# The state is a plain dictionary, so it can be saved to disk (or into the Commander snapshot) and
+# detection carries on after a restart from where it stopped.
+
+import json
+import math
+import queue
+import time
+
+from backend.utils.snapshot import write_json_atomic
+
+
+class AnomalyDetector:
+    '''
+    Per-ticker EWMA z-score detector.
+
+    Parameters:
+    - alpha (float): EWMA weight of the newest observation. 2 / (span + 1), e.g. 0.05 ~ a 39 bar span.
+    - z_threshold (float): |z| of a return at or above which a 'price' alert is raised.
+    - volume_threshold (float): z of log volume at or above which a 'volume' alert is raised (spikes only).
+    - warmup (int): Bars a ticker must have seen before it can raise alerts.
+    - volume_field (str): Bar key holding the volume, 'volume' for stocks and 'volumeto' for crypto.
+    - sink: Where alerts go besides being returned. A queue (anything with `put_nowait`) or a callable.
+      A queue must have a consumer: once it is full, further alerts only count in `dropped`.
+
+    Example:
+    - detector = AnomalyDetector(sink=queue.Queue(maxsize=10_000))
+    - detector.update('IBM', {'time': 1717200000, 'close': 170.2, 'volume': 3_100_000})
+    '''
+
+    # position of each value in a ticker's state list
+    FIELDS = ('count', 'last_time', 'last_close', 'return_mean', 'return_var', 'volume_mean', 'volume_var')
+
+    def __init__(self, alpha:float = 0.05, z_threshold:float = 4.0, volume_threshold:float = 4.0, warmup:int = 20,
+                 volume_field:str = 'volume', sink=None) -> None:
+
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be between 0 and 1")
+
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.volume_threshold = volume_threshold
+        self.warmup = warmup
+        self.volume_field = volume_field
+        self.sink = sink
+
+        self.state:dict = {}
+        self.dropped = 0 # alerts a full queue could not take
+
+    # ___________________ Detection ___________________ #
+
+    def update(self, ticker:str, bar:dict) -> list:
+        '''
+        Scores one bar and folds it into the ticker's state.
+        Bars that are not newer than the last seen bar are ignored, so refetched history is harmless.
+
+        Parameters:
+        - ticker: The symbol the bar belongs to
+        - bar: Dictionary with 'time' (epoch seconds), 'close' and the volume field
+
+        Returns:
+        - List of alert dictionaries (empty when the bar is normal)
+        '''
+        state = self.state.get(ticker)
+        close = bar.get('close')
+        if close is None or close <= 0:
+            return []
+
+        if state is None:
+            self.state[ticker] = [1, bar['time'], close, 0.0, 0.0, *self.__volume_start(bar)]
+            return []
+        if bar['time'] <= state[1]:
+            return []
+
+        alerts = []
+        alpha = self.alpha
+        ready = state[0] >= self.warmup
+
+        # price: log return against the previous close
+        change = math.log(close / state[2])
+        diff = change - state[3]
+        if ready and state[4] > 0:
+            z = diff / math.sqrt(state[4])
+            if abs(z) >= self.z_threshold:
+                alerts.append(self.__alert(ticker, bar, 'price', change, z, state[3], state[4]))
+        increment = alpha * diff
+        state[3] += increment
+        state[4] = (1 - alpha) * (state[4] + diff * increment)
+
+        # volume: log volume, one-sided because only spikes are interesting
+        volume = bar.get(self.volume_field)
+        if volume is not None and volume >= 0:
+            value = math.log1p(volume)
+            if state[5] is None:
+                state[5], state[6] = value, 0.0
+            else:
+                diff = value - state[5]
+                if ready and state[6] > 0:
+                    z = diff / math.sqrt(state[6])
+                    if z >= self.volume_threshold:
+                        alerts.append(self.__alert(ticker, bar, 'volume', volume, z, math.expm1(state[5]), state[6]))
+                increment = alpha * diff
+                state[5] += increment
+                state[6] = (1 - alpha) * (state[6] + diff * increment)
+
+        state[0] += 1
+        state[1] = bar['time']
+        state[2] = close
+
+        for alert in alerts:
+            self.__emit(alert)
+        return alerts
+
+    def update_many(self, ticker:str, bars:list) -> list:
+        '''
+        Feeds bars of one ticker oldest first. Returns every alert raised.
+        '''
+        alerts = []
+        for bar in sorted(bars, key=lambda bar: bar['time']):
+            alerts.extend(self.update(ticker, bar))
+        return alerts
+
+    # ___________________ Persistence ___________________ #
+
+    def to_dict(self) -> dict:
+        return {
+            'settings': {
+                'alpha': self.alpha,
+                'z_threshold': self.z_threshold,
+                'volume_threshold': self.volume_threshold,
+                'warmup': self.warmup,
+                'volume_field': self.volume_field,
+            },
+            # list() snapshots the items in one step, so another thread may keep updating while this is saved
+            'state': {ticker: list(values) for ticker, values in list(self.state.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data:dict, sink=None) -> "AnomalyDetector":
+        detector = cls(sink=sink, **data['settings'])
+        detector.state = {ticker: list(values) for ticker, values in data['state'].items()}
+        return detector
+
+    def save(self, path:str):
+        '''
+        Writes the settings and per-ticker state to a JSON file (atomically).
+        '''
+        write_json_atomic(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path:str, sink=None) -> "AnomalyDetector":
+        with open(path, encoding="utf-8") as file:
+            return cls.from_dict(json.load(file), sink=sink)
+
+    # ___________________ Support ___________________ #
+
+    def __volume_start(self, bar:dict):
+        volume = bar.get(self.volume_field)
+        if volume is None or volume < 0:
+            return None, None
+        return math.log1p(volume), 0.0
+
+    def __alert(self, ticker:str, bar:dict, kind:str, value:float, z:float, mean:float, var:float) -> dict:
+        return {
+            'ticker': ticker,
+            'time': bar['time'],
+            'kind': kind,
+            'value': value,
+            'zscore': z,
+            'mean': mean,
+            'std': math.sqrt(var),
+            'detected_at': time.time(),
+        }
+
+    def __emit(self, alert:dict):
+        if self.sink is None:
+            return
+        if hasattr(self.sink, 'put_nowait'):
+            try:
+                self.sink.put_nowait(alert)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.sink(alert)
@@ -0,0 +1,185 @@
+
+# _____________________________________ Prompt Cache _____________________________________ #
+
+# Responses from the AI are cached so that re-asking the same ticker summary after a refresh
+# does not cost another API call. Entries are bounded by age (TTL) and by count (LRU) and can be
+# persisted to a JSON file. An entry can be tied to a ticker and to a fingerprint of the ticker
+# statistics it was produced from, so it stops being served once those statistics change.
+#
+# Writing the file rewrites and fsyncs all of it, so changes are only marked dirty as they happen and
+# written by `flush()`: once at the end of a batch or fan-out (see AI), or at interpreter exit.
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from backend.utils.snapshot import write_json_atomic
+
+# file-backed caches still alive, flushed when the interpreter exits
+_PERSISTED = weakref.WeakSet()
+
+
+def normalize_prompt(prompt:str) -> str:
+    '''
+    Collapses whitespace so that formatting differences do not produce different cache keys.
+    '''
+    return " ".join(prompt.split())
+
+
+def fingerprint(stats) -> str:
+    '''
+    Returns a stable hash of JSON-serializable ticker statistics.
+    '''
+    payload = json.dumps(stats, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    '''
+    LRU + TTL cache of AI responses.
+
+    Parameters:
+    - path (str): Optional JSON file the cache is loaded from and saved to.
+    - ttl (float): Seconds an entry stays valid. None keeps entries until evicted.
+    - max_entries (int): Least recently used entries are evicted past this size.
+    - clock (callable): Source of the current time, mostly useful for tests.
+
+    One cache may be shared by many threads (e.g. the workers of `AI.request_many`); every method that
+    reads or changes the entries holds the cache's lock.
+    '''
+
+    def __init__(self, path:str = None, ttl:float = 24 * 60 * 60, max_entries:int = 1024, clock=time.time) -> None:
+
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self.entries:OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False # entries changed since the file was last written
+        self.__lock = threading.Lock()
+        self.__save_lock = threading.Lock()
+
+        if path:
+            if os.path.exists(path):
+                self.load()
+            _PERSISTED.add(self)
+
+    @staticmethod
+    def key(model:str, prompt:str) -> str:
+        return hashlib.sha256(f"{model}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    # ___________________ Access ___________________ #
+
+    def get(self, key:str, stats_fingerprint:str = None):
+        '''
+        Returns the cached content, or None if missing, expired or produced from other statistics.
+        '''
+        with self.__lock:
+            entry = self.entries.get(key)
+
+            if entry is None or self.__is_expired(entry) or (stats_fingerprint and entry["fingerprint"] != stats_fingerprint):
+                if entry is not None:
+                    del self.entries[key]
+                    self.dirty = True
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["content"]
+
+    def put(self, key:str, content, ticker:str = None, stats_fingerprint:str = None):
+        with self.__lock:
+            self.entries[key] = {
+                "content": content,
+                "created": self.clock(),
+                "ticker": ticker,
+                "fingerprint": stats_fingerprint,
+            }
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def invalidate(self, ticker:str) -> int:
+        '''
+        Drops every entry tied to a ticker. Returns how many were removed.
+        '''
+        with self.__lock:
+            stale = [key for key, entry in self.entries.items() if entry["ticker"] == ticker]
+            for key in stale:
+                del self.entries[key]
+            self.dirty = self.dirty or bool(stale)
+            return len(stale)
+
+    def clear(self):
+        with self.__lock:
+            self.entries.clear()
+            self.dirty = True
+
+    # ___________________ Persistence ___________________ #
+
+    def save(self):
+        '''
+        Writes the live entries to `self.path`. The file is replaced atomically, so a crash
+        mid-write never leaves a truncated cache behind.
+        '''
+        if not self.path:
+            return
+
+        # concurrent saves are written in order, so an older copy never replaces a newer one
+        with self.__save_lock:
+            with self.__lock:
+                live = [[key, entry] for key, entry in self.entries.items() if not self.__is_expired(entry)]
+                self.dirty = False
+            try:
+                write_json_atomic(self.path, live)
+            except Exception:
+                self.dirty = True
+                raise
+
+    def flush(self):
+        '''
+        Saves the cache if anything changed since the last save.
+        '''
+        if self.dirty:
+            self.save()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                entries = json.load(file)
+        except (OSError, ValueError) as error:
+            print(f"Could not load prompt cache from {self.path}. Starting empty. Error: {error}")
+            return
+
+        with self.__lock:
+            self.entries = OrderedDict((key, entry) for key, entry in entries if not self.__is_expired(entry))
+            self.dirty = False
+
+    # ___________________ Support ___________________ #
+
+    def __is_expired(self, entry:dict) -> bool:
+        return self.ttl is not None and self.clock() - entry["created"] > self.ttl
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.entries)
+
+
+@atexit.register
+def _flush_persisted():
+    for cache in list(_PERSISTED):
+        try:
+            cache.flush()
+        except Exception as error:
+            print(f"Could not save prompt cache to {cache.path}. Error: {error}")
@@ -0,0 +1,186 @@
+
+# _____________________________________ Correlation _____________________________________ #
+
+# Portfolio level view of the universe. Stocks and crypto are put on one calendar, turned into
+# log returns and summarized as covariance/correlation matrices with plain NumPy matrix products.
+#
+# The engine never keeps the matrices themselves as state. It keeps additive sums (pair counts,
+# pair sums, pair sums of squares and cross products), so new bars are folded in with O(k·N²)
+# work for k new rows instead of recomputing O(N²·T) over the whole history.
+
+import numpy as np
+import pandas as pd
+
+
+def align_prices(series:dict, calendar:str = 'business') -> pd.DataFrame:
+    '''
+    Puts the close series of many assets on one common date index.
+
+    Parameters:
+    - series (dict): ticker -> pd.Series of closes indexed by date/datetime
+    - calendar (str): 'business' keeps weekdays only, so crypto weekend moves fold into Monday's
+      return. 'daily' keeps every calendar day (7 days a week).
+
+    Returns:
+    - pd.DataFrame: one column per ticker, NaN where an asset did not trade that day
+    '''
+    if calendar not in ('business', 'daily'):
+        raise ValueError(f"Unknown calendar '{calendar}'. Use 'business' or 'daily'")
+
+    columns = {}
+    for ticker, closes in series.items():
+        index = pd.DatetimeIndex(pd.to_datetime(closes.index))
+        if index.tz is not None:
+            index = index.tz_convert(None)
+        closes = pd.Series(np.asarray(closes, dtype=float), index=index.normalize())
+        # keep the last print of a day if intraday bars were passed in
+        columns[ticker] = closes[~closes.index.duplicated(keep='last')]
+
+    prices = pd.DataFrame(columns).sort_index()
+    if calendar == 'business':
+        prices = prices[prices.index.dayofweek < 5]
+
+    return prices
+
+
+class CorrelationEngine:
+    '''
+    Incrementally maintained covariance and correlation matrices of log returns.
+
+    Pairs are computed on pairwise complete observations, the same rule `DataFrame.corr()` uses,
+    so assets with different histories (a coin listed last year, a stock holiday) do not shrink
+    everyone else's sample.
+
+    Parameters:
+    - window (int): Number of most recent return rows to use. None keeps the whole history.
+    - min_periods (int): Pairs with fewer overlapping returns than this come back as NaN.
+    '''
+
+    def __init__(self, window:int = None, min_periods:int = 2) -> None:
+
+        self.window = window
+        self.min_periods = max(min_periods, 2)
+
+        self.tickers:list = []
+        self.last_date = None
+
+        self.__last_log_price = np.empty(0)
+        self.__sums = np.zeros((4, 0, 0)) # pair count, pair sum, pair sum of squares, cross products
+        self.__rows = np.empty((0, 0))    # returns still inside the rolling window
+        self.__cache:dict = {}
+
+    # ___________________ Updates ___________________ #
+
+    def update(self, prices:pd.DataFrame) -> int:
+        '''
+        Folds new aligned price rows (see `align_prices`) into the matrices.
+        Rows at or before the last seen date are ignored, so the same frame can be fed again safely.
+        Columns never seen before are added as new assets.
+
+        Returns:
+        - int: the number of return rows that were added
+        '''
+        if self.last_date is not None:
+            prices = prices[prices.index > self.last_date]
+        if prices.empty:
+            return 0
+
+        self.__add_tickers([ticker for ticker in prices.columns if ticker not in self.__positions()])
+
+        positions = self.__positions()
+        log_prices = np.full((len(prices), len(self.tickers)), np.nan)
+        log_prices[:, [positions[ticker] for ticker in prices.columns]] = np.log(prices.to_numpy(dtype=float))
+
+        # each return is taken against the previous *observed* price, so a move over a holiday
+        # lands on the next trading day instead of being lost
+        carried = pd.DataFrame(np.vstack([self.__last_log_price, log_prices])).ffill().to_numpy()
+        returns = log_prices - carried[:-1]
+        self.__last_log_price = carried[-1]
+
+        self.__sums += self.__contributions(returns)
+
+        if self.window:
+            rows = np.vstack([self.__rows, returns])
+            expired = len(rows) - self.window
+            if expired > 0:
+                self.__sums -= self.__contributions(rows[:expired])
+                rows = rows[expired:]
+            self.__rows = rows
+
+        self.last_date = prices.index[-1]
+        self.__cache.clear()
+        return len(returns)
+
+    # ___________________ Results ___________________ #
+
+    def covariance(self) -> pd.DataFrame:
+        '''
+        Returns the covariance matrix of daily log returns (ddof=1).
+        '''
+        if 'covariance' not in self.__cache:
+            covariance, _ = self.__compute()
+            self.__cache['covariance'] = pd.DataFrame(covariance, index=self.tickers, columns=self.tickers)
+        return self.__cache['covariance']
+
+    def correlation(self) -> pd.DataFrame:
+        '''
+        Returns the correlation matrix of daily log returns.
+        '''
+        if 'correlation' not in self.__cache:
+            _, correlation = self.__compute()
+            self.__cache['correlation'] = pd.DataFrame(correlation, index=self.tickers, columns=self.tickers)
+        return self.__cache['correlation']
+
+    # ___________________ Support ___________________ #
+
+    def __positions(self) -> dict:
+        return {ticker: position for position, ticker in enumerate(self.tickers)}
+
+    def __add_tickers(self, tickers:list):
+        if not tickers:
+            return
+
+        # a new asset has no past observations, so its pair sums start at zero
+        grow = len(tickers)
+        self.tickers.extend(tickers)
+        self.__sums = np.pad(self.__sums, ((0, 0), (0, grow), (0, grow)))
+        self.__rows = np.pad(self.__rows, ((0, 0), (0, grow)), constant_values=np.nan)
+        self.__last_log_price = np.concatenate([self.__last_log_price, np.full(grow, np.nan)])
+
+    def __contributions(self, returns:np.ndarray) -> np.ndarray:
+        present = ~np.isnan(returns)
+        mask = present.astype(float)
+        filled = np.where(present, returns, 0.0)
+
+        return np.stack([
+            mask.T @ mask,
+            filled.T @ mask,
+            (filled * filled).T @ mask,
+            filled.T @ filled,
+        ])
+
+    def __compute(self):
+        count, total, squares, cross = self.__sums
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = (cross - total * total.T / count) / (count - 1)
+            variance = (squares - total * total / count) / (count - 1)
+            correlation = covariance / np.sqrt(variance * variance.T)
+
+        too_short = count < self.min_periods
+        covariance[too_short] = np.nan
+        correlation[too_short] = np.nan
+        correlation = np.clip(correlation, -1.0, 1.0)
+
+        return covariance, correlation
+
+
+def rolling_correlation(prices:pd.DataFrame, window:int, step:int = 1, min_periods:int = 2):
+    '''
+    Walks through aligned prices and yields (date, correlation matrix) every `step` rows
+    for a rolling window of `window` returns. Each step costs O(step·N²), not O(window·N²).
+    '''
+    engine = CorrelationEngine(window=window, min_periods=min_periods)
+    for start in range(0, len(prices), step):
+        engine.update(prices.iloc[start:start + step])
+        yield engine.last_date, engine.correlation()
@@ -0,0 +1,192 @@
+
+# _____________________________________ Parallel Stats _____________________________________ #
+
+# Process-pool version of the per-ticker statistics (`get_data_details`) and standing (`get_standing`).
+#
+# Every ticker's OHLCV array is copied once into a single shared-memory block. Worker processes
+# attach to that block by name and read their tickers in place, so the bars are never pickled;
+# only the small stat dictionaries travel back to the parent.
+#
+# Run as a module for a scaling benchmark:
+# py -m backend.analysis.parallel
+
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backend.data.fetch_stocks import get_standing
+
+STOCK_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+CRYPTO_COLUMNS = ['open', 'high', 'low', 'close', 'volumefrom', 'volumeto']
+
+
+def compute_stats(bars:np.ndarray, columns:list) -> dict:
+    '''
+    Same statistics as `get_data_details` (mean, sample std, median, low, max per column),
+    computed for all columns at once. NaNs are skipped like pandas does.
+
+    Parameters:
+    - bars (np.ndarray): rows x columns array of one ticker's bars
+    - columns (list): column names, in array order
+
+    Returns:
+    - dict: column -> {"mean", "std", "median", "low", "max"}
+    '''
+    # a ticker with one bar has no sample std and an all-NaN column has no stats at all: both give NaN.
+    # numpy reports those through RuntimeWarning (not np.errstate), so the warnings are silenced here
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(bars, axis=0)
+        stds = np.nanstd(bars, axis=0, ddof=1)
+        medians = np.nanmedian(bars, axis=0)
+        lows = np.nanmin(bars, axis=0)
+        highs = np.nanmax(bars, axis=0)
+
+    return {
+        column: {
+            'mean': float(means[position]),
+            'std': float(stds[position]),
+            'median': float(medians[position]),
+            'low': float(lows[position]),
+            'max': float(highs[position]),
+        }
+        for position, column in enumerate(columns)
+    }
+
+
+def ticker_details(ticker:str, bars:np.ndarray, columns:list) -> dict:
+    '''
+    Builds the same dictionary the fetchers return for one ticker: stats, count and standing.
+    '''
+    details = {ticker: compute_stats(bars, columns), 'count': int(bars.shape[0])}
+    details['standing'] = get_standing(details)
+    return details
+
+
+class SharedBars:
+    '''
+    All tickers' bars packed row-wise into one float64 shared-memory block.
+
+    Parameters:
+    - universe (dict): ticker -> array-like of shape (rows, len(columns))
+    - columns (list): column names, in array order
+    '''
+
+    def __init__(self, universe:dict, columns:list) -> None:
+
+        self.columns = list(columns)
+        self.slices:dict = {}
+
+        total = 0
+        for ticker, bars in universe.items():
+            rows = len(bars)
+            self.slices[ticker] = (total, total + rows)
+            total += rows
+
+        self.shape = (total, len(self.columns))
+        self.memory = shared_memory.SharedMemory(create=True, size=max(total * len(self.columns) * 8, 1))
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)
+
+        for ticker, bars in universe.items():
+            start, stop = self.slices[ticker]
+            self.array[start:stop] = np.asarray(bars, dtype=np.float64).reshape(stop - start, len(self.columns))
+
+    def partition(self, parts:int) -> list:
+        '''
+        Splits the tickers into `parts` groups with roughly the same number of rows each.
+        '''
+        groups = [[] for _ in range(max(parts, 1))]
+        loads = [0] * len(groups)
+
+        # largest first onto the lightest group
+        for ticker, (start, stop) in sorted(self.slices.items(), key=lambda item: item[1][0] - item[1][1]):
+            lightest = loads.index(min(loads))
+            groups[lightest].append((ticker, start, stop))
+            loads[lightest] += stop - start
+
+        return [group for group in groups if group]
+
+    def close(self):
+        self.array = None
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _stats_worker(name:str, shape:tuple, columns:list, group:list) -> dict:
+    # pool workers share the parent's resource tracker, and the parent unlinks the block when done
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        array = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        results = {ticker: ticker_details(ticker, array[start:stop], columns) for ticker, start, stop in group}
+        del array # release the buffer export before closing
+        return results
+    finally:
+        memory.close()
+
+
+def compute_universe_stats(universe:dict, columns:list, processes:int = None) -> dict:
+    '''
+    Computes `ticker_details` for every ticker of a universe across a pool of processes.
+
+    Parameters:
+    - universe (dict): ticker -> array-like of shape (rows, len(columns))
+    - columns (list): column names, e.g. STOCK_COLUMNS or CRYPTO_COLUMNS
+    - processes (int): worker processes. Defaults to the number of CPUs; 1 runs in-process.
+
+    Returns:
+    - dict: ticker -> {ticker: stats, 'count': n, 'standing': label}
+    '''
+    processes = processes or os.cpu_count() or 1
+
+    if processes == 1:
+        return {
+            ticker: ticker_details(ticker, np.asarray(bars, dtype=np.float64), columns)
+            for ticker, bars in universe.items()
+        }
+
+    results = {}
+    with SharedBars(universe, columns) as shared:
+        groups = shared.partition(processes)
+        with ProcessPoolExecutor(max_workers=len(groups)) as pool:
+            futures = [
+                pool.submit(_stats_worker, shared.memory.name, shared.shape, shared.columns, group)
+                for group in groups
+            ]
+            for future in futures:
+                results.update(future.result())
+
+    return {ticker: results[ticker] for ticker in universe}
+
+
+def benchmark(tickers:int = 200, rows:int = 50_000, max_processes:int = None):
+    '''
+    Times `compute_universe_stats` on a synthetic intraday universe for 1, 2, 4, ... processes.
+    '''
+    max_processes = max_processes or os.cpu_count() or 1
+    rng = np.random.default_rng(0)
+    universe = {f"T{number}": rng.lognormal(4, 0.1, size=(rows, len(STOCK_COLUMNS))) for number in range(tickers)}
+
+    print(f"{tickers} tickers x {rows} bars, {os.cpu_count()} CPU(s)")
+    baseline = None
+    processes = 1
+    while processes <= max_processes:
+        started = time.perf_counter()
+        compute_universe_stats(universe, STOCK_COLUMNS, processes)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"  {processes:>3} process(es): {elapsed:7.3f}s  speedup x{baseline / elapsed:.2f}")
+        processes *= 2
+
+
+if __name__ == "__main__":
+    benchmark()
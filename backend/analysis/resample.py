@@ -0,0 +1,188 @@
+
+# _____________________________________ Resampling _____________________________________ #
+
+# Derives weekly, monthly and custom-interval bars from the stored daily (or intraday) bars, so every
+# timeframe is served from one fetched base series instead of one API call per granularity.
+#
+# open = first, high = max, low = min, close = last, volume columns = sum. Each bucket is labelled
+# with its start (weeks start on Monday). Everything is done with NumPy reductions over bucket
+# boundaries; no Python loop runs per bar.
+
+import re
+
+import numpy as np
+
+# rule -> description, for error messages
+RULES = {
+    'D': "calendar day",
+    'W': "week starting Monday",
+    'M': "calendar month",
+    'Q': "calendar quarter",
+    'Y': "calendar year",
+}
+FIXED_RULE = re.compile(r"^(\d+)(s|min|h|d)$")
+FIXED_SECONDS = {'s': 1, 'min': 60, 'h': 3600, 'd': 86400}
+
+
+def bucket_labels(ts:np.ndarray, rule:str) -> np.ndarray:
+    '''
+    The start of the bucket every timestamp falls in.
+
+    Parameters:
+    - ts (np.ndarray): datetime64 timestamps
+    - rule (str): one of RULES or a fixed width such as '15min', '4h', '3d' (anchored at the Unix epoch)
+    '''
+    seconds = ts.astype('datetime64[s]')
+
+    if rule == 'D':
+        return seconds.astype('datetime64[D]').astype('datetime64[s]')
+    if rule == 'W':
+        days = seconds.astype('datetime64[D]')
+        # 1970-01-01 was a Thursday, so (days + 3) % 7 is 0 on Mondays
+        return (days - (days.astype(np.int64) + 3) % 7).astype('datetime64[s]')
+    if rule == 'M':
+        return seconds.astype('datetime64[M]').astype('datetime64[s]')
+    if rule == 'Q':
+        months = seconds.astype('datetime64[M]').astype(np.int64)
+        return (months - months % 3).astype('datetime64[M]').astype('datetime64[s]')
+    if rule == 'Y':
+        return seconds.astype('datetime64[Y]').astype('datetime64[s]')
+
+    match = FIXED_RULE.match(rule)
+    if not match:
+        raise ValueError(f"Unknown rule '{rule}'. Use one of {list(RULES)} or a width like '15min', '4h', '3d'")
+    width = int(match.group(1)) * FIXED_SECONDS[match.group(2)]
+    if width <= 0:
+        raise ValueError("Interval width must be positive")
+    raw = seconds.astype(np.int64)
+    return (raw - raw % width).astype('datetime64[s]')
+
+
+def check_rule(rule:str):
+    '''
+    Raises ValueError unless `rule` is one of RULES or a positive fixed width.
+    '''
+    bucket_labels(np.array([], dtype='datetime64[s]'), rule)
+
+
+def resample_bars(bars:dict, rule:str, calendar:str = '24/7') -> dict:
+    '''
+    Aggregates OHLCV bars into coarser buckets.
+
+    Parameters:
+    - bars (dict): 'ts' -> datetime64 array plus one float array per column (as returned by `Commander.get_bars(as_frame=False)`)
+    - rule (str): bucket rule, see `bucket_labels`
+    - calendar (str): 'exchange' drops weekend bars before bucketing (stock sessions),
+      '24/7' keeps every bar (crypto)
+
+    Returns:
+    - dict: 'ts' (bucket starts), the aggregated columns and 'bars' (number of base bars per bucket)
+    '''
+    if calendar not in ('exchange', '24/7'):
+        raise ValueError("Calendar must be 'exchange' or '24/7'")
+
+    ts = np.asarray(bars['ts']).astype('datetime64[s]')
+    columns = [column for column in bars if column != 'ts']
+    values = {column: np.asarray(bars[column], dtype=np.float64) for column in columns}
+
+    order = np.argsort(ts, kind='stable')
+    keep = order
+    if calendar == 'exchange':
+        weekdays = (ts[order].astype('datetime64[D]').astype(np.int64) + 3) % 7
+        keep = order[weekdays < 5]
+
+    ts = ts[keep]
+    values = {column: array[keep] for column, array in values.items()}
+
+    if not len(ts):
+        return {'ts': ts, **values, 'bars': np.array([], dtype=np.int64)}
+
+    labels = bucket_labels(ts, rule)
+    starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]]))
+    ends = np.append(starts[1:], len(ts)) - 1
+
+    result = {'ts': labels[starts]}
+    for column, array in values.items():
+        if column == 'open':
+            result[column] = array[starts]
+        elif column == 'close':
+            result[column] = array[ends]
+        elif column == 'high':
+            result[column] = np.fmax.reduceat(array, starts)
+        elif column == 'low':
+            result[column] = np.fmin.reduceat(array, starts)
+        else:
+            result[column] = np.add.reduceat(np.nan_to_num(array), starts)
+    result['bars'] = np.diff(np.append(starts, len(ts)))
+
+    return result
+
+
+class Resampler:
+    '''
+    Cache of resampled series that is extended incrementally as new base bars arrive.
+
+    Besides the resampled buckets, each entry keeps the base bars of its last bucket, which may still
+    be open. New bars are resampled together with that tail only, so an update costs O(new bars).
+    '''
+
+    def __init__(self) -> None:
+        self.entries:dict = {}
+
+    def get(self, key:tuple):
+        entry = self.entries.get(key)
+        return entry['result'] if entry else None
+
+    def last_timestamp(self, key:tuple):
+        '''
+        Newest base bar folded into the cached series, or None if the key is not cached.
+        '''
+        entry = self.entries.get(key)
+        return entry['last_ts'] if entry else None
+
+    def build(self, key:tuple, bars:dict, rule:str, calendar:str = '24/7') -> dict:
+        self.entries.pop(key, None)
+        return self.update(key, bars, rule, calendar)
+
+    def update(self, key:tuple, bars:dict, rule:str, calendar:str = '24/7') -> dict:
+        '''
+        Folds base bars newer than the cached ones into the series and returns it.
+        '''
+        entry = self.entries.get(key)
+        new_ts = np.asarray(bars['ts']).astype('datetime64[s]')
+
+        if entry is None:
+            combined = dict(bars)
+            previous = None
+        else:
+            fresh = new_ts > entry['last_ts']
+            if not fresh.any():
+                return entry['result']
+            combined = {column: np.concatenate([entry['tail'][column], np.asarray(bars[column])[fresh]]) for column in entry['tail']}
+            previous = entry['result']
+
+        resampled = resample_bars(combined, rule, calendar)
+        if not len(resampled['ts']):
+            return previous if previous is not None else resampled
+
+        if previous is not None and len(previous['ts']):
+            # the first new bucket replaces the cached last bucket when they share a label
+            overlap = len(previous['ts']) - int(previous['ts'][-1] == resampled['ts'][0])
+            resampled = {column: np.concatenate([previous[column][:overlap], resampled[column]]) for column in resampled}
+
+        combined_ts = np.asarray(combined['ts']).astype('datetime64[s]')
+        last_label = resampled['ts'][-1]
+        in_tail = bucket_labels(combined_ts, rule) == last_label
+        self.entries[key] = {
+            'result': resampled,
+            'tail': {column: np.asarray(array)[in_tail] for column, array in combined.items()},
+            'last_ts': combined_ts.max(),
+        }
+        return resampled
+
+    def invalidate(self, prefix:tuple):
+        '''
+        Drops every cached series whose key starts with `prefix`, e.g. (table, ticker).
+        '''
+        for key in [key for key in self.entries if key[:len(prefix)] == prefix]:
+            del self.entries[key]
@@ -0,0 +1,149 @@
+
+# _____________________________________ Quantile Sketches _____________________________________ #
+
+# A compact, mergeable t-digest. One digest per ticker, metric and month is stored next to the bars;
+# merging the digests of the months in a range answers median/percentile queries over that range
+# in O(months) without reading the bars again.
+#
+# The digest keeps about `compression / 2` centroids. Centroids are small near the tails and larger
+# around the median (the k1 scale function), so extreme percentiles stay accurate.
+
+import json
+from datetime import datetime
+
+import numpy as np
+
+
+class TDigest:
+    '''
+    Merging t-digest.
+
+    Parameters:
+    - compression (int): size/accuracy trade-off. 100 keeps the rank error around 1% or better.
+    '''
+
+    def __init__(self, compression:int = 100) -> None:
+
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    # ___________________ Building ___________________ #
+
+    def add_many(self, values) -> "TDigest":
+        '''
+        Adds raw observations. NaNs are ignored.
+        '''
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self.__compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other:"TDigest") -> "TDigest":
+        '''
+        Folds another digest into this one.
+        '''
+        if len(other.weights):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.__compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    @classmethod
+    def merge_all(cls, digests:list, compression:int = 100) -> "TDigest":
+        '''
+        Merges many digests in one compression pass.
+        '''
+        merged = cls(compression)
+        digests = [digest for digest in digests if len(digest.weights)]
+        if digests:
+            merged.min = min(digest.min for digest in digests)
+            merged.max = max(digest.max for digest in digests)
+            merged.__compress(
+                np.concatenate([digest.means for digest in digests]),
+                np.concatenate([digest.weights for digest in digests])
+            )
+        return merged
+
+    # ___________________ Queries ___________________ #
+
+    def quantile(self, q:float) -> float:
+        '''
+        Estimated value at quantile q (0 <= q <= 1). NaN for an empty digest.
+        '''
+        if not len(self.weights):
+            return float('nan')
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+
+        # centroid centers sit halfway through their weight; the extremes are pinned to min/max
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * self.count, positions, values))
+
+    # ___________________ Storage ___________________ #
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'compression': self.compression,
+            'min': self.min,
+            'max': self.max,
+            'means': np.round(self.means, 10).tolist(),
+            'weights': self.weights.tolist(),
+        })
+
+    @classmethod
+    def from_json(cls, payload:str) -> "TDigest":
+        data = json.loads(payload)
+        digest = cls(data['compression'])
+        digest.min = data['min']
+        digest.max = data['max']
+        digest.means = np.asarray(data['means'], dtype=float)
+        digest.weights = np.asarray(data['weights'], dtype=float)
+        return digest
+
+    # ___________________ Support ___________________ #
+
+    def __compress(self, means:np.ndarray, weights:np.ndarray):
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+
+        total = weights.sum()
+        before = np.cumsum(weights) - weights
+
+        # k1 scale: a centroid may only span one unit of k, which is narrow at the tails
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * before / total - 1)
+        buckets = np.floor(scale - scale[0]).astype(np.int64)
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+
+def month_key(moment:datetime) -> str:
+    '''
+    The partition a bar belongs to, e.g. '2024-05'.
+    '''
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+def month_bounds(key:str):
+    '''
+    [start, end) datetimes of a 'YYYY-MM' partition.
+    '''
+    year, month = (int(part) for part in key.split('-'))
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
@@ -0,0 +1,127 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from flask import Blueprint, Response, current_app, jsonify, request
+
+# Add project root to path for imports to work when running directly
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.analysis.resample import check_rule
+from backend.database.Connection import BAR_METRICS
+from backend.utils.columnar import FORMATS, available_formats, encode, etag_matches, gzip_body, make_etag, negotiate
+
+# ___________________ Series API ___________________ #
+
+# GET /api/series/<table>/<ticker>
+#   ?start=2024-01-01&end=2024-07-01   range, ISO dates or epoch seconds, end exclusive; times are UTC
+#                                      unless they carry an offset ('Z', '+02:00'), which is converted to UTC
+#   &columns=close,volume              subset of the OHLCV columns
+#   &rule=W                            resampled bars ('D', 'W', 'M', 'Q', 'Y', '15min', '4h', ...)
+#   &limit=5000&after=1704067200       page size, and the `X-Next-After` value of the previous page
+#   &format=json|npz|arrow             or negotiated through the Accept header
+#
+# Responses carry an ETag derived from the ticker's data version, so a client that sends it back in
+# If-None-Match gets a 304 without the bars being read again. The version is stored next to the bars and
+# changed by every writer, whatever process it runs in, so all workers agree on it. Bodies are gzipped when the client accepts it.
+
+series = Blueprint('series', __name__, url_prefix='/api')
+
+DEFAULT_LIMIT = 5_000
+MAX_LIMIT = 100_000
+MIN_GZIP_BYTES = 1_024
+
+
+def _parse_time(value:str):
+    '''
+    Epoch seconds or an ISO date/time -> naive UTC datetime, the form the bars are stored in.
+    '''
+    if value is None or value == '':
+        return None
+    if value.lstrip('-').isdigit():
+        return datetime.fromtimestamp(int(value), tz=timezone.utc).replace(tzinfo=None)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _error(message:str, status:int = 400):
+    return jsonify({'error': message}), status
+
+
+@series.get('/series/<table>/<ticker>')
+def get_series(table:str, ticker:str):
+    commander = current_app.config['COMMANDER']
+
+    if table not in BAR_METRICS:
+        return _error(f"Unknown table '{table}'. Valid tables are: {list(BAR_METRICS)}", 404)
+
+    try:
+        start = _parse_time(request.args.get('start'))
+        end = _parse_time(request.args.get('end'))
+        after = request.args.get('after', type=int)
+        # the first second the next page may start at, checked here so a huge `after` is a bad request too
+        next_second = _parse_time(str(after + 1)) if after is not None else None
+        limit = min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT)
+    except (ValueError, OverflowError, OSError) as error:
+        # epochs far outside the datetime range raise OverflowError or OSError rather than ValueError
+        return _error(f"Invalid range parameter: {error}")
+    if limit <= 0:
+        return _error("limit must be positive")
+
+    columns = [column for column in request.args.get('columns', '').split(',') if column]
+    unknown = [column for column in columns if column not in BAR_METRICS[table]]
+    if unknown:
+        return _error(f"Unknown columns {unknown}. Valid columns are: {BAR_METRICS[table]}")
+    rule = request.args.get('rule')
+    if rule:
+        try:
+            check_rule(rule)
+        except ValueError as error:
+            return _error(str(error))
+
+    fmt = negotiate(request.headers.get('Accept'), request.args.get('format'))
+    if fmt is None:
+        return _error(f"No acceptable format. Available: {[FORMATS[name] for name in available_formats()]}", 406)
+
+    # everything that shapes the body goes into the ETag, so no bars are read for a 304
+    etag = make_etag(commander.data_version(table, ticker), table, ticker, start, end, tuple(columns), rule, limit, after, fmt)
+    vary = {'ETag': etag, 'Vary': 'Accept, Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=vary)
+
+    # bars come from the primary like the version: a lagging replica would serve older bars under the new ETag
+    if rule:
+        bars = commander.get_resampled(table, ticker, rule, start, end, as_frame=False, use_replica=False)
+        if columns and bars:
+            bars = {column: bars[column] for column in ['ts', *columns, 'bars']}
+    else:
+        range_start = start
+        if after is not None:
+            range_start = max(start, next_second) if start else next_second
+        # one bar past the page tells whether another page follows; the database stops there
+        bars = commander.get_bars(table, ticker, range_start, end, columns or None, as_frame=False, limit=limit + 1, use_replica=False)
+        after = None # already applied by the query
+    if not bars:
+        return _error(f"Could not read bars for '{ticker}' in '{table}'", 500)
+
+    # one page; resampled series are built in memory anyway, so `after` is applied to them here
+    keep = np.arange(len(bars['ts']))
+    if after is not None:
+        keep = keep[bars['ts'].astype('datetime64[s]').astype(np.int64) > after]
+    has_more = len(keep) > limit
+    keep = keep[:limit]
+    page = {column: np.asarray(values)[keep] for column, values in bars.items()}
+
+    headers = dict(vary)
+    if has_more:
+        headers['X-Next-After'] = str(int(page['ts'][-1].astype('datetime64[s]').astype(np.int64)))
+
+    body = encode(page, fmt)
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and len(body) >= MIN_GZIP_BYTES:
+        body = gzip_body(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(body, status=200, mimetype=FORMATS[fmt], headers=headers)
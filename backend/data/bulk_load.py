@@ -0,0 +1,339 @@
+
+# _____________________________________ Bulk Backfill _____________________________________ #
+
+# Loads vendor history dumps (CSV or JSON lines) straight into the `{table}_bars` tables without
+# touching the market-data APIs. Files are streamed in chunks, normalized to the OHLCV schema with
+# vectorized pandas code and written through the database's bulk path, one commit per chunk.
+#
+# Progress is checkpointed after every chunk. Writes are upserts on (ticker, ts), so re-running a
+# file after a crash replays at most one chunk and never duplicates rows.
+#
+# For code running, run the file as a `module` with the flag -m
+# py -m backend.data.bulk_load crypto dumps/btc.csv dumps/eth.csv --ticker-from-filename
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backend.database.Connection import BAR_METRICS
+from backend.utils.snapshot import write_json_atomic
+
+# Vendor column names we have seen, mapped to our schema
+COLUMN_ALIASES = {
+    'ticker': ['ticker', 'symbol', 'sym', 'fsym', 'asset'],
+    'ts': ['ts', 'time', 'timestamp', 'date', 'datetime', 'time_period_start'],
+    'open': ['open', 'o', '1. open', 'price_open'],
+    'high': ['high', 'h', '2. high', 'price_high'],
+    'low': ['low', 'l', '3. low', 'price_low'],
+    'close': ['close', 'c', '4. close', 'price_close', 'adj_close'],
+    'volume': ['volume', 'v', '5. volume', 'volume_traded'],
+    'volumefrom': ['volumefrom', 'volume_from', 'base_volume'],
+    'volumeto': ['volumeto', 'volume_to', 'quote_volume'],
+}
+
+
+def normalize_chunk(chunk:pd.DataFrame, table:str, ticker:str = None):
+    '''
+    Converts one chunk of a vendor dump to the `{table}_bars` layout.
+
+    Parameters:
+    - chunk (pd.DataFrame): raw rows as read from the file
+    - table (str): 'stocks' or 'crypto'
+    - ticker (str): symbol for every row, for dumps that hold a single ticker without a symbol column
+
+    Returns:
+    - (pd.DataFrame, int): the clean rows with columns ['ticker', 'ts', *metrics] and how many rows were rejected
+    '''
+    metrics = BAR_METRICS[table]
+    lowered = {str(column).strip().lower(): column for column in chunk.columns}
+
+    frame = pd.DataFrame(index=chunk.index)
+    for target in ['ticker', 'ts', *metrics]:
+        source = next((lowered[alias] for alias in COLUMN_ALIASES[target] if alias in lowered), None)
+        frame[target] = chunk[source] if source is not None else np.nan
+
+    if ticker:
+        frame['ticker'] = ticker
+    elif frame['ticker'].isna().all():
+        raise ValueError("Dump has no ticker column. Pass `ticker` for single-ticker files")
+
+    frame['ticker'] = frame['ticker'].astype('string').str.strip().str.upper()
+    frame['ts'] = _to_datetime(frame['ts'])
+    for metric in metrics:
+        frame[metric] = pd.to_numeric(frame[metric], errors='coerce').astype(float)
+
+    prices = frame[['open', 'high', 'low', 'close']]
+    valid = (
+        frame['ticker'].notna()
+        & (frame['ticker'].str.len().between(1, 10))
+        & frame['ts'].notna()
+        & frame['close'].notna()
+        & ~(prices < 0).any(axis=1)
+        & ~(frame['high'] < frame['low'])
+    )
+    for metric in metrics[4:]:
+        valid &= ~(frame[metric] < 0)
+
+    clean = frame[valid]
+    return clean, int((~valid).sum())
+
+
+def _to_datetime(values:pd.Series) -> pd.Series:
+    '''
+    Epoch seconds/milliseconds or date strings -> naive UTC datetimes, decided per value.
+    Unparseable values become NaT, so only their rows are rejected.
+    '''
+    numeric = pd.to_numeric(values, errors='coerce')
+    is_numeric = numeric.notna()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+
+    if is_numeric.any():
+        epochs = numeric[is_numeric]
+        milliseconds = epochs.abs() > 1e11
+        parsed[is_numeric & ~milliseconds] = pd.to_datetime(epochs[~milliseconds], unit='s', utc=True, errors='coerce')
+        parsed[is_numeric & milliseconds] = pd.to_datetime(epochs[milliseconds], unit='ms', utc=True, errors='coerce')
+
+    text = ~is_numeric & values.notna()
+    if text.any():
+        parsed[text] = pd.to_datetime(values[text].astype(str), utc=True, errors='coerce', format='mixed')
+    return parsed.dt.tz_localize(None)
+
+
+def read_chunks(path:str, chunk_size:int, skip_rows:int = 0):
+    '''
+    Streams a CSV or JSON lines file in chunks of `chunk_size` rows, starting after `skip_rows` data rows.
+    '''
+    lowered = path.lower()
+    if lowered.endswith(('.json', '.jsonl', '.ndjson', '.json.gz', '.jsonl.gz', '.ndjson.gz')):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+        skipped = 0
+        with reader:
+            for chunk in reader:
+                if skipped + len(chunk) <= skip_rows:
+                    skipped += len(chunk)
+                    continue
+                yield chunk.iloc[max(skip_rows - skipped, 0):]
+                skipped += len(chunk)
+    else:
+        skip = range(1, skip_rows + 1) if skip_rows else None
+        with pd.read_csv(path, chunksize=chunk_size, skiprows=skip, dtype=str) as reader:
+            yield from reader
+
+
+class BulkLoader:
+    '''
+    Chunked, resumable loader of history dumps into `{table}_bars`.
+
+    Parameters:
+    - connection: A Connection (or anything with `query_submit_many`, `query_load_infile`,
+      `query_refresh_summary` and `query_refresh_sketches`)
+    - table (str): 'stocks' or 'crypto'
+    - method (str): 'infile' uses LOAD DATA LOCAL INFILE (connection needs allow_local_infile=True),
+      'insert' uses large batched multi-row INSERTs
+    - chunk_size (int): rows per chunk, which is also the commit and checkpoint granularity
+    - checkpoint_path (str): JSON file recording how many rows of each file are loaded
+    '''
+
+    def __init__(self, connection, table:str, method:str = 'infile', chunk_size:int = 500_000, checkpoint_path:str = None) -> None:
+
+        if table not in BAR_METRICS:
+            raise ValueError(f"Invalid table '{table}'. Valid tables are: {list(BAR_METRICS)}")
+        if method not in ('infile', 'insert'):
+            raise ValueError("Method must be 'infile' or 'insert'")
+
+        self.connection = connection
+        self.table = table
+        self.method = method
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path or f".bulk_load_{table}.checkpoint.json"
+
+        self.columns = ['ticker', 'ts', *BAR_METRICS[table]]
+        self.checkpoint:dict = self.__read_checkpoint()
+
+    # ___________________ Loading ___________________ #
+
+    def load_file(self, path:str, ticker:str = None) -> dict:
+        '''
+        Loads one dump, resuming after the last checkpointed chunk if the file was partially loaded.
+
+        Returns:
+        - dict: rows loaded/rejected, months touched per ticker and status code (201 success, 400 failure)
+        '''
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        state = self.checkpoint.get(key)
+
+        # a file that changed since the checkpoint is loaded again from the start
+        if not state or state.get('size') != stat.st_size or state.get('mtime') != stat.st_mtime:
+            state = {'size': stat.st_size, 'mtime': stat.st_mtime, 'rows': 0, 'done': False, 'partitions': {}}
+        if state['done']:
+            print(f"Skipping {path}: already loaded")
+            return {'path': path, 'loaded': 0, 'rejected': 0, 'partitions': state['partitions'], 'status': 201}
+
+        loaded = 0
+        rejected = 0
+        # ticker -> months ('YYYY-MM') that received bars, for the sketch refresh
+        partitions = {ticker: set(months) for ticker, months in state['partitions'].items()}
+
+        for chunk in read_chunks(path, self.chunk_size, skip_rows=state['rows']):
+            clean, bad = normalize_chunk(chunk, self.table, ticker)
+
+            status = self.__write(clean) if len(clean) else 201
+            if status != 201:
+                print(f"Failed loading {path} after {state['rows']} rows. Run again to resume.")
+                return {'path': path, 'loaded': loaded, 'rejected': rejected, 'partitions': state['partitions'], 'status': 400}
+
+            loaded += len(clean)
+            rejected += bad
+            months = clean.assign(period=clean['ts'].dt.strftime('%Y-%m'))[['ticker', 'period']].drop_duplicates()
+            for ticker_name, period in months.itertuples(index=False, name=None):
+                partitions.setdefault(ticker_name, set()).add(period)
+
+            state['rows'] += len(chunk)
+            state['partitions'] = {ticker_name: sorted(periods) for ticker_name, periods in partitions.items()}
+            self.checkpoint[key] = state
+            self.__write_checkpoint()
+
+        state['done'] = True
+        self.checkpoint[key] = state
+        self.__write_checkpoint()
+
+        return {'path': path, 'loaded': loaded, 'rejected': rejected, 'partitions': state['partitions'], 'status': 201}
+
+    def load_files(self, paths:list, ticker:str = None, ticker_from_filename:bool = False, refresh:bool = True) -> dict:
+        '''
+        Loads many dumps, then recomputes the summary windows of every ticker that received bars.
+
+        Parameters:
+        - paths (list): dump files
+        - ticker (str): symbol for every row of every file
+        - ticker_from_filename (bool): use each file's name (without extension) as its symbol
+        - refresh (bool): recompute `{table}_summary` and the monthly sketches touched by the load
+
+        Returns:
+        - dict: totals, rows per minute and the per-file reports
+        '''
+        started = time.perf_counter()
+        reports = []
+        partitions = {}
+
+        for path in paths:
+            file_ticker = os.path.basename(path).split('.')[0] if ticker_from_filename else ticker
+            report = self.load_file(path, file_ticker)
+            reports.append(report)
+            for ticker_name, months in report['partitions'].items():
+                partitions.setdefault(ticker_name, set()).update(months)
+            print(f"{path}: {report['loaded']} rows loaded, {report['rejected']} rejected")
+
+        status = 201 if all(report['status'] == 201 for report in reports) else 400
+        if refresh and partitions and status == 201:
+            status = self.refresh_summaries(partitions)
+
+        elapsed = time.perf_counter() - started
+        loaded = sum(report['loaded'] for report in reports)
+        return {
+            'loaded': loaded,
+            'rejected': sum(report['rejected'] for report in reports),
+            'tickers': sorted(partitions),
+            'seconds': elapsed,
+            'rows_per_minute': loaded / elapsed * 60 if elapsed else 0.0,
+            'status': status,
+            'files': reports,
+        }
+
+    def refresh_summaries(self, partitions:dict) -> int:
+        '''
+        Recomputes every summary window of the loaded tickers on the server,
+        then rebuilds their quantile sketches for the months that received bars.
+
+        Parameters:
+        - partitions (dict): ticker -> months ('YYYY-MM') touched by the load
+        '''
+        # imported here so a plain load does not pull in the Commander and its API fetchers
+        from backend.database.Commander import SUMMARY_WINDOWS, summary_window_start
+
+        tickers = sorted(partitions)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        status = 201
+        for window_name in SUMMARY_WINDOWS:
+            start = summary_window_start(window_name, now)
+            if self.connection.query_refresh_summary(self.table, tickers, window_name, start) != 201:
+                print(f"Failed to refresh '{window_name}' summary for '{self.table}'")
+                status = 400
+
+        for ticker in tickers:
+            if self.connection.query_refresh_sketches(self.table, ticker, sorted(partitions[ticker])) != 201:
+                print(f"Failed to refresh sketches for {ticker} in '{self.table}'")
+                status = 400
+        return status
+
+    # ___________________ Support ___________________ #
+
+    def __write(self, clean:pd.DataFrame) -> int:
+        # the versions of the tickers in the chunk change with it, so API ETags see the new bars
+        versions = (self.table, clean['ticker'].unique().tolist())
+        if self.method == 'infile':
+            handle, path = tempfile.mkstemp(suffix='.csv')
+            os.close(handle)
+            try:
+                clean.to_csv(path, header=False, index=False, na_rep='\\N', date_format='%Y-%m-%d %H:%M:%S', lineterminator='\n')
+                return self.connection.query_load_infile(f"{self.table}_bars", self.columns, path, versions=versions)
+            finally:
+                os.remove(path)
+
+        values = clean[self.columns[2:]].to_numpy(dtype=object)
+        values[pd.isna(values)] = None
+        timestamps = list(clean['ts'].dt.to_pydatetime())
+        rows = list(zip(clean['ticker'].tolist(), timestamps, *values.T))
+        return self.connection.query_submit_many(f"{self.table}_bars", self.columns, rows, upsert=True, batch_size=5000, versions=versions)
+
+    def __read_checkpoint(self) -> dict:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            print(f"Could not read checkpoint {self.checkpoint_path}. Starting over. Error: {error}")
+            return {}
+
+    def __write_checkpoint(self):
+        write_json_atomic(self.checkpoint_path, self.checkpoint)
+
+
+def main(argv:list = None):
+    parser = argparse.ArgumentParser(description="Bulk load history dumps into the bars tables")
+    parser.add_argument('table', choices=list(BAR_METRICS))
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--ticker', help="symbol for files without a ticker column")
+    parser.add_argument('--ticker-from-filename', action='store_true')
+    parser.add_argument('--method', choices=['infile', 'insert'], default='infile')
+    parser.add_argument('--chunk-size', type=int, default=500_000)
+    parser.add_argument('--checkpoint')
+    parser.add_argument('--no-refresh', action='store_true')
+    parser.add_argument('--partition-from', help="YYYY-MM; creates the bars table partitioned by month")
+    args = parser.parse_args(argv)
+
+    from backend.database.Connection import Connection
+
+    connection = Connection(allow_local_infile=args.method == 'infile')
+    try:
+        connection.query_create_bars_table(args.table, partition_from=args.partition_from)
+        connection.query_create_summary_table(args.table)
+        connection.query_create_sketch_table(args.table)
+
+        loader = BulkLoader(connection, args.table, args.method, args.chunk_size, args.checkpoint)
+        report = loader.load_files(args.paths, args.ticker, args.ticker_from_filename, refresh=not args.no_refresh)
+        print(f"Loaded {report['loaded']} rows ({report['rows_per_minute']:,.0f} rows/min), rejected {report['rejected']}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import requests
 from pprint import pprint
 import pandas as pd 
 
+from backend.utils.memory import stage
+
 
 def get_data_details(data : dict)->dict:
     '''
@@ -116,7 +118,8 @@ def fetch_crypto_data(symbol, days=30):
     }
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        with stage('fetch'):
+            response = requests.get(url, params=params, headers=headers)
         
         if response.status_code == 404: # 404 not found
             raise Exception("The error indicates that the request was not found. Check the request and try again.")
@@ -139,21 +142,27 @@ def fetch_crypto_data(symbol, days=30):
         print(f"There was an issue with the data fetching function. Error:\n{some_error}")
         return None
  
-    data = response.json()
+    with stage('decode'):
+        data = response.json()
     
     # Validate response data
     if not data:
         raise ValueError("API returned empty response")
     
     # Parse the data to extract OHLCV records
-    parsed_data = parse_data(data)
+    with stage('parse'):
+        parsed_data = parse_data(data)
     
-    # Get statistical details
-    details = get_data_details(parsed_data)
+    with stage('stats'):
+        # Get statistical details
+        details = get_data_details(parsed_data)
+        
+        # Get the standing classification
+        standing = get_standing(details)
+        details["standing"] = standing
     
-    # Get the standing classification
-    standing = get_standing(details)
-    details["standing"] = standing
+    # Keep the raw bars so they can be stored and aggregated by the database
+    details["bars"] = parsed_data
     
     # Return the complete result
     result = details
@@ -200,4 +209,5 @@ def parse_data(data:dict) -> list[dict]:
     
     return parsed_data
 
-fetch_crypto_data('BTC', 30)
\ No newline at end of file
+if __name__ == "__main__":
+    fetch_crypto_data('BTC', 30)
@@ -5,13 +5,16 @@ import pandas as pd
 import os
 from dotenv import load_dotenv
 
+from backend.utils.memory import stage
+
 # Load environment variables from .env file
 load_dotenv()
 
 # For code running (print testing, etc...), run the file as a `module` with the flag -m
 # py -m backend.data.fetch_stocks <- no .py
 
-def get_data_details(data:dict)->dict:
+def get_data_details(data:dict, bars:list = None)->dict:
+    # `bars` are the rows already extracted by `parse_bars`; when given they are not parsed a second time
     # Extract the time series data (the key varies based on the function used)
     # For TIME_SERIES_MONTHLY, the key is "Monthly Time Series"
     time_series_key = None
@@ -33,16 +36,17 @@ def get_data_details(data:dict)->dict:
     time_series = data[time_series_key]
     
     # Convert to list of dictionaries for easier pandas processing
-    records = []
-    for date, values in time_series.items():
-        record = {
-            'open': float(values['1. open']),
-            'high': float(values['2. high']),
-            'low': float(values['3. low']),
-            'close': float(values['4. close']),
-            'volume': float(values['5. volume'])
-        }
-        records.append(record)
+    records = bars if bars is not None else []
+    if bars is None:
+        for date, values in time_series.items():
+            record = {
+                'open': float(values['1. open']),
+                'high': float(values['2. high']),
+                'low': float(values['3. low']),
+                'close': float(values['4. close']),
+                'volume': float(values['5. volume'])
+            }
+            records.append(record)
     
     # Create pandas DataFrame
     stocks = pd.DataFrame(records)
@@ -71,11 +75,42 @@ def get_data_details(data:dict)->dict:
     return result
 
 
+def parse_bars(data:dict)->list[dict]:
+    '''
+    Extracts the raw OHLCV bars from the API response, keeping their dates.
+    
+    Parameters:
+    - data (dict): The JSON data fetched from the API.
+    
+    Returns:
+    - list[dict]: One dictionary per bar with a 'time' key (epoch seconds, UTC) and the OHLCV values.
+    '''
+    time_series_key = next((key for key in data.keys() if "Time Series" in key), None)
+    if not time_series_key:
+        raise Exception("Could not find time series data in response")
+    
+    time_series = data[time_series_key]
+    times = pd.to_datetime(list(time_series.keys()), utc=True)
+    
+    bars = []
+    for moment, values in zip(times, time_series.values()):
+        bars.append({
+            'time': int(moment.timestamp()),
+            'open': float(values['1. open']),
+            'high': float(values['2. high']),
+            'low': float(values['3. low']),
+            'close': float(values['4. close']),
+            'volume': float(values['5. volume'])
+        })
+    
+    return bars
+
+
 def get_standing(details:dict)->str:
     # Extract the ticker name (first key that isn't 'count')
     ticker = None
     for key in details.keys():
-        if key != 'count':
+        if key not in ('count', 'bars'):
             ticker = key
             break
     
@@ -126,7 +161,8 @@ def fetch_stock_data(params:str, base_url:str=" https://www.alphavantage.co", en
     request_uri = f'{base_url}/{endpoint}?{params}&apikey={api_key}' # build the request URI here!! use the parameters (base_url, endpoint, params) as building blocks
     try:
         
-        response = requests.get(request_uri) # creates the request
+        with stage('fetch'):
+            response = requests.get(request_uri) # creates the request
         
         if response.status_code == 404: # 404 not found
             raise Exception("The error indicates that the request was not found. Check the request and try again.")
@@ -135,14 +171,21 @@ def fetch_stock_data(params:str, base_url:str=" https://www.alphavantage.co", en
         elif response.status_code == 200: # 200 OK
             print('Yay! The connection works!\n')
 
-            data:dict = response.json() # get the content of the API. This should include the JSON files
+            with stage('decode'):
+                data:dict = response.json() # get the content of the API. This should include the JSON files
             #pprint(data)
             
-            details = get_data_details(data)
-            #pprint(details)
-        
-            standing = get_standing(details)
-            details["standing"] = standing
+            # every row is converted once, in 'parse'; 'stats' only aggregates the parsed bars
+            with stage('parse'):
+                bars = parse_bars(data)
+            
+            with stage('stats'):
+                details = get_data_details(data, bars)
+                #pprint(details)
+            
+                standing = get_standing(details)
+                details["standing"] = standing
+            details["bars"] = bars
             result = details
             
             #pprint(result)
@@ -153,6 +196,7 @@ def fetch_stock_data(params:str, base_url:str=" https://www.alphavantage.co", en
         print(f"There was an issue with the data fetching function. Error:\n{some_error}")
         return None
 
-fetch_stock_data('function=TIME_SERIES_MONTHLY&symbol=IBM&outputsize=full') # TODO 3: Test the function!
+if __name__ == "__main__":
+    fetch_stock_data('function=TIME_SERIES_MONTHLY&symbol=IBM&outputsize=full') # TODO 3: Test the function!
 
 
@@ -1,6 +1,14 @@
 
 import sys
+import functools
+import threading
+import time
+import uuid
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
 
 # Add project root to path for imports to work when running directly
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -10,14 +18,55 @@ from backend.data.fetch_stocks import fetch_stock_data
 from backend.data.fetch_crypto import fetch_crypto_data
 
 # connection to SQL class that we created in Module 3
-from backend.database.Connection import Connection
+from backend.database.Connection import Connection, BAR_METRICS
+from backend.analysis.sketch import TDigest, month_key
+from backend.analysis.resample import Resampler
+from backend.analysis.anomaly import AnomalyDetector
+from backend.utils.snapshot import write_snapshot, read_snapshot
+from backend.utils.memory import stage
+
+# Windows kept materialized in the `{table}_summary` tables. Values are trailing days,
+# None for the whole history and 'ytd' for the current calendar year.
+SUMMARY_WINDOWS = {
+    'all': None,
+    '30d': 30,
+    '90d': 90,
+    '1y': 365,
+    'ytd': 'ytd',
+}
+
+def summary_window_start(window_name: str, now: datetime):
+    '''
+    Returns the first timestamp covered by a named summary window, or None for the whole history.
+    '''
+    span = SUMMARY_WINDOWS[window_name]
+    if span is None:
+        return None
+    if span == 'ytd':
+        return datetime(now.year, 1, 1)
+    return now - timedelta(days=span)
+
+# Trailing windows slide with the clock; rows older than this are recomputed even without new bars
+SUMMARY_MAX_AGE = timedelta(days=1)
+
+def serialized(method):
+    '''
+    Runs a Commander method while holding the instance's `db_lock`. The Commander has a single
+    connection and cursor, so its database work must not interleave between threads.
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.db_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 # main commander class. Similar to a main function.
 # we will use this export to manage all of the API endpoint we will create
 class Commander(Connection):
     
     # def __init__(self) -> None:
-    def __init__(self, stock_parameters=None, crypto_ticker='BTC', crypto_limit=30) -> None:
+    def __init__(self, stock_parameters=None, crypto_ticker='BTC', crypto_limit=30, snapshot_path=None, snapshot_max_age=3600, connection_options: dict = None,
+                 stock_fetcher=None, crypto_fetcher=None) -> None:
         '''
         Initialize the Commander class with stock and crypto parameters.
         
@@ -25,15 +74,53 @@ class Commander(Connection):
         - stock_parameters: API parameters for stock data (e.g., 'function=TIME_SERIES_MONTHLY&symbol=IBM&outputsize=full')
         - crypto_ticker: Cryptocurrency symbol to fetch (default: 'BTC')
         - crypto_limit: Number of days of crypto data to fetch (default: 30)
+        - snapshot_path: Optional file the computed state is saved to. When a matching snapshot exists,
+          the Commander starts from it right away instead of fetching both datasets first.
+        - snapshot_max_age: Seconds after which a dataset restored from the snapshot is refetched in the background
+        - connection_options: Keyword arguments for Connection, e.g. {'replicas': 'replica-1,replica-2', 'sticky_seconds': 5}
+        - stock_fetcher, crypto_fetcher: Replacements for `fetch_stock_data` / `fetch_crypto_data` with the same
+          signatures, e.g. the stand-ins in backend/utils/standins.py
+        
+        Thread safety: the public Commander methods that touch the database take `db_lock` (a re-entrant lock),
+        so one Commander can be shared by threads, one database call at a time. The inherited Connection
+        methods (query_*, show_tables) do not; callers on several threads must hold `db_lock` around them.
         '''
-        super().__init__()
+        super().__init__(**(connection_options or {}))
+        # serializes the database work of the methods marked @serialized, see above
+        self.db_lock = threading.RLock()
+        
+        self.stock_fetcher = stock_fetcher or fetch_stock_data
+        self.crypto_fetcher = crypto_fetcher or fetch_crypto_data
+        
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+        # when each dataset was last fetched, and the newest bar time the provider returned
+        self.fetched_at:dict = {'stocks': None, 'crypto': None}
+        self.provider_cursors:dict = {'stocks': None, 'crypto': None}
+        # set once stale datasets were refetched (right away when nothing was stale)
+        self.revalidated = threading.Event()
+        self.__snapshot_lock = threading.Lock()
+        # the revalidation thread's last error, None when it succeeded
+        self.revalidate_error = None
+        
+        # newest bar timestamp stored per ticker since the last summary refresh
+        self.pending_refresh:dict = {name: {} for name in BAR_METRICS}
+        # months per ticker whose quantile sketches must be rebuilt
+        self.pending_sketches:dict = {name: {} for name in BAR_METRICS}
+        # weekly/monthly/custom series derived from the stored bars
+        self.resampler = Resampler()
+        # price/volume shocks in newly stored bars; `store_bars` writes them to `{table}_alerts`, read them with `get_alerts`
+        self.detectors:dict = {
+            'stocks': AnomalyDetector(volume_field='volume'),
+            'crypto': AnomalyDetector(volume_field='volumeto'),
+        }
         
 # ____________________ Stocks ____________________#
 
         # Stock API parameters - can be passed during initialization
         self.stock_parameters = stock_parameters or 'function=TIME_SERIES_MONTHLY&symbol=IBM&outputsize=full'
         
-        self.stock_data:dict = self.__load_stocks()
+        self.stock_data:dict = None
 
 # _____________________ Crypto _____________________#
 
@@ -41,20 +128,168 @@ class Commander(Connection):
         self.crypto_ticker = crypto_ticker
         self.crypto_limit = crypto_limit
         
-        self.crypto_data:dict = self.__load_crypto()
+        self.crypto_data:dict = None
         
 # __________________________________________________ #
 
         self.tables:list = self.show_tables() 
+
+        if self.__restore_snapshot():
+            stale = [
+                name for name, fetched in self.fetched_at.items()
+                if fetched is None or time.time() - fetched > self.snapshot_max_age
+            ]
+            if stale:
+                threading.Thread(target=self.__revalidate, args=(stale,), daemon=True).start()
+            else:
+                self.revalidated.set()
+        else:
+            # cold start: nothing to serve until both datasets are fetched
+            self.__revalidate(['stocks', 'crypto'])
         
     def __load_stocks(self):
-        result = fetch_stock_data(self.stock_parameters)
+        result = self.stock_fetcher(self.stock_parameters)
         return result
     
     def __load_crypto(self):
-        result = fetch_crypto_data(self.crypto_ticker, self.crypto_limit) if self.crypto_limit else  fetch_crypto_data(self.crypto_ticker)
+        result = self.crypto_fetcher(self.crypto_ticker, self.crypto_limit) if self.crypto_limit else  self.crypto_fetcher(self.crypto_ticker)
         return result
     
+    def __revalidate(self, names: list):
+        '''
+        Fetches the given datasets ('stocks'/'crypto') again, stores their bars and saves a fresh snapshot.
+        A failed fetch keeps the data that was already loaded. After a warm start this runs on a background
+        thread: the fetches run unlocked, storing the bars (and refreshing summaries, sketches and the
+        anomaly detectors through `store_bars`) holds `db_lock`. Bars are only stored once the tables exist;
+        on a first run `__init_tables` stores them.
+        `revalidated` is set when this finishes, whether it succeeded or not (see `revalidate_error`).
+        '''
+        loaders = {'stocks': self.__load_stocks, 'crypto': self.__load_crypto}
+        
+        try:
+            for name in names:
+                with stage('refresh'):
+                    data = loaders[name]()
+                if not data:
+                    print(f"Could not refresh {name} data. Keeping the previous copy.")
+                    continue
+                
+                bars = data.get('bars') or []
+                if bars:
+                    self.provider_cursors[name] = max(bar['time'] for bar in bars)
+                self.fetched_at[name] = time.time()
+                
+                if name == 'stocks':
+                    self.stock_data = data
+                else:
+                    self.crypto_data = data
+                
+                if bars and f"{name}_bars" in self.tables:
+                    self.__persist_bars(name, data)
+            
+            if self.snapshot_path:
+                self.save_snapshot()
+        except Exception as error:
+            self.revalidate_error = error
+            print(f"Error refreshing {names}: {error}")
+        finally:
+            self.revalidated.set()
+    
+    @serialized
+    def __persist_bars(self, name: str, data: dict):
+        tickers = [ticker for ticker in data if ticker not in ['count', 'standing', 'bars']] if name == 'stocks' else [self.crypto_ticker]
+        for ticker in tickers:
+            self.store_bars(name, ticker, data['bars'])
+        self.refresh_summaries(name)
+        self.refresh_sketches(name)
+    
+    # _______________ Snapshots _______________ #
+    
+    def save_snapshot(self, path: str = None) -> int:
+        '''
+        Write the computed state to disk so the next process can start warm.
+        
+        The snapshot holds the per-ticker stats and standings of both datasets (raw bars stay in the
+        database), fetch times, provider cursors and pending refresh work. It is versioned and
+        written atomically, so a crash never leaves a half-written file.
+        
+        Parameters:
+        - path: Where to write. Defaults to the `snapshot_path` given at initialization.
+        
+        Returns:
+        - Status code: 201 (Created) on success, 400 (Bad Request) on failure
+        '''
+        path = path or self.snapshot_path
+        if not path:
+            print("Error: No snapshot path configured")
+            return 400
+        
+        def without_bars(data):
+            return {key: value for key, value in data.items() if key != 'bars'} if data else data
+        
+        # store_bars and the refreshes change this state on other threads; they hold db_lock while they do
+        with self.db_lock:
+            state = {
+                'parameters': self.__snapshot_parameters(),
+                'datasets': {
+                    'stocks': without_bars(self.stock_data),
+                    'crypto': without_bars(self.crypto_data),
+                },
+                'fetched_at': dict(self.fetched_at),
+                'provider_cursors': dict(self.provider_cursors),
+                'pending_refresh': {
+                    table: {ticker: newest.isoformat() for ticker, newest in pending.items()}
+                    for table, pending in self.pending_refresh.items()
+                },
+                'pending_sketches': {
+                    table: {ticker: sorted(months) for ticker, months in pending.items()}
+                    for table, pending in self.pending_sketches.items()
+                },
+                'detectors': {table: detector.to_dict() for table, detector in self.detectors.items()},
+            }
+        
+        try:
+            with self.__snapshot_lock:
+                write_snapshot(path, state)
+            return 201
+        except (OSError, TypeError, ValueError) as error:
+            print(f"Error writing snapshot to {path}: {error}")
+            return 400
+    
+    def __restore_snapshot(self) -> bool:
+        state, saved_at = read_snapshot(self.snapshot_path)
+        if not state:
+            return False
+        
+        if state.get('parameters') != self.__snapshot_parameters():
+            print("Snapshot was taken with different parameters. Starting cold.")
+            return False
+        
+        self.stock_data = state['datasets']['stocks']
+        self.crypto_data = state['datasets']['crypto']
+        self.fetched_at.update(state.get('fetched_at') or {})
+        self.provider_cursors.update(state.get('provider_cursors') or {})
+        
+        for table, pending in (state.get('pending_refresh') or {}).items():
+            self.pending_refresh.setdefault(table, {}).update(
+                {ticker: datetime.fromisoformat(newest) for ticker, newest in pending.items()}
+            )
+        for table, pending in (state.get('pending_sketches') or {}).items():
+            for ticker, months in pending.items():
+                self.pending_sketches.setdefault(table, {}).setdefault(ticker, set()).update(months)
+        for table, detector in (state.get('detectors') or {}).items():
+            self.detectors[table] = AnomalyDetector.from_dict(detector)
+        
+        print(f"Warm start from snapshot saved {time.time() - saved_at:.0f}s ago")
+        return True
+    
+    def __snapshot_parameters(self) -> dict:
+        return {
+            'stock_parameters': self.stock_parameters,
+            'crypto_ticker': self.crypto_ticker,
+            'crypto_limit': self.crypto_limit,
+        }
+    
 # __________________________________________________ #
 
     def __init_stocks_table(self):
@@ -71,7 +306,7 @@ class Commander(Connection):
         
         # Iterate through the data structure
         for ticker, metrics in self.stock_data.items():
-            if ticker in ['count', 'standing']:
+            if ticker in ['count', 'standing', 'bars']:
                 continue
 
             # Iterate through each metric (open, high, low, close, volume)
@@ -106,7 +341,7 @@ class Commander(Connection):
         
         # Iterate through the data structure
         for ticker, metrics in self.crypto_data.items():
-            if ticker in ['count', 'standing']:
+            if ticker in ['count', 'standing', 'bars']:
                 continue
 
             # Iterate through each metric (open, high, low, close, volumefrom, volumeto)
@@ -148,6 +383,22 @@ class Commander(Connection):
             
             self.__init_stocks_table()
             self.__init_crypto_table()
+            
+            for name in BAR_METRICS:
+                self.query_create_bars_table(name)
+                self.query_create_summary_table(name)
+                self.query_create_sketch_table(name)
+                self.query_create_alerts_table(name)
+            
+            if self.stock_data:
+                for ticker in self.stock_data:
+                    if ticker not in ['count', 'standing', 'bars']:
+                        self.store_bars('stocks', ticker, self.stock_data.get('bars', []))
+            if self.crypto_data:
+                self.store_bars('crypto', self.crypto_ticker, self.crypto_data.get('bars', []))
+            
+            self.refresh_summaries()
+            self.refresh_sketches()
  
         except Exception as error:
             print("There was an error initializing the tables operation")
@@ -155,6 +406,7 @@ class Commander(Connection):
     
     # _________________ CRUD _________________ #
     
+    @serialized
     def enter_record(self, table: str, **kwargs) -> int:
         '''
         Insert a single record manually into the specified table.
@@ -183,6 +435,7 @@ class Commander(Connection):
         
         return status
     
+    @serialized
     def extract_record(self, table: str, condition: str = None, values: tuple = None) -> list:
         '''
         Get specific record(s) from a table by condition or filter.
@@ -210,6 +463,7 @@ class Commander(Connection):
             print(f"Error extracting records from '{table}': {error}")
             return []
     
+    @serialized
     def delete_record(self, table: str, condition: str, values: tuple = None) -> int:
         '''
         Delete record(s) from a table by a unique key or filter.
@@ -245,6 +499,7 @@ class Commander(Connection):
             print(f"Error deleting records from '{table}': {error}")
             return 400
     
+    @serialized
     def extract_table(self, table: str) -> list:
         '''
         Return all records from a given table.
@@ -271,8 +526,424 @@ class Commander(Connection):
             print(f"Error extracting table '{table}': {error}")
             return []
     
+    # ________________ Raw Bars ________________ #
+    
+    def iter_bars(self, table: str, ticker: str, start: datetime = None, end: datetime = None, columns: list = None, chunk_size: int = 50_000, limit: int = None,
+                  use_replica: bool = True):
+        '''
+        Stream the raw bars of a ticker in [start, end) as NumPy chunks, oldest first.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'
+        - ticker: The symbol to read
+        - start, end: Optional range bounds
+        - columns: OHLCV columns to return (all of them when omitted). 'ts' is always included.
+        - chunk_size: Maximum number of bars per chunk
+        - limit: Optional maximum number of bars in total (the oldest ones)
+        - use_replica: Read from a replica when one is available (False reads the primary, e.g. to match `data_version`)
+        
+        Yields:
+        - Dictionary of column -> np.ndarray ('ts' as datetime64[s], the rest as float64)
+        
+        Example:
+        - for chunk in iter_bars('crypto', 'BTC', datetime(2024, 1, 1), columns=['close']): ...
+        '''
+        columns = list(columns or BAR_METRICS.get(table, []))
+        
+        # a generator cannot use @serialized: the lock is held until the stream is exhausted or closed
+        with self.db_lock:
+            for rows in self.query_bars(table, ticker, start, end, columns, chunk_size, limit, use_replica):
+                values = list(zip(*rows))
+                chunk = {'ts': np.array(values[0], dtype='datetime64[s]')}
+                for position, column in enumerate(columns, start=1):
+                    chunk[column] = np.array([np.nan if value is None else value for value in values[position]], dtype=np.float64)
+                yield chunk
+    
+    @serialized
+    def get_bars(self, table: str, ticker: str, start: datetime = None, end: datetime = None, columns: list = None, as_frame: bool = True, limit: int = None,
+                 use_replica: bool = True):
+        '''
+        Return the raw bars of a ticker in [start, end), at most `limit` of them (the oldest) when given.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'
+        - ticker: The symbol to read
+        - start, end: Optional range bounds
+        - columns: OHLCV columns to return (all of them when omitted)
+        - as_frame: pandas DataFrame indexed by ts when True, dictionary of NumPy arrays otherwise
+        - use_replica: See `iter_bars`
+        
+        Returns:
+        - The bars, empty if nothing matched or the table/columns are invalid
+        
+        Example:
+        - get_bars('stocks', 'IBM', datetime(2024, 4, 1), datetime(2024, 7, 1), columns=['close', 'volume'])
+        '''
+        if table not in BAR_METRICS:
+            print(f"Error: Invalid table '{table}'. Valid tables are: {list(BAR_METRICS)}")
+            return pd.DataFrame() if as_frame else {}
+        
+        columns = list(columns or BAR_METRICS[table])
+        try:
+            chunks = list(self.iter_bars(table, ticker, start, end, columns, limit=limit, use_replica=use_replica))
+        except ValueError as error:
+            print(f"Error reading bars: {error}")
+            return pd.DataFrame() if as_frame else {}
+        
+        if chunks:
+            arrays = {column: np.concatenate([chunk[column] for chunk in chunks]) for column in ['ts', *columns]}
+        else:
+            arrays = {'ts': np.array([], dtype='datetime64[s]'), **{column: np.array([], dtype=np.float64) for column in columns}}
+        
+        if not as_frame:
+            return arrays
+        return pd.DataFrame({column: arrays[column] for column in columns}, index=pd.DatetimeIndex(arrays['ts'], name='ts'))
+    
+    @serialized
+    def get_resampled(self, table: str, ticker: str, rule: str = 'W', start: datetime = None, end: datetime = None, as_frame: bool = True,
+                      use_replica: bool = True):
+        '''
+        Return weekly, monthly or custom-interval bars derived locally from the stored base bars.
+        
+        The resampled series is cached per (table, ticker, rule). Later calls only read the base bars
+        newer than the cached ones and fold them in, so no timeframe needs its own API call.
+        Stocks use the exchange calendar (weekend bars dropped), crypto trades 24/7.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'
+        - ticker: The symbol to read
+        - rule: 'D', 'W', 'M', 'Q', 'Y' or a fixed width such as '15min', '4h', '3d'
+        - start, end: Optional [start, end) range on the bucket start
+        - as_frame: pandas DataFrame indexed by bucket start when True, dictionary of NumPy arrays otherwise
+        - use_replica: See `iter_bars`
+        
+        Returns:
+        - The resampled bars, including a 'bars' column with the number of base bars per bucket
+        
+        Example:
+        - get_resampled('stocks', 'IBM', 'M')
+        - get_resampled('crypto', 'BTC', '4h', start=datetime(2024, 1, 1))
+        '''
+        if table not in BAR_METRICS:
+            print(f"Error: Invalid table '{table}'. Valid tables are: {list(BAR_METRICS)}")
+            return pd.DataFrame() if as_frame else {}
+        
+        key = (table, ticker, rule)
+        calendar = 'exchange' if table == 'stocks' else '24/7'
+        last_ts = self.resampler.last_timestamp(key)
+        
+        try:
+            if last_ts is None:
+                result = self.resampler.build(key, self.get_bars(table, ticker, as_frame=False, use_replica=use_replica), rule, calendar)
+            else:
+                newer = self.get_bars(table, ticker, start=last_ts.astype(datetime) + timedelta(seconds=1), as_frame=False, use_replica=use_replica)
+                result = self.resampler.update(key, newer, rule, calendar)
+        except ValueError as error:
+            print(f"Error resampling bars: {error}")
+            return pd.DataFrame() if as_frame else {}
+        
+        keep = np.ones(len(result['ts']), dtype=bool)
+        if start is not None:
+            keep &= result['ts'] >= np.datetime64(start, 's')
+        if end is not None:
+            keep &= result['ts'] < np.datetime64(end, 's')
+        result = {column: values[keep] for column, values in result.items()}
+        
+        if not as_frame:
+            return result
+        return pd.DataFrame(
+            {column: values for column, values in result.items() if column != 'ts'},
+            index=pd.DatetimeIndex(result['ts'], name='ts')
+        )
+    
+    # _______________ Summaries _______________ #
+    
+    @serialized
+    def store_bars(self, table: str, ticker: str, bars: list) -> int:
+        '''
+        Upsert raw OHLCV bars into `{table}_bars` and queue the ticker for a summary refresh.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'
+        - ticker: The symbol the bars belong to
+        - bars: List of dictionaries with a 'time' key (epoch seconds) and the OHLCV values
+        
+        Returns:
+        - Status code: 201 (Created) on success, 400 (Bad Request) on failure
+        '''
+        metrics = BAR_METRICS.get(table)
+        if not metrics:
+            print(f"Error: Invalid table '{table}'. Valid tables are: {list(BAR_METRICS)}")
+            return 400
+        
+        if not bars:
+            return 201
+        
+        # bars, alerts and their bookkeeping; the summary and sketch refreshes are 'db_write' stages of their own
+        with stage('db_write'):
+            rows = []
+            for bar in bars:
+                ts = datetime.fromtimestamp(bar['time'], tz=timezone.utc).replace(tzinfo=None)
+                rows.append((ticker, ts, *(bar.get(metric) for metric in metrics)))
+            
+            # the ticker's version row changes in the same transaction, see `data_version`
+            status = self.query_submit_many(f"{table}_bars", ['ticker', 'ts', *metrics], rows, upsert=True, versions=(table, [ticker]))
+            
+            if status == 201:
+                newest = max(row[1] for row in rows)
+                pending = self.pending_refresh[table]
+                pending[ticker] = max(newest, pending.get(ticker, newest))
+                
+                # corrections to bars that were already resampled invalidate those series; newer bars are appended on the next read
+                oldest = np.datetime64(min(row[1] for row in rows), 's')
+                cached = [key for key in self.resampler.entries if key[:2] == (table, ticker)]
+                if any(oldest <= self.resampler.last_timestamp(key) for key in cached):
+                    self.resampler.invalidate((table, ticker))
+                self.pending_sketches[table].setdefault(ticker, set()).update(month_key(row[1]) for row in rows)
+                
+                # only bars newer than the detector's last one are scored, so refetched history raises nothing twice
+                alerts = self.detectors[table].update_many(ticker, bars)
+                if alerts:
+                    self.__store_alerts(table, alerts)
+            else:
+                print(f"Failed to store bars for {ticker} in '{table}'. Status: {status}")
+        
+        return status
+    
+    @serialized
+    def data_version(self, table: str, ticker: str) -> str:
+        '''
+        Version of the ticker's stored bars, read from `{table}_versions` on the primary. Any process that
+        writes bars through `store_bars` or the bulk loader changes it, so every worker reports the same
+        version for the same data. When none is recorded a fresh value is returned, which never matches.
+        '''
+        return self.query_bar_version(table, ticker) or f"unversioned.{uuid.uuid4().hex}"
+    
+    def __store_alerts(self, table: str, alerts: list) -> int:
+        rows = [
+            (
+                alert['ticker'],
+                datetime.fromtimestamp(alert['time'], tz=timezone.utc).replace(tzinfo=None),
+                alert['kind'], alert['value'], alert['zscore'], alert['mean'], alert['std'],
+                datetime.fromtimestamp(alert['detected_at'], tz=timezone.utc).replace(tzinfo=None),
+            )
+            for alert in alerts
+        ]
+        status = self.query_submit_many(
+            f"{table}_alerts", ['ticker', 'ts', 'kind', 'value', 'zscore', 'mean', 'std', 'detected_at'], rows, upsert=True
+        )
+        if status != 201:
+            print(f"Failed to store {len(rows)} alert(s) in '{table}_alerts'. Status: {status}")
+        return status
+    
+    @serialized
+    def get_alerts(self, table: str, ticker: str = None, start: datetime = None) -> list:
+        '''
+        Anomalies stored for a table, optionally for one ticker and/or bars at or after `start`.
+        
+        Returns:
+        - List of rows (ticker, ts, kind, value, zscore, mean, std, detected_at)
+        
+        Example:
+        - get_alerts('crypto', 'BTC', start=datetime(2024, 6, 1))
+        '''
+        if table not in BAR_METRICS:
+            print(f"Error: Invalid table '{table}'. Valid tables are: {list(BAR_METRICS)}")
+            return []
+        
+        conditions, values = [], []
+        if ticker:
+            conditions.append("ticker = %s")
+            values.append(ticker)
+        if start is not None:
+            conditions.append("ts >= %s")
+            values.append(start)
+        return self.query_extract(f"{table}_alerts", " AND ".join(conditions), tuple(values))
+    
+    @serialized
+    def refresh_summaries(self, table: str = None, max_age: timedelta = SUMMARY_MAX_AGE) -> int:
+        '''
+        Recompute the materialized summary windows for tickers that received new bars.
+        
+        Pending tickers are refreshed, and a trailing window is skipped for a ticker when all of
+        its new bars are older than the window start (e.g. a backfill of old history).
+        Trailing windows also move with the clock, so their rows are recomputed once they were
+        last refreshed more than `max_age` ago, even when no bars arrived since.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'. Refreshes both when omitted.
+        - max_age: Age after which a trailing window row is recomputed without new bars
+        
+        Returns:
+        - Status code: 201 (Created) on success, 400 (Bad Request) if any window failed
+        '''
+        tables = [table] if table else list(BAR_METRICS)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        result = 201
+        
+        with stage('db_write'):
+            for name in tables:
+                pending = self.pending_refresh.get(name, {})
+                
+                failed = False
+                for window_name in SUMMARY_WINDOWS:
+                    start = summary_window_start(window_name, now)
+                    tickers = {ticker for ticker, newest in pending.items() if start is None or newest >= start}
+                    if start is not None:
+                        tickers.update(self.__expired_summaries(name, window_name, now - max_age))
+                    if not tickers:
+                        continue
+                    
+                    if self.query_refresh_summary(name, sorted(tickers), window_name, start, refreshed_at=now) != 201:
+                        print(f"Failed to refresh '{window_name}' summary for '{name}'")
+                        failed = True
+                
+                if failed:
+                    result = 400
+                else:
+                    pending.clear()
+        
+        return result
+    
+    def __expired_summaries(self, table: str, window_name: str, cutoff: datetime) -> set:
+        '''
+        Tickers whose rows of a window were refreshed before `cutoff`. Read from the primary so a lagging
+        replica does not report rows that were just refreshed.
+        '''
+        rows = self.query_extract(f"{table}_summary", "window_name = %s AND refreshed_at < %s", (window_name, cutoff), use_replica=False)
+        return {row[0] for row in rows}
+    
+    @serialized
+    def refresh_sketches(self, table: str = None) -> int:
+        '''
+        Rebuild the monthly quantile sketches of every month that received new bars.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'. Refreshes both when omitted.
+        
+        Returns:
+        - Status code: 201 (Created) on success, 400 (Bad Request) if any ticker failed
+        '''
+        tables = [table] if table else list(BAR_METRICS)
+        result = 201
+        
+        with stage('db_write'):
+            for name in tables:
+                pending = self.pending_sketches.get(name, {})
+                for ticker in list(pending):
+                    if self.query_refresh_sketches(name, ticker, pending[ticker]) == 201:
+                        del pending[ticker]
+                    else:
+                        print(f"Failed to refresh sketches for {ticker} in '{name}'")
+                        result = 400
+        
+        return result
+    
+    @serialized
+    def get_percentiles(self, table: str, ticker: str, metric: str, quantiles=(0.5,), start: datetime = None, end: datetime = None) -> dict:
+        '''
+        Median/percentiles of a metric over a time range, merged from the monthly sketches.
+        
+        The cost is O(months in range), not O(bars). The range is [start, end) rounded out to whole
+        months: an `end` on the first instant of a month leaves that month out, any later `end` keeps it.
+        The answer carries the sketch's small rank error (well under 1% with the default compression).
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'
+        - ticker: The symbol to query
+        - metric: One of the OHLCV columns (e.g. 'close', 'volume')
+        - quantiles: Iterable of quantiles between 0 and 1 (0.5 is the median)
+        - start, end: Optional [start, end) range bounds. The whole history is used when omitted.
+        
+        Returns:
+        - Dictionary of quantile -> value, plus 'count' (number of bars covered), or {} if nothing was found
+        
+        Example:
+        - get_percentiles('stocks', 'IBM', 'close', [0.5], datetime(2024, 4, 1), datetime(2024, 7, 1))
+        - get_percentiles('crypto', 'BTC', 'volumeto', [0.95], start=datetime(2023, 1, 1))
+        '''
+        if table not in BAR_METRICS or metric not in BAR_METRICS[table]:
+            print(f"Error: Invalid table/metric '{table}'/'{metric}'")
+            return {}
+        
+        condition = "ticker = %s AND metric = %s"
+        values = [ticker, metric]
+        if start is not None:
+            condition += " AND period >= %s"
+            values.append(month_key(start))
+        if end is not None:
+            # end is exclusive, so the last month covered is the one holding the instant just before it
+            condition += " AND period <= %s"
+            values.append(month_key(end - timedelta(microseconds=1)))
+        
+        rows = self.query_extract(f"{table}_sketches", condition, tuple(values))
+        if not rows:
+            return {}
+        
+        digest = TDigest.merge_all([TDigest.from_json(row[3]) for row in rows])
+        result = {q: digest.quantile(q) for q in quantiles}
+        result['count'] = int(digest.count)
+        return result
+    
+    @serialized
+    def get_window_stats(self, table: str, ticker: str, window: str = 'all', start: datetime = None, end: datetime = None) -> dict:
+        '''
+        Statistics of a ticker over a time window, computed by the database.
+        
+        Named windows (see SUMMARY_WINDOWS) are read from the materialized summary table.
+        Passing `start` and/or `end` computes an arbitrary [start, end) window from the raw bars instead.
+        
+        Parameters:
+        - table: 'stocks' or 'crypto'
+        - ticker: The symbol to summarize
+        - window: Name of a materialized window ('all', '30d', '90d', '1y', 'ytd')
+        - start, end: Optional bounds of an arbitrary window
+        
+        Returns:
+        - Dictionary shaped like the fetchers' details: {ticker: {metric: stats}, 'count': n}, or {} if nothing was found
+        
+        Example:
+        - get_window_stats('stocks', 'IBM', '90d')
+        - get_window_stats('crypto', 'BTC', start=datetime(2024, 4, 1), end=datetime(2024, 7, 1))
+        '''
+        if table not in BAR_METRICS:
+            print(f"Error: Invalid table '{table}'. Valid tables are: {list(BAR_METRICS)}")
+            return {}
+        
+        if start is not None or end is not None:
+            rows = self.query_window_stats(table, ticker, start, end)
+        elif window in SUMMARY_WINDOWS:
+            rows = self.query_extract(
+                f"{table}_summary",
+                "ticker = %s AND window_name = %s",
+                (ticker, window)
+            )
+            # summary rows carry a trailing refreshed_at column
+            rows = [row[:9] for row in rows]
+        else:
+            print(f"Error: Unknown window '{window}'. Valid windows are: {list(SUMMARY_WINDOWS)}")
+            return {}
+        
+        if not rows:
+            return {}
+        
+        stats = {}
+        count = 0
+        for _, metric, _, mean, median, std, low, high, metric_count in rows:
+            stats[metric] = {
+                'mean': float(mean) if mean is not None else None,
+                'std': float(std) if std is not None else None,
+                'median': float(median) if median is not None else None,
+                'low': float(low) if low is not None else None,
+                'max': float(high) if high is not None else None,
+            }
+            count = max(count, int(metric_count))
+        
+        return {ticker: stats, 'count': count}
+    
     # ________________ Support ________________ #
 
+
     def __is_valid_table(self, table):
         return table in self.tables
     
@@ -1,15 +1,54 @@
 import mysql.connector
 import os
+import re
+import time
+import uuid
 from dotenv import load_dotenv
 
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from backend.analysis.sketch import TDigest, month_bounds
+from backend.database.Routing import ReplicaPool, is_connection_error, parse_endpoint, parse_endpoints
+
 # Load environment variables from .env file
 load_dotenv()
 # pip install mysql-connector-python
 
+# OHLCV columns stored per raw bar. Stocks report a single volume, crypto reports both sides of the pair.
+BAR_METRICS = {
+    'stocks': ['open', 'high', 'low', 'close', 'volume'],
+    'crypto': ['open', 'high', 'low', 'close', 'volumefrom', 'volumeto'],
+}
+
+# Table and column names are interpolated into SQL, so they are restricted to plain identifiers
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,63}$")
+
+# Statements that change a table's definition; cached statements on that table must be prepared again
+SCHEMA_CHANGE = re.compile(r"^\s*(ALTER|CREATE|DROP|RENAME|TRUNCATE)\b", re.IGNORECASE)
+
+# MySQL error raised when a prepared statement outlived a change to its table
+ER_NEED_REPREPARE = 1615
+
+# Most placeholders one prepared statement may hold
+MAX_PLACEHOLDERS = 65_535
+
 class Connection:
-    def __init__(self) -> None:
-        
-        self.host = 'localhost'
+    def __init__(self, allow_local_infile: bool = False, max_statements: int = 64, host: str = None, replicas=None,
+                 connector=None, sticky_seconds: float = 0.0, replica_retry_after: float = 30.0) -> None:
+        '''
+        Parameters:
+        - allow_local_infile: Enables LOAD DATA LOCAL INFILE (bulk loads)
+        - max_statements: Size of the prepared statement cache
+        - host: Primary server as 'host' or 'host:port'. Defaults to the `db_host` environment variable, then localhost.
+        - replicas: Read replicas as a list or comma separated string of 'host[:port]'. Defaults to `db_replicas`.
+        - connector: Callable taking mysql.connector.connect keyword arguments. Lets tests use stand-in servers.
+        - sticky_seconds: After a write, reads stay on the primary this long so they see the write (0 disables)
+        - replica_retry_after: Seconds a failed replica is skipped
+        '''
+        self.allow_local_infile = allow_local_infile # needed by bulk loads through LOAD DATA LOCAL INFILE
+        self.connector = connector or mysql.connector.connect
+        self.host, self.port = parse_endpoint(host or os.getenv('db_host', 'localhost'))
         self.user = 'root'
         self.password = os.getenv('db_password')
         if not self.password:
@@ -19,16 +58,32 @@ class Connection:
         self.status = 'inactive'
         self.conn = self.__init_conn()
         self.cursor = self.__init_cursor()
+        
+        # (kind, table, columns, condition, endpoint) -> (query, server-side prepared cursor), least recently used first
+        self.max_statements = max_statements
+        self.statements:OrderedDict = OrderedDict()
+        
+        # reads listed in the docstrings as replica reads go here; everything else uses the primary
+        self.replicas = ReplicaPool(
+            parse_endpoints(replicas if replicas is not None else os.getenv('db_replicas', '')),
+            self.__connect_replica,
+            retry_after=replica_retry_after,
+            on_reconnect=lambda name: self.reset_statements(endpoint=name) # statements died with the old session
+        )
+        self.sticky_seconds = sticky_seconds
+        self.last_write = None
 
     # ___________________ Connection Methods ___________________ #
     
     def __init_conn(self):
         try:
-            connection = mysql.connector.connect(
+            connection = self.connector(
                 host=self.host,
+                port = self.port,
                 user = self.user,
                 password = self.password,
-                database = self.database
+                database = self.database,
+                allow_local_infile = self.allow_local_infile
             )
             self.status = 'active'
             return connection
@@ -38,6 +93,9 @@ class Connection:
             print(f"There was an error when attempting the connection with host {self.host}\n Error: {error}")
             return None
     
+    def __connect_replica(self, host: str, port: int):
+        return self.connector(host=host, port=port, user=self.user, password=self.password, database=self.database)
+    
     def __init_cursor(self):
 
         if self.conn:
@@ -46,8 +104,23 @@ class Connection:
             raise AttributeError("Connection Error: `self.conn` Attribute does pose a valid data type.")
     
 
+    def reconnect(self):
+        '''
+        Opens a fresh connection to the primary. Prepared statements belong to the old session, so they are dropped.
+        '''
+        self.reset_statements(endpoint='primary')
+        if self.cursor:
+            self.cursor.close()
+        if self.conn and self.conn.is_connected():
+            self.conn.close()
+        
+        self.conn = self.__init_conn()
+        self.cursor = self.__init_cursor()
+
     def close(self):
         """Closes the cursor and the database connection."""
+        self.reset_statements()
+        self.replicas.close()
         if self.cursor:
             self.cursor.close()
             self.cursor = None
@@ -56,6 +129,48 @@ class Connection:
             self.conn = None
             self.status = 'inactive'
             print("connection closed.")
+    
+    # ___________________ Routing ___________________ #
+    
+    def __commit(self):
+        '''
+        Commits on the primary and remembers when, for read-your-writes stickiness.
+        '''
+        self.conn.commit()
+        self.last_write = time.monotonic()
+    
+    def __read_endpoint(self):
+        '''
+        The replica the next read should use, or None for the primary
+        (no replicas, all replicas down, or a recent write that must stay visible).
+        '''
+        if not len(self.replicas):
+            return None
+        if self.sticky_seconds and self.last_write is not None and time.monotonic() - self.last_write < self.sticky_seconds:
+            return None
+        return self.replicas.choose()
+    
+    def __replica_failed(self, endpoint, error):
+        '''
+        Handles an error from a replica read. Lost or refused connections mark the replica down and the read
+        is retried on the primary; any other error is the query's own fault and is raised unchanged.
+        '''
+        if not is_connection_error(error):
+            raise error
+        print(f"Replica {endpoint.name} failed, reading from the primary instead. Error: {error}")
+        self.replicas.mark_down(endpoint)
+        self.reset_statements(endpoint=endpoint.name)
+    
+    def check_replicas(self) -> dict:
+        '''
+        Health checks every replica. Returns replica name -> True if healthy.
+        '''
+        status = self.replicas.check()
+        for name, healthy in status.items():
+            if not healthy:
+                self.reset_statements(endpoint=name)
+        return status
+    
     # ___________________ Queries ___________________ #
     
     def query_create_table(self, name): # Here is a demo of a query to create a table
@@ -77,7 +192,8 @@ class Connection:
             """
             
             self.cursor.execute(query)
-            self.conn.commit()
+            self.__commit()
+            self.reset_statements(name)
             
             return 'success'
             
@@ -85,6 +201,192 @@ class Connection:
             print(f"SQL Error creating table: {error}")
             return 'failure'
     
+    def query_create_bars_table(self, name, partition_from: str = None, partition_months_ahead: int = 12):
+        '''
+        Creates the raw bar table `{name}_bars` that holds one row per ticker and timestamp.
+        The (ticker, ts) primary key keeps the bars of a ticker clustered in time order,
+        so every window aggregate becomes a single range scan.
+        
+        With `partition_from` ('YYYY-MM') the table is range partitioned by month, from that month
+        to `partition_months_ahead` months past the current one, plus a catch-all partition.
+        Queries with a ts range then only open the partitions they need.
+        
+        `{name}_versions` is created alongside it (see `query_bar_version`); running this again on an
+        existing database adds it.
+        '''
+        metrics = BAR_METRICS.get(name)
+        if not metrics:
+            print(f"Unknown bar layout for table '{name}'")
+            return 'failure'
+        
+        metric_columns = ',\n'.join(f"                {metric} DOUBLE" for metric in metrics)
+        partitions = self.__month_partitions(partition_from, partition_months_ahead) if partition_from else ""
+        try:
+            query = f"""
+            CREATE TABLE IF NOT EXISTS {name}_bars (
+                ticker VARCHAR(10) NOT NULL,
+                ts DATETIME NOT NULL,
+{metric_columns},
+                PRIMARY KEY (ticker, ts)
+            ){partitions}
+            """
+            
+            self.cursor.execute(query)
+            self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name}_versions (
+                ticker VARCHAR(10) NOT NULL,
+                version CHAR(32) NOT NULL,
+                updated_at DATETIME,
+                PRIMARY KEY (ticker)
+            )
+            """)
+            self.__commit()
+            self.reset_statements(f"{name}_bars")
+            self.reset_statements(f"{name}_versions")
+            
+            return 'success'
+            
+        except mysql.connector.Error as error:
+            print(f"SQL Error creating bars table: {error}")
+            return 'failure'
+    
+    def query_add_bar_partitions(self, name, months_ahead: int = 12):
+        '''
+        Splits the catch-all partition of a partitioned `{name}_bars` so that monthly partitions
+        exist up to `months_ahead` months past the current one. Meant to run periodically.
+        '''
+        try:
+            self.cursor.execute(
+                "SELECT PARTITION_DESCRIPTION FROM INFORMATION_SCHEMA.PARTITIONS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME <> 'pmax'",
+                (self.database, f"{name}_bars")
+            )
+            bounds = [row[0].strip("'") for row in self.cursor.fetchall() if row[0]]
+            if not bounds:
+                print(f"Table '{name}_bars' is not partitioned")
+                return 'failure'
+            
+            # the last bound is the first day of the month after the newest partition
+            last = datetime.strptime(max(bounds)[:10], '%Y-%m-%d')
+            definitions = self.__month_partitions(f"{last.year:04d}-{last.month:02d}", months_ahead, reorganize=True)
+            if not definitions:
+                return 'success'
+            
+            self.cursor.execute(f"ALTER TABLE {name}_bars REORGANIZE PARTITION pmax INTO ({definitions})")
+            self.__commit()
+            self.reset_statements(f"{name}_bars")
+            return 'success'
+        
+        except mysql.connector.Error as error:
+            print(f"SQL Error adding partitions: {error}")
+            return 'failure'
+    
+    def __month_partitions(self, first: str, months_ahead: int, reorganize: bool = False) -> str:
+        '''
+        Monthly RANGE COLUMNS(ts) partition definitions from `first` ('YYYY-MM') to months_ahead past now, plus pmax.
+        '''
+        now = datetime.now()
+        year, month = (int(part) for part in first.split('-'))
+        last = (now.year * 12 + now.month - 1) + months_ahead
+        
+        definitions = []
+        while year * 12 + month - 1 <= last:
+            _, end = month_bounds(f"{year:04d}-{month:02d}")
+            definitions.append(f"PARTITION p{year:04d}{month:02d} VALUES LESS THAN ('{end:%Y-%m-%d}')")
+            year, month = end.year, end.month
+        definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        
+        if reorganize:
+            return ', '.join(definitions) if len(definitions) > 1 else ""
+        return "\n            PARTITION BY RANGE COLUMNS(ts) (\n                " + ',\n                '.join(definitions) + "\n            )"
+    
+    def query_create_summary_table(self, name):
+        '''
+        Creates the materialized summary table `{name}_summary`.
+        It holds the same statistics as the `stocks`/`crypto` tables, one row per ticker, metric and window.
+        '''
+        try:
+            query = f"""
+            CREATE TABLE IF NOT EXISTS {name}_summary (
+                ticker VARCHAR(10) NOT NULL,
+                metric VARCHAR(20) NOT NULL,
+                window_name VARCHAR(10) NOT NULL,
+                mean DOUBLE,
+                median DOUBLE,
+                std DOUBLE,
+                low DOUBLE,
+                max DOUBLE,
+                count INT,
+                refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (ticker, metric, window_name)
+            )
+            """
+            
+            self.cursor.execute(query)
+            self.__commit()
+            self.reset_statements(f"{name}_summary")
+            
+            return 'success'
+            
+        except mysql.connector.Error as error:
+            print(f"SQL Error creating summary table: {error}")
+            return 'failure'
+    
+    def query_create_sketch_table(self, name):
+        '''
+        Creates `{name}_sketches`: one serialized quantile sketch (t-digest) per ticker, metric and month.
+        '''
+        try:
+            query = f"""
+            CREATE TABLE IF NOT EXISTS {name}_sketches (
+                ticker VARCHAR(10) NOT NULL,
+                metric VARCHAR(20) NOT NULL,
+                period CHAR(7) NOT NULL,
+                sketch MEDIUMTEXT,
+                count INT,
+                PRIMARY KEY (ticker, metric, period)
+            )
+            """
+            
+            self.cursor.execute(query)
+            self.__commit()
+            self.reset_statements(f"{name}_sketches")
+            
+            return 'success'
+            
+        except mysql.connector.Error as error:
+            print(f"SQL Error creating sketch table: {error}")
+            return 'failure'
+    
+    def query_create_alerts_table(self, name):
+        '''
+        Creates `{name}_alerts`: anomalies raised by the streaming detector, one row per ticker, bar and kind.
+        '''
+        try:
+            query = f"""
+            CREATE TABLE IF NOT EXISTS {name}_alerts (
+                ticker VARCHAR(10) NOT NULL,
+                ts DATETIME NOT NULL,
+                kind VARCHAR(10) NOT NULL,
+                value DOUBLE,
+                zscore DOUBLE,
+                mean DOUBLE,
+                std DOUBLE,
+                detected_at DATETIME,
+                PRIMARY KEY (ticker, ts, kind)
+            )
+            """
+            
+            self.cursor.execute(query)
+            self.__commit()
+            self.reset_statements(f"{name}_alerts")
+            
+            return 'success'
+            
+        except mysql.connector.Error as error:
+            print(f"SQL Error creating alerts table: {error}")
+            return 'failure'
+    
     def query_submit(self, table_name: str, **kwargs) -> int:
         '''
         Arguably the most important function. This could go perfect or it can cause lots of issues.
@@ -99,35 +401,122 @@ class Connection:
         columns = list(kwargs.keys())
         values = list(kwargs.values())
 
-        placeholders = ', '.join(['%s'] * len(columns))
-        column_string = ', '.join(columns)
-
-        query = f"INSERT INTO {table_name} ({column_string}) VALUES ({placeholders})"
+        def build():
+            placeholders = ', '.join(['%s'] * len(columns))
+            column_string = ', '.join(columns)
+            return f"INSERT INTO {table_name} ({column_string}) VALUES ({placeholders})"
 
         try:
-            self.cursor.execute(query, values)
-            self.conn.commit()
+            self.__execute_prepared(('insert', table_name, tuple(columns), None, 'primary'), build, values)
+            self.__commit()
             return 201 # Created
+        except ValueError as error:
+            print(f" Invalid insert: {error}")
+            return 400
         except mysql.connector.Error as error:
             print(f" SQL Error inserting data: {error}")
             return 400 # Bad Request 
 
-    def query_extract(self, table_name: str, condition: str = "", values: tuple = None) -> dict:
+    def query_submit_many(self, table_name: str, columns: list, rows: list, upsert: bool = False, batch_size: int = 1000, versions: tuple = None) -> int:
+        '''
+        Enters many records on a table with a single commit, `batch_size` rows per multi-row INSERT.
+        Full batches go through the prepared statement cache: the first one prepares the INSERT for
+        `batch_size` rows, the following ones (and later calls with the same shape) only send values.
+        The remaining rows are sent through `executemany`, which the connector rewrites into one multi-row
+        INSERT; preparing a statement for every remainder size would only churn the cache.
+        With `upsert`, rows that collide on the primary key replace the stored values.
+        With `versions` = (bar layout, tickers), e.g. ('crypto', ['BTC']), the tickers' version rows change in
+        the same transaction (see `query_bar_version`).
+        Returns 201 if every batch was written, 400 otherwise (nothing is committed in that case).
+        '''
+        if not rows:
+            return 201
+        
+        batch_size = max(1, min(batch_size, MAX_PLACEHOLDERS // len(columns)))
+        row_placeholders = f"({', '.join(['%s'] * len(columns))})"
+        upsert_clause = " ON DUPLICATE KEY UPDATE " + ', '.join(f"{column} = VALUES({column})" for column in columns) if upsert else ""
+
+        def build(count=batch_size):
+            return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {', '.join([row_placeholders] * count)}{upsert_clause}"
+
+        key = ('insert_many', table_name, tuple(columns), f"{batch_size} rows{' upsert' if upsert else ''}", 'primary')
+        full = len(rows) - len(rows) % batch_size
+        try:
+            for start in range(0, full, batch_size):
+                self.__execute_prepared(key, build, [value for row in rows[start:start + batch_size] for value in row])
+            if full < len(rows):
+                self.__validate_identifiers(table_name, *columns)
+                self.cursor.executemany(build(1), rows[full:])
+            if versions:
+                self.__write_versions(*versions)
+            self.__commit()
+            return 201 # Created
+        except ValueError as error:
+            print(f" Invalid insert: {error}")
+            return 400
+        except mysql.connector.Error as error:
+            self.conn.rollback()
+            print(f" SQL Error inserting batch: {error}")
+            return 400 # Bad Request
+
+    def query_load_infile(self, table_name: str, columns: list, path: str, versions: tuple = None) -> int:
+        '''
+        Bulk loads a headerless CSV file into a table with LOAD DATA LOCAL INFILE, the fastest write path MySQL has.
+        Rows that collide on the primary key replace the stored ones, so a file can be loaded again safely.
+        NULLs must be written as \\N. Needs `allow_local_infile=True` here and `local_infile=ON` on the server.
+        `versions` works as in `query_submit_many`.
+        Returns 201 on success, 400 otherwise.
+        '''
+        if not self.allow_local_infile:
+            print("LOAD DATA LOCAL INFILE is disabled for this connection")
+            return 400
+        
+        column_string = ', '.join(columns)
+        escaped_path = path.replace('\\', '\\\\').replace("'", "\\'")
+        query = (
+            f"LOAD DATA LOCAL INFILE '{escaped_path}' REPLACE INTO TABLE {table_name} "
+            f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' ({column_string})"
+        )
+        
+        try:
+            self.cursor.execute(query)
+            if versions:
+                self.__write_versions(*versions)
+            self.__commit()
+            return 201
+        except mysql.connector.Error as error:
+            self.conn.rollback()
+            print(f"SQL Error loading file: {error}")
+            return 400
+
+    def query_extract(self, table_name: str, condition: str = "", values: tuple = None, use_replica: bool = True) -> dict:
         '''
         Extract a record from a table. Allow for OPTIONAL filtering conditions.
+        The condition should take its values through %s placeholders so that one prepared
+        statement serves every call with the same condition.
+        Reads go to a replica when one is configured and healthy (see `use_replica`), otherwise to the primary.
         '''
-        query = f"SELECT * FROM {table_name}"
-        if condition:
-            query += f" WHERE {condition}"
+        def build():
+            query = f"SELECT * FROM {table_name}"
+            if condition:
+                query += f" WHERE {condition}"
+            return query
 
+        key = ('select', table_name, None, condition or None)
         try:
-            if values:
-                self.cursor.execute(query, values)
-            else:
-                self.cursor.execute(query)
+            endpoint = self.__read_endpoint() if use_replica else None
+            if endpoint:
+                try:
+                    return self.__execute_prepared(key + (endpoint.name,), build, values, endpoint.conn).fetchall()
+                except mysql.connector.Error as error:
+                    self.__replica_failed(endpoint, error)
             
-            return self.cursor.fetchall()
+            cursor = self.__execute_prepared(key + ('primary',), build, values)
+            return cursor.fetchall()
     
+        except ValueError as error:
+            print(f"Invalid extract: {error}")
+            return []
         except mysql.connector.Error as error:
             print(f"SQL Error extracting data: {error}")
             return []
@@ -143,12 +532,28 @@ class Connection:
     
     def show_tables(self) -> list:
         '''
-        Returns a list of all table names in the data base
+        Returns a list of all table names in the data base (read from a replica when one is available)
         '''
         if not self.cursor: 
             return []
-    
+        
         try:
+            endpoint = self.__read_endpoint()
+            if endpoint:
+                cursor = None
+                try:
+                    cursor = endpoint.conn.cursor()
+                    cursor.execute("SHOW TABLES")
+                    return [t[0] for t in cursor.fetchall()]
+                except mysql.connector.Error as error:
+                    self.__replica_failed(endpoint, error)
+                finally:
+                    if cursor is not None:
+                        try:
+                            cursor.close()
+                        except mysql.connector.Error:
+                            pass
+            
             self.cursor.execute("SHOW TABLES")
             # fetchall() returns tuples, so we access the first element (index 0)
             tables = [t[0] for t in self.cursor.fetchall()]
@@ -158,13 +563,307 @@ class Connection:
             return []
 
 
+    def query_bar_version(self, name: str, ticker: str):
+        '''
+        Returns the version of a ticker's bars in `{name}_bars`, None when it has none or it cannot be read.
+        
+        Every write that goes through `versions` (store_bars, the bulk loader) stores a new random token for the
+        tickers it touched, in the same transaction as the bars. The version is the same for every process
+        reading the database and changes as soon as any of them writes. It is read on the primary, so it is
+        never newer than the bars a following primary read returns.
+        '''
+        rows = self.query_extract(f"{name}_versions", "ticker = %s", (ticker,), use_replica=False)
+        return rows[0][1] if rows else None
+
+    def __write_versions(self, name: str, tickers):
+        rows = [(ticker, uuid.uuid4().hex, datetime.now(timezone.utc).replace(tzinfo=None)) for ticker in sorted(set(tickers))]
+        self.cursor.executemany(
+            f"INSERT INTO {name}_versions (ticker, version, updated_at) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE version = VALUES(version), updated_at = VALUES(updated_at)",
+            rows
+        )
+
+    def query_bars(self, name: str, ticker: str, start=None, end=None, columns: list = None, chunk_size: int = 50_000, limit: int = None,
+                   use_replica: bool = True):
+        '''
+        Streams the bars of one ticker in [start, end), oldest first, as lists of tuples of at most `chunk_size` rows.
+        Every tuple starts with ts followed by the requested columns. With `limit` only the oldest `limit` bars
+        are read, so paging through a series reads every bar once.
+        
+        The filter is on the (ticker, ts) primary key, so this is one clustered range scan, and on a
+        partitioned table MySQL prunes the months outside the range. A dedicated cursor is used so
+        the rows are read from the server chunk by chunk rather than all at once. Finish (or close)
+        the stream before sending other queries on this connection.
+        
+        Like `query_extract`, the read goes to a replica when one is configured and healthy (see `use_replica`).
+        A replica that fails before the first chunk is marked down and the read is retried on the primary; once
+        chunks were handed out, a failure ends the stream instead, since a restart would repeat them.
+        '''
+        metrics = BAR_METRICS.get(name)
+        if not metrics:
+            raise ValueError(f"Unknown bar layout for table '{name}'")
+        
+        columns = list(columns or metrics)
+        unknown = [column for column in columns if column not in metrics]
+        if unknown:
+            raise ValueError(f"Unknown columns for '{name}_bars': {unknown}. Valid columns are: {metrics}")
+        
+        query = f"SELECT {', '.join(['ts', *columns])} FROM {name}_bars WHERE ticker = %s"
+        values = [ticker]
+        if start is not None:
+            query += " AND ts >= %s"
+            values.append(start)
+        if end is not None:
+            query += " AND ts < %s"
+            values.append(end)
+        query += " ORDER BY ts"
+        if limit is not None:
+            query += " LIMIT %s"
+            values.append(int(limit))
+        
+        try:
+            endpoint = self.__read_endpoint() if use_replica else None
+            if endpoint:
+                streamed = False
+                try:
+                    for rows in self.__stream(endpoint.conn, query, values, chunk_size):
+                        streamed = True
+                        yield rows
+                    return
+                except mysql.connector.Error as error:
+                    if streamed:
+                        raise
+                    self.__replica_failed(endpoint, error)
+            
+            yield from self.__stream(self.conn, query, values, chunk_size)
+        except mysql.connector.Error as error:
+            print(f"SQL Error reading bars: {error}")
+    
+    def __stream(self, conn, query: str, values: list, chunk_size: int):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, values)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+    
+    # __________________ Prepared Statements __________________ #
+    
+    def __execute_prepared(self, key: tuple, build, values=None, conn=None):
+        '''
+        Runs a statement through the prepared statement cache and returns its cursor.
+        
+        Keys are (kind, table, columns, condition, endpoint); statements on a replica are prepared
+        on `conn`, the others on the primary.
+        The first call for a key validates the identifiers, builds the SQL with `build()` and prepares
+        it on the server. Later calls only send the values, so the server skips parsing and planning.
+        A statement invalidated by a schema change on the server is prepared again once.
+        '''
+        cursor, query = self.__prepared(key, build, conn)
+        try:
+            cursor.execute(query, list(values) if values else ())
+        except mysql.connector.Error as error:
+            self.__drop_statement(key)
+            if error.errno != ER_NEED_REPREPARE:
+                raise
+            cursor, query = self.__prepared(key, build, conn)
+            cursor.execute(query, list(values) if values else ())
+        return cursor
+    
+    def __prepared(self, key: tuple, build, conn=None):
+        entry = self.statements.get(key)
+        if entry:
+            self.statements.move_to_end(key)
+            return entry[1], entry[0]
+        
+        _, table, columns, _, _ = key
+        self.__validate_identifiers(table, *(columns or ()))
+        
+        # the cursor keeps the query object; re-executing the same object reuses the server statement
+        query = build()
+        cursor = (conn or self.conn).cursor(prepared=True)
+        self.statements[key] = (query, cursor)
+        
+        while len(self.statements) > self.max_statements:
+            _, (_, evicted) = self.statements.popitem(last=False)
+            evicted.close()
+        return cursor, query
+    
+    def __validate_identifiers(self, *names):
+        for name in names:
+            if not isinstance(name, str) or not IDENTIFIER.match(name):
+                raise ValueError(f"'{name}' is not a valid table or column name")
+    
+    def __drop_statement(self, key: tuple):
+        entry = self.statements.pop(key, None)
+        if entry:
+            try:
+                entry[1].close()
+            except mysql.connector.Error:
+                pass # the session may already be gone
+    
+    def reset_statements(self, table_name: str = None, endpoint: str = None):
+        '''
+        Closes cached prepared statements, all of them or only those on `table_name` and/or
+        on one `endpoint` ('primary' or a replica name such as 'db-replica-1:3306').
+        Called on reconnect, when a replica fails and whenever a table definition changes.
+        '''
+        stale = [
+            key for key in self.statements
+            if (table_name is None or key[1] == table_name) and (endpoint is None or key[4] == endpoint)
+        ]
+        for key in stale:
+            self.__drop_statement(key)
+    
     # __________________ Custom Query __________________ #
     
-    def custom_query(self, query:str):
+    def custom_query(self, query:str, values:tuple = None, commit:bool = False):
         '''
         Creates a custom query for potential user use.
+        Returns the fetched rows for statements that produce a result set, otherwise the affected row count.
+        '''
+        try:
+            self.cursor.execute(query, values or ())
+            if self.cursor.with_rows:
+                return self.cursor.fetchall()
+            if commit:
+                self.__commit()
+            if SCHEMA_CHANGE.match(query):
+                self.reset_statements() # the affected table is not parsed out of free-form SQL
+            return self.cursor.rowcount
+        
+        except mysql.connector.Error as error:
+            print(f"SQL Error running custom query: {error}")
+            return None
+    
+    # __________________ Aggregates __________________ #
+    
+    def __stats_select(self, name: str, metrics: list, tickers: list, start=None, end=None, window_name: str = 'custom'):
         '''
-        pass 
+        Builds a SELECT that computes mean, median, std, low, max and count per ticker and metric
+        straight from `{name}_bars`, one UNION ALL branch per metric.
+        MySQL has no MEDIAN aggregate, so the median averages the middle one or two rows of a ROW_NUMBER ranking.
+        '''
+        where = f"ticker IN ({', '.join(['%s'] * len(tickers))})"
+        where_values = list(tickers)
+        if start is not None:
+            where += " AND ts >= %s"
+            where_values.append(start)
+        if end is not None:
+            where += " AND ts < %s"
+            where_values.append(end)
+        
+        branches = []
+        values = []
+        for metric in metrics:
+            branches.append(f"""
+                SELECT ticker, '{metric}' AS metric, %s AS window_name,
+                    AVG(v) AS mean,
+                    AVG(CASE WHEN rn IN (FLOOR((cnt + 1) / 2), CEIL((cnt + 1) / 2)) THEN v END) AS median,
+                    STDDEV_SAMP(v) AS std,
+                    MIN(v) AS low,
+                    MAX(v) AS max,
+                    COUNT(v) AS count
+                FROM (
+                    SELECT ticker, {metric} AS v,
+                        ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY {metric}) AS rn,
+                        COUNT(*) OVER (PARTITION BY ticker) AS cnt
+                    FROM {name}_bars
+                    WHERE {where} AND {metric} IS NOT NULL
+                ) AS ranked
+                GROUP BY ticker""")
+            values.append(window_name)
+            values.extend(where_values)
+        
+        return " UNION ALL ".join(branches), values
+    
+    def query_refresh_summary(self, name: str, tickers: list, window_name: str, start=None, refreshed_at=None) -> int:
+        '''
+        Recomputes `{name}_summary` rows of one window for the given tickers only.
+        The old rows are deleted and the new ones are produced by INSERT ... SELECT, so the raw
+        bars never leave the server. Both statements share one transaction.
+        `refreshed_at` (naive UTC, default now) is stored with the rows so expired trailing windows can be found.
+        '''
+        metrics = BAR_METRICS.get(name)
+        if not self.cursor or not metrics or not tickers:
+            return 400
+        
+        select, values = self.__stats_select(name, metrics, tickers, start=start, window_name=window_name)
+        ticker_placeholders = ', '.join(['%s'] * len(tickers))
+        
+        try:
+            self.cursor.execute(
+                f"DELETE FROM {name}_summary WHERE window_name = %s AND ticker IN ({ticker_placeholders})",
+                [window_name, *tickers]
+            )
+            self.cursor.execute(
+                f"INSERT INTO {name}_summary (ticker, metric, window_name, mean, median, std, low, max, count, refreshed_at) "
+                f"SELECT stats.*, %s FROM ({select}) AS stats",
+                [refreshed_at or datetime.now(timezone.utc).replace(tzinfo=None), *values]
+            )
+            self.__commit()
+            return 201
+        
+        except mysql.connector.Error as error:
+            self.conn.rollback()
+            print(f"SQL Error refreshing summary: {error}")
+            return 400
+    
+    def query_refresh_sketches(self, name: str, ticker: str, periods: list, compression: int = 100) -> int:
+        '''
+        Rebuilds the monthly sketches of one ticker for the given 'YYYY-MM' periods from `{name}_bars`.
+        Only the bars of those months are read. Returns 201 on success, 400 otherwise.
+        '''
+        metrics = BAR_METRICS.get(name)
+        if not self.cursor or not metrics:
+            return 400
+        
+        rows = []
+        for period in sorted(set(periods)):
+            start, end = month_bounds(period)
+            try:
+                self.cursor.execute(
+                    f"SELECT {', '.join(metrics)} FROM {name}_bars WHERE ticker = %s AND ts >= %s AND ts < %s",
+                    (ticker, start, end)
+                )
+                bars = self.cursor.fetchall()
+            except mysql.connector.Error as error:
+                print(f"SQL Error reading bars for sketches: {error}")
+                return 400
+            
+            if not bars:
+                continue
+            
+            columns = list(zip(*bars))
+            for metric, values in zip(metrics, columns):
+                digest = TDigest(compression).add_many([value for value in values if value is not None])
+                rows.append((ticker, metric, period, digest.to_json(), int(digest.count)))
+        
+        return self.query_submit_many(
+            f"{name}_sketches", ['ticker', 'metric', 'period', 'sketch', 'count'], rows, upsert=True
+        )
+    
+    def query_window_stats(self, name: str, ticker: str, start=None, end=None) -> list:
+        '''
+        Computes the statistics of a single ticker over [start, end) on the server.
+        Returns rows of (ticker, metric, window_name, mean, median, std, low, max, count).
+        '''
+        metrics = BAR_METRICS.get(name)
+        if not self.cursor or not metrics:
+            return []
+        
+        select, values = self.__stats_select(name, metrics, [ticker], start=start, end=end)
+        try:
+            self.cursor.execute(select, values)
+            return self.cursor.fetchall()
+        
+        except mysql.connector.Error as error:
+            print(f"SQL Error computing window stats: {error}")
+            return []
     
     # ___________________ Danger Zone ___________________ #
     
@@ -179,7 +878,7 @@ class Connection:
             query = f"DELETE FROM {table_name} WHERE {condition}"
             try:
                 self.cursor.execute(query, values or [])
-                self.conn.commit()
+                self.__commit()
                 print(f"Deleted {self.cursor.rowcount} record(s) from {table_name}.")
                 return 200
             
@@ -191,7 +890,8 @@ class Connection:
             if user_input == 'Y':
                 try:
                     self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-                    self.conn.commit()
+                    self.__commit()
+                    self.reset_statements(table_name)
                     print(f" Table '{table_name}' dropped.")
                     return 200
                 except mysql.connector.Error as error:
@@ -0,0 +1,164 @@
+import itertools
+import time
+
+import mysql.connector
+
+# _____________________________________ Read Replicas _____________________________________ #
+
+# Reads that can tolerate replication lag (dashboards, table listings) are spread over read replicas,
+# while every write stays on the primary. A replica that loses its connection or fails a health check is
+# skipped for `retry_after` seconds, and reads fall back to the primary when no replica is available.
+# Errors in the query itself (bad SQL, unknown column) say nothing about the replica and are not counted.
+
+# client errors meaning the server could not be reached or the session died:
+# 2003 can't connect, 2006 server has gone away, 2013 lost connection during query
+CONNECTION_ERRNOS = {2003, 2006, 2013}
+
+
+def is_connection_error(error: Exception) -> bool:
+    '''
+    True for errors that mean the server or the session is gone, False for errors in the query itself.
+    '''
+    if isinstance(error, (mysql.connector.InterfaceError, mysql.connector.OperationalError)):
+        return True
+    return getattr(error, 'errno', None) in CONNECTION_ERRNOS
+
+
+def parse_endpoint(endpoint: str, default_port: int = 3306):
+    '''
+    Splits 'host' or 'host:port' into (host, port).
+    '''
+    host, _, port = endpoint.strip().partition(':')
+    return host, int(port) if port else default_port
+
+
+def parse_endpoints(endpoints) -> list:
+    '''
+    Accepts a comma separated string (e.g. the `db_replicas` environment variable) or a list
+    and returns a list of (host, port) tuples.
+    '''
+    if isinstance(endpoints, str):
+        endpoints = [endpoint for endpoint in endpoints.split(',') if endpoint.strip()]
+    return [parse_endpoint(endpoint) if isinstance(endpoint, str) else tuple(endpoint) for endpoint in endpoints or []]
+
+
+class Endpoint:
+    '''
+    One lazily opened connection to a replica.
+
+    Parameters:
+    - host, port: Where the server listens
+    - connect: Callable (host, port) -> connection, e.g. a wrapper around mysql.connector.connect
+    - on_reconnect: Optional callable (name) run whenever a new session is opened. Server-side state
+      of the old session, such as prepared statements, is gone by then.
+    '''
+
+    def __init__(self, host: str, port: int, connect, on_reconnect=None) -> None:
+
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.connect = connect
+        self.on_reconnect = on_reconnect
+
+        self.conn = None
+        self.down_until = 0.0
+        self.failures = 0
+
+    def connection(self):
+        '''
+        Returns an open connection, reconnecting if needed. Raises mysql.connector.Error when the server is unreachable.
+        '''
+        if self.conn is None or not self.conn.is_connected():
+            self.close()
+            self.conn = self.connect(self.host, self.port)
+            if self.on_reconnect:
+                self.on_reconnect(self.name)
+        return self.conn
+
+    def mark_down(self, until: float):
+        self.down_until = until
+        self.failures += 1
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except mysql.connector.Error:
+                pass # already gone
+            self.conn = None
+
+
+class ReplicaPool:
+    '''
+    Round-robin pool of read replicas with passive and active health checks.
+
+    Parameters:
+    - endpoints (list): (host, port) tuples
+    - connect (callable): (host, port) -> connection
+    - retry_after (float): Seconds a failed replica is skipped before it is tried again
+    - clock (callable): Source of the current time, mostly useful for tests
+    - on_reconnect (callable): (name) -> None, run when a replica's session is replaced (see Endpoint)
+    '''
+
+    def __init__(self, endpoints: list, connect, retry_after: float = 30.0, clock=time.monotonic, on_reconnect=None) -> None:
+
+        self.endpoints = [Endpoint(host, port, connect, on_reconnect) for host, port in endpoints]
+        self.retry_after = retry_after
+        self.clock = clock
+        self.__turn = itertools.count()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def choose(self):
+        '''
+        Returns the next available replica (Endpoint), or None when every replica is down.
+        '''
+        if not self.endpoints:
+            return None
+
+        start = next(self.__turn)
+        for offset in range(len(self.endpoints)):
+            endpoint = self.endpoints[(start + offset) % len(self.endpoints)]
+            if endpoint.down_until > self.clock():
+                continue
+            try:
+                endpoint.connection()
+                return endpoint
+            except mysql.connector.Error as error:
+                print(f"Replica {endpoint.name} is unavailable. Error: {error}")
+                self.mark_down(endpoint)
+        return None
+
+    def mark_down(self, endpoint: Endpoint):
+        endpoint.mark_down(self.clock() + self.retry_after)
+
+    def check(self) -> dict:
+        '''
+        Pings every replica, including those marked down, and updates their status.
+
+        Returns:
+        - Dictionary of replica name -> True if healthy
+        '''
+        status = {}
+        for endpoint in self.endpoints:
+            try:
+                try:
+                    endpoint.connection().ping(reconnect=False)
+                except mysql.connector.Error:
+                    # reconnect through the endpoint rather than ping(reconnect=True), so on_reconnect runs
+                    endpoint.close()
+                    endpoint.connection().ping(reconnect=False)
+                endpoint.down_until = 0.0
+                status[endpoint.name] = True
+            except mysql.connector.Error as error:
+                print(f"Health check failed for replica {endpoint.name}. Error: {error}")
+                self.mark_down(endpoint)
+                status[endpoint.name] = False
+        return status
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.close()
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+from flask import Flask
+
+# Add project root to path for imports to work when running directly
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.blueprints.series import series
+
+
+def create_app(commander=None) -> Flask:
+    '''
+    Builds the web app.
+
+    Parameters:
+    - commander: The data layer the API reads from. A Commander (connected to the database) is
+      created when omitted; tests and load tests pass a stand-in with the same methods.
+
+    Every request thread shares this one Commander, and with it one MySQL connection. Access is
+    serialized: the Commander methods the API calls hold its `db_lock`, so concurrent requests take
+    turns on the connection instead of interleaving on it. For parallel reads run several worker
+    processes (e.g. `gunicorn -w 4 "backend.run_app:create_app()"`), each with its own Commander.
+    '''
+    if commander is None:
+        from backend.database.Commander import Commander
+        commander = Commander()
+
+    app = Flask(__name__)
+    app.config['COMMANDER'] = commander
+    app.register_blueprint(series)
+    return app
+
+
+if __name__ == "__main__":
+    create_app().run(debug=True)
@@ -0,0 +1,247 @@
+import sys
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.analysis.AI import AI, build_summary_prompt
+from backend.analysis.cache import PromptCache
+from backend.utils.rate_limit import RateLimiter
+
+
+class FakeClient:
+    '''
+    Local stand-in for the OpenAI client. Answers batched prompts with a JSON object
+    keyed by every ticker mentioned, and plain prompts with a fixed sentence.
+    '''
+    def __init__(self, tickers=()):
+        self.tickers = tickers
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.calls.append(prompt)
+
+        if "JSON object" in prompt:
+            content = json.dumps({ticker: f"{ticker} looks fine" for ticker in self.tickers if f" {ticker} " in prompt})
+        else:
+            content = "Looks fine"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class StreamingStub:
+    '''
+    Local stand-in that simulates latency: every answer is streamed as `chunks` words,
+    each one arriving `delay` seconds after the previous one.
+    '''
+    def __init__(self, delay=0.02, chunks=5):
+        self.delay = delay
+        self.chunks = chunks
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, timeout=None):
+        prompt = messages[-1]["content"]
+        words = [f"{prompt}-{position} " for position in range(self.chunks)]
+        if not stream:
+            with self:
+                time.sleep(self.delay * self.chunks)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(words)))])
+        return self.stream(words)
+
+    def stream(self, words):
+        with self:
+            for word in words:
+                time.sleep(self.delay)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+
+    def __enter__(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.active -= 1
+
+
+STATS = {"close": {"mean": 10.0, "std": 1.0, "median": 10.0, "low": 8.0, "max": 12.0}}
+
+
+def test_repeated_prompt_is_served_from_cache():
+    client = FakeClient()
+    ai = AI(client=client, cache=PromptCache())
+
+    first = ai.request_query("Describe IBM")
+    second = ai.request_query("  Describe   IBM ")
+
+    assert first["response"] == second["response"] == "Looks fine"
+    assert second["cached"]
+    assert len(client.calls) == 1
+
+
+def test_changed_stats_and_expiry_miss_the_cache():
+    now = [0.0]
+    client = FakeClient()
+    ai = AI(client=client, cache=PromptCache(ttl=60, clock=lambda: now[0]))
+    prompt = build_summary_prompt("IBM", STATS)
+
+    ai.request_query(prompt, ticker="IBM", stats=STATS)
+    ai.request_query(prompt, ticker="IBM", stats={"close": {"mean": 11.0}})
+    assert len(client.calls) == 2
+
+    now[0] = 120
+    ai.request_query(prompt, ticker="IBM", stats=STATS)
+    assert len(client.calls) == 3
+
+    assert ai.cache.invalidate("IBM") == 1
+
+
+def test_cache_is_bounded_and_persisted(tmp_path):
+    path = tmp_path / "prompts.json"
+    ai = AI(client=FakeClient(), cache=PromptCache(path=str(path), max_entries=2))
+
+    for prompt in ("one", "two", "three"):
+        ai.request_query(prompt)
+    ai.cache.flush()
+
+    reloaded = PromptCache(path=str(path))
+    assert len(reloaded) == 2
+    assert reloaded.get(PromptCache.key(ai.model, "one")) is None
+    assert reloaded.get(PromptCache.key(ai.model, "three")) == "Looks fine"
+
+
+def test_batches_and_fan_outs_write_the_cache_once(tmp_path, monkeypatch):
+    from backend.analysis import cache as cache_module
+    writes = []
+    monkeypatch.setattr(cache_module, "write_json_atomic", lambda path, data: writes.append(len(data)))
+    tickers = ["IBM", "AAPL", "BTC"]
+    ai = AI(client=FakeClient(tickers), cache=PromptCache(path=str(tmp_path / "prompts.json")))
+
+    ai.request_summaries({ticker: STATS for ticker in tickers}, batch_size=1)
+    assert writes == [3]
+
+    ai.request_many({f"T{number}": f"Describe T{number}" for number in range(20)}, concurrency=4)
+    assert writes == [3, 23]
+
+    # all answers cached: nothing changed, nothing written
+    ai.request_summaries({ticker: STATS for ticker in tickers})
+    assert writes == [3, 23] and not ai.cache.dirty
+
+
+def test_fan_out_shares_one_file_backed_cache(tmp_path):
+    def clock():
+        # give up the GIL on every expiry check, so other workers run in the middle of a save
+        time.sleep(0)
+        return time.time()
+
+    path = tmp_path / "prompts.json"
+    cache = PromptCache(path=str(path), max_entries=200, clock=clock)
+    ai = AI(client=FakeClient(), cache=cache)
+    prompts = {f"T{number}": f"Describe T{number}" for number in range(400)}
+
+    # every worker reads, writes and evicts the same cache while the caller saves it now and then
+    done = []
+    def on_result(key, result):
+        done.append(key)
+        if len(done) % 50 == 0:
+            cache.save()
+
+    results = ai.request_many(prompts, concurrency=32, on_result=on_result)
+
+    assert all(result["message"] == "success" for result in results.values())
+    assert len(cache) == 200
+    assert len(PromptCache(path=str(path))) == 200
+
+
+def test_batched_summaries_are_split_and_cached_per_ticker():
+    tickers = ["IBM", "AAPL", "BTC"]
+    client = FakeClient(tickers)
+    ai = AI(client=client, cache=PromptCache())
+
+    results = ai.request_summaries({ticker: STATS for ticker in tickers}, batch_size=2)
+
+    assert len(client.calls) == 2
+    assert {ticker: result["response"] for ticker, result in results.items()} == {
+        ticker: f"{ticker} looks fine" for ticker in tickers
+    }
+
+    # a single request for one of those tickers is now a cache hit
+    single = ai.request_query(build_summary_prompt("AAPL", STATS), ticker="AAPL", stats=STATS)
+    assert single["cached"]
+    assert len(client.calls) == 2
+
+
+def test_fan_out_is_bounded_and_concurrent():
+    stub = StreamingStub(delay=0.02, chunks=5)
+    ai = AI(client=stub)
+    prompts = {f"T{number}": f"T{number}" for number in range(16)}
+
+    started = time.monotonic()
+    results = ai.request_many(prompts, concurrency=4)
+    elapsed = time.monotonic() - started
+
+    assert stub.peak == 4
+    assert all(result["message"] == "success" for result in results.values())
+    assert results["T3"]["response"].startswith("T3-0")
+    assert elapsed < 16 * 0.1 / 2 # serial would take 1.6s
+
+
+def test_streaming_tokens_arrive_before_completion():
+    ai = AI(client=StreamingStub(delay=0.01, chunks=3))
+
+    events = list(ai.stream_many({"IBM": "IBM", "BTC": "BTC"}, concurrency=2))
+
+    kinds = [kind for kind, _, _ in events]
+    assert kinds.index("token") < kinds.index("done")
+    assert kinds.count("token") == 6 and kinds.count("done") == 2
+    done = {key: result for kind, key, result in events if kind == "done"}
+    assert done["BTC"]["response"] == "BTC-0 BTC-1 BTC-2 "
+
+
+def test_cancel_and_timeout_cut_streams_short():
+    ai = AI(client=StreamingStub(delay=0.02, chunks=50))
+
+    cancel = threading.Event()
+    tokens = []
+    def on_token(key, token):
+        tokens.append(token)
+        if len(tokens) == 2:
+            cancel.set()
+
+    cancelled = ai.request_many({"IBM": "IBM"}, on_token=on_token, cancel_event=cancel)
+    assert cancelled["IBM"]["message"] == "cancelled"
+    assert cancelled["IBM"]["response"] == "IBM-0 IBM-1 "
+
+    timed_out = ai.stream_query("BTC", timeout=0.1)
+    assert timed_out["message"] == "timeout"
+
+
+def test_rate_limiter_spaces_requests():
+    ai = AI(client=StreamingStub(delay=0, chunks=1), rate_limiter=RateLimiter(rate=50, burst=1))
+
+    started = time.monotonic()
+    ai.request_many({f"T{number}": f"T{number}" for number in range(6)}, concurrency=6)
+
+    assert time.monotonic() - started >= 5 / 50 * 0.9
+
+
+if __name__ == "__main__":
+    import tempfile
+    test_repeated_prompt_is_served_from_cache()
+    test_changed_stats_and_expiry_miss_the_cache()
+    test_cache_is_bounded_and_persisted(Path(tempfile.mkdtemp()))
+    test_fan_out_shares_one_file_backed_cache(Path(tempfile.mkdtemp()))
+    test_batched_summaries_are_split_and_cached_per_ticker()
+    test_fan_out_is_bounded_and_concurrent()
+    test_streaming_tokens_arrive_before_completion()
+    test_cancel_and_timeout_cut_streams_short()
+    test_rate_limiter_spaces_requests()
+    print("--- AI tests complete ---")
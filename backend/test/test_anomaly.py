@@ -0,0 +1,105 @@
+import sys
+import queue
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+
+from backend.analysis.anomaly import AnomalyDetector
+
+
+def make_bars(count, seed=3, start=1_700_000_000, step=86_400):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    volumes = rng.lognormal(14, 0.2, count)
+    return [{'time': start + i * step, 'close': float(c), 'volume': float(v)} for i, (c, v) in enumerate(zip(closes, volumes))]
+
+
+def test_quiet_series_raises_no_alerts():
+    detector = AnomalyDetector()
+    assert detector.update_many('IBM', make_bars(500)) == []
+
+
+def test_price_and_volume_shocks_are_flagged():
+    sink = queue.Queue()
+    detector = AnomalyDetector(sink=sink)
+    bars = make_bars(200)
+    detector.update_many('IBM', bars)
+
+    last = bars[-1]
+    crash = {'time': last['time'] + 86_400, 'close': last['close'] * 0.85, 'volume': last['volume'] * 8}
+    alerts = detector.update('IBM', crash)
+
+    assert sorted(alert['kind'] for alert in alerts) == ['price', 'volume']
+    price = next(alert for alert in alerts if alert['kind'] == 'price')
+    assert price['zscore'] < -4 and price['time'] == crash['time']
+    assert [sink.get_nowait()['kind'] for _ in range(2)] == [alert['kind'] for alert in alerts]
+
+
+def test_warmup_and_stale_bars_are_ignored():
+    detector = AnomalyDetector(warmup=50)
+    bars = make_bars(30)
+    detector.update_many('IBM', bars)
+    shock = {'time': bars[-1]['time'] + 86_400, 'close': bars[-1]['close'] * 2, 'volume': 1e12}
+    assert detector.update('IBM', shock) == []
+
+    count = detector.state['IBM'][0]
+    assert detector.update_many('IBM', bars) == []
+    assert detector.state['IBM'][0] == count
+
+
+def test_state_survives_a_restart(tmp_path):
+    bars = make_bars(300)
+    continuous = AnomalyDetector(z_threshold=2.5)
+    expected = continuous.update_many('IBM', bars)
+
+    first = AnomalyDetector(z_threshold=2.5)
+    alerts = first.update_many('IBM', bars[:150])
+    first.save(str(tmp_path / "detector.json"))
+
+    restored = AnomalyDetector.load(str(tmp_path / "detector.json"))
+    alerts += restored.update_many('IBM', bars)  # the first half is skipped as already seen
+
+    strip = lambda found: [(alert['time'], alert['kind'], round(alert['zscore'], 9)) for alert in found]
+    assert expected and strip(alerts) == strip(expected)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    sink = queue.Queue(maxsize=1)
+    detector = AnomalyDetector(warmup=2, sink=sink)
+    bars = make_bars(10)
+    raised = []
+    for ticker in ('A', 'B'):
+        raised += detector.update_many(ticker, bars)
+        raised += detector.update(ticker, {'time': bars[-1]['time'] + 1, 'close': bars[-1]['close'] * 3, 'volume': None})
+
+    assert len(raised) >= 2
+    assert sink.qsize() == 1 and detector.dropped == len(raised) - 1
+
+
+def test_thousands_of_tickers_per_second():
+    detector = AnomalyDetector()
+    tickers = [f"T{i}" for i in range(5_000)]
+    for ticker in tickers:
+        detector.update(ticker, {'time': 0, 'close': 100.0, 'volume': 1e6})
+
+    started = time.perf_counter()
+    for ticker in tickers:
+        detector.update(ticker, {'time': 60, 'close': 100.5, 'volume': 1.1e6})
+    assert time.perf_counter() - started < 1.0
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_quiet_series_raises_no_alerts()
+    test_price_and_volume_shocks_are_flagged()
+    test_warmup_and_stale_bars_are_ignored()
+    with tempfile.TemporaryDirectory() as directory:
+        test_state_survives_a_restart(Path(directory))
+    test_full_queue_drops_instead_of_blocking()
+    test_thousands_of_tickers_per_second()
+    print("--- Anomaly detection tests complete ---")
@@ -0,0 +1,136 @@
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+import pytest
+
+from backend.database.Commander import Commander
+from backend.database.Connection import BAR_METRICS, Connection
+from backend.utils.standins import StandInDatabase, StandInProvider
+
+
+class RecordingDatabase(StandInDatabase):
+    '''
+    Stand-in that keeps every statement it runs and answers the partition lookup with `bounds`.
+    '''
+
+    def __init__(self, bounds=()):
+        super().__init__()
+        self.queries = []
+        self.bounds = list(bounds)
+
+    def run(self, query, values):
+        self.queries.append(" ".join(query.split()))
+        if "INFORMATION_SCHEMA.PARTITIONS" in query:
+            return [(f"'{bound}'",) for bound in self.bounds], len(self.bounds)
+        return super().run(query, values)
+
+
+def months_until(first: datetime, months_ahead: int) -> int:
+    now = datetime.now()
+    return (now.year * 12 + now.month + months_ahead) - (first.year * 12 + first.month) + 1
+
+
+def store(db, rows):
+    bars = [('BTC', datetime(2024, 1, 1) + timedelta(days=day), float(day), float(day) * 10) for day in rows]
+    assert db.query_submit_many('crypto_bars', ['ticker', 'ts', 'close', 'volumeto'], bars, upsert=True) == 201
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    connection = Connection(connector=StandInDatabase().connect)
+    connection.query_create_bars_table('crypto')
+    return connection
+
+
+def test_partitioned_table_has_one_partition_per_month(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    database = RecordingDatabase()
+    assert Connection(connector=database.connect).query_create_bars_table('crypto', partition_from='2024-11', partition_months_ahead=2) == 'success'
+
+    create = next(query for query in database.queries if query.startswith("CREATE TABLE IF NOT EXISTS crypto_bars"))
+    assert "PRIMARY KEY (ticker, ts) ) PARTITION BY RANGE COLUMNS(ts) (" in create
+    assert "PARTITION p202411 VALUES LESS THAN ('2024-12-01'), PARTITION p202412 VALUES LESS THAN ('2025-01-01')" in create
+    assert create.endswith("PARTITION pmax VALUES LESS THAN (MAXVALUE) )")
+    assert create.count("PARTITION p") == months_until(datetime(2024, 11, 1), 2) + 1 # + pmax
+    assert "crypto_versions" in database.tables
+
+
+def test_partitions_are_added_by_splitting_pmax(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    now = datetime.now()
+    database = RecordingDatabase(bounds=[f"{now.year - 1:04d}-{now.month:02d}-01", f"{now.year:04d}-{now.month:02d}-01"])
+    connection = Connection(connector=database.connect)
+
+    assert connection.query_add_bar_partitions('crypto', months_ahead=1) == 'success'
+    alter = database.queries[-1]
+    # the newest bound is the first day of this month, so this month and the next one are added
+    assert alter.startswith(f"ALTER TABLE crypto_bars REORGANIZE PARTITION pmax INTO (PARTITION p{now:%Y%m} VALUES LESS THAN (")
+    assert alter.count("VALUES LESS THAN ('") == 2 and alter.endswith("PARTITION pmax VALUES LESS THAN (MAXVALUE))")
+
+    # partitions already reach far enough: nothing to reorganize
+    database.bounds = [f"{now.year + 5:04d}-01-01"]
+    statements = len(database.queries)
+    assert connection.query_add_bar_partitions('crypto', months_ahead=1) == 'success'
+    assert not any(query.startswith("ALTER") for query in database.queries[statements:])
+
+    database.bounds = []
+    assert connection.query_add_bar_partitions('crypto') == 'failure'
+
+
+def test_bar_ranges_limits_and_chunks(db):
+    store(db, range(5))
+
+    chunks = list(db.query_bars('crypto', 'BTC', columns=['close'], chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0][0] == (datetime(2024, 1, 1), 0.0)
+
+    # [start, end)
+    rows = [row for chunk in db.query_bars('crypto', 'BTC', datetime(2024, 1, 2), datetime(2024, 1, 4), ['close']) for row in chunk]
+    assert [row[1] for row in rows] == [1.0, 2.0]
+
+    # the oldest `limit` bars of the range
+    rows = [row for chunk in db.query_bars('crypto', 'BTC', start=datetime(2024, 1, 2), columns=['volumeto'], limit=2) for row in chunk]
+    assert rows == [(datetime(2024, 1, 2), 10.0), (datetime(2024, 1, 3), 20.0)]
+
+    assert list(db.query_bars('crypto', 'ETH')) == []
+
+
+def test_columns_are_whitelisted(db):
+    with pytest.raises(ValueError, match="Unknown columns"):
+        next(db.query_bars('crypto', 'BTC', columns=['close; DROP TABLE crypto_bars']))
+    with pytest.raises(ValueError, match="Unknown bar layout"):
+        next(db.query_bars('bonds', 'X'))
+    assert db.query_create_bars_table('bonds') == 'failure'
+
+
+def test_get_bars_as_frame_and_arrays(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    provider = StandInProvider(history=5, seed=0)
+    commander = Commander(connection_options={'connector': StandInDatabase().connect}, stock_fetcher=provider.fetch_stocks, crypto_fetcher=provider.fetch_crypto)
+    commander.query_create_bars_table('crypto')
+    store(commander, range(4))
+
+    frame = commander.get_bars('crypto', 'BTC', start=datetime(2024, 1, 2), columns=['close'])
+    assert list(frame.columns) == ['close'] and frame.index.name == 'ts'
+    assert frame['close'].tolist() == [1.0, 2.0, 3.0]
+
+    arrays = commander.get_bars('crypto', 'BTC', end=datetime(2024, 1, 3), as_frame=False, limit=1)
+    assert arrays['ts'].dtype == np.dtype('datetime64[s]') and arrays['ts'].tolist() == [datetime(2024, 1, 1)]
+    # columns that were never written come back as NaN
+    assert np.isnan(arrays['open'][0]) and arrays['volumeto'][0] == 0.0
+
+    empty = commander.get_bars('crypto', 'ETH', as_frame=False)
+    assert set(empty) == {'ts', *BAR_METRICS['crypto']} and len(empty['ts']) == 0
+    assert commander.get_bars('bonds', 'X').empty
+    assert commander.get_bars('crypto', 'BTC', columns=['bogus'], as_frame=False) == {}
+
+
+if __name__ == "__main__":
+    # the tests use pytest's fixtures, so the file runs through pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,133 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pandas as pd
+
+from backend.data.bulk_load import BulkLoader, normalize_chunk
+
+
+class FakeConnection:
+    '''
+    Records bulk writes instead of sending them to MySQL. Fails the write number `fail_on`, if set.
+    '''
+    def __init__(self, fail_on=None):
+        self.rows = []
+        self.files = []
+        self.refreshed = []
+        self.writes = 0
+        self.fail_on = fail_on
+        self.versions = []
+
+    def query_submit_many(self, table_name, columns, rows, upsert=False, batch_size=1000, versions=None):
+        self.writes += 1
+        self.versions.append(versions)
+        if self.writes == self.fail_on:
+            return 400
+        self.rows.extend(rows)
+        return 201
+
+    def query_load_infile(self, table_name, columns, path, versions=None):
+        self.writes += 1
+        self.versions.append(versions)
+        self.files.append(Path(path).read_text())
+        return 201
+
+    def query_refresh_summary(self, name, tickers, window_name, start=None):
+        self.refreshed.append((window_name, tuple(tickers)))
+        return 201
+
+    def query_refresh_sketches(self, name, ticker, periods, compression=100):
+        self.refreshed.append(("sketches", ticker, tuple(periods)))
+        return 201
+
+
+def write_dump(path, rows=10):
+    lines = ["Symbol,Date,Open,High,Low,Close,Volume"]
+    for day in range(rows):
+        lines.append(f"ibm,2024-01-{day + 1:02d},{100 + day},{105 + day},{95 + day},{101 + day},{1000 * day}")
+    lines.append("ibm,not a date,1,2,1,1,1")   # bad timestamp
+    lines.append("ibm,2024-02-01,10,5,8,9,1")  # high below low
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_normalize_maps_vendor_columns_and_rejects_bad_rows(tmp_path):
+    write_dump(tmp_path / "ibm.csv", rows=3)
+    raw = pd.read_csv(tmp_path / "ibm.csv", dtype=str)
+
+    clean, rejected = normalize_chunk(raw, "stocks")
+
+    assert rejected == 2
+    assert list(clean.columns) == ["ticker", "ts", "open", "high", "low", "close", "volume"]
+    assert clean["ticker"].tolist() == ["IBM"] * 3
+    assert clean["ts"].iloc[0] == pd.Timestamp("2024-01-01")
+
+
+def test_epoch_strings_with_a_bad_value_only_reject_that_row():
+    raw = pd.DataFrame({
+        "ticker": ["IBM"] * 4,
+        "time": ["1704067200", "1704153600", "bad", ""],
+        "open": ["1"] * 4, "high": ["2"] * 4, "low": ["1"] * 4, "close": ["2"] * 4, "volume": ["5"] * 4,
+    })
+
+    clean, rejected = normalize_chunk(raw, "stocks")
+
+    assert rejected == 2
+    assert clean["ts"].tolist() == [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-02")]
+
+
+def test_epoch_json_lines_dump(tmp_path):
+    path = tmp_path / "btc.jsonl"
+    path.write_text('{"time": 1704067200, "open": 1, "high": 2, "low": 1, "close": 2, "volumefrom": 5, "volumeto": 10}\n')
+
+    connection = FakeConnection()
+    report = BulkLoader(connection, "crypto", method="insert", checkpoint_path=str(tmp_path / "cp.json")).load_files([str(path)], ticker="BTC")
+
+    assert report["loaded"] == 1
+    ticker, ts, *values = connection.rows[0]
+    assert (ticker, ts.isoformat(), values) == ("BTC", "2024-01-01T00:00:00", [1.0, 2.0, 1.0, 2.0, 5.0, 10.0])
+
+
+def test_resumes_from_checkpoint_and_refreshes_summaries(tmp_path):
+    dump = tmp_path / "ibm.csv"
+    write_dump(dump, rows=10)
+    checkpoint = str(tmp_path / "cp.json")
+
+    failing = FakeConnection(fail_on=2)
+    first = BulkLoader(failing, "stocks", method="insert", chunk_size=4, checkpoint_path=checkpoint).load_files([str(dump)])
+    assert first["status"] == 400 and first["loaded"] == 4
+    assert not failing.refreshed
+
+    resumed = FakeConnection()
+    second = BulkLoader(resumed, "stocks", method="insert", chunk_size=4, checkpoint_path=checkpoint).load_files([str(dump)])
+    assert second["status"] == 201 and second["loaded"] == 6 and second["rejected"] == 2
+    assert [row[1].day for row in resumed.rows] == [5, 6, 7, 8, 9, 10]
+    assert ("all", ("IBM",)) in resumed.refreshed
+    assert ("sketches", "IBM", ("2024-01",)) in resumed.refreshed
+
+    again = BulkLoader(FakeConnection(), "stocks", method="insert", checkpoint_path=checkpoint).load_file(str(dump))
+    assert again["loaded"] == 0
+
+
+def test_infile_method_writes_headerless_csv(tmp_path):
+    dump = tmp_path / "ibm.csv"
+    write_dump(dump, rows=2)
+
+    connection = FakeConnection()
+    BulkLoader(connection, "stocks", method="infile", checkpoint_path=str(tmp_path / "cp.json")).load_files([str(dump)], refresh=False)
+
+    assert connection.files == ["IBM,2024-01-01 00:00:00,100.0,105.0,95.0,101.0,0.0\nIBM,2024-01-02 00:00:00,101.0,106.0,96.0,102.0,1000.0\n"]
+    # written in the same transaction as the bars, so API ETags change with them
+    assert connection.versions == [("stocks", ["IBM"])]
+
+
+if __name__ == "__main__":
+    import tempfile
+    test_normalize_maps_vendor_columns_and_rejects_bad_rows(Path(tempfile.mkdtemp()))
+    test_epoch_strings_with_a_bad_value_only_reject_that_row()
+    test_epoch_json_lines_dump(Path(tempfile.mkdtemp()))
+    test_resumes_from_checkpoint_and_refreshes_summaries(Path(tempfile.mkdtemp()))
+    test_infile_method_writes_headerless_csv(Path(tempfile.mkdtemp()))
+    print("--- Bulk load tests complete ---")
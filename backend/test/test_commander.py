@@ -0,0 +1,369 @@
+import sys
+import sqlite3
+import statistics
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import mysql.connector
+
+from backend.analysis.sketch import TDigest
+from backend.database.Commander import Commander
+from backend.database.Connection import Connection
+from backend.utils.standins import StandInDatabase, StandInProvider
+
+
+def make_commander(database=None, provider=None, **options):
+    '''
+    Commander on the stand-ins with the bar, summary and sketch tables created.
+    '''
+    database = database or StandInDatabase()
+    provider = provider or StandInProvider(history=5, seed=0)
+    commander = Commander(
+        connection_options={'connector': database.connect},
+        stock_fetcher=provider.fetch_stocks,
+        crypto_fetcher=provider.fetch_crypto,
+        **options
+    )
+    # a warm start may be storing bars on its background thread; Connection methods need the lock held
+    with commander.db_lock:
+        for name in ('stocks', 'crypto'):
+            commander.query_create_bars_table(name)
+            commander.query_create_summary_table(name)
+            commander.query_create_sketch_table(name)
+            commander.query_create_alerts_table(name)
+        commander.tables = commander.show_tables()
+    return commander
+
+
+def record_refreshes(commander):
+    calls = []
+    commander.query_refresh_summary = lambda name, tickers, window_name, start=None, refreshed_at=None: calls.append((name, window_name, tickers)) or 201
+    return calls
+
+
+class SQLiteServer:
+    '''
+    Connector running the statements on an in-memory SQLite database, so the summary SQL is actually evaluated.
+    Only the MySQL dialect differences that statement uses are translated: %s placeholders, decimal division,
+    STDDEV_SAMP, FLOOR/CEIL and ON UPDATE CURRENT_TIMESTAMP.
+    '''
+
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.create_function("FLOOR", 1, lambda value: None if value is None else int(value // 1))
+        self.db.create_function("CEIL", 1, lambda value: None if value is None else -int(-value // 1))
+        self.db.create_aggregate("STDDEV_SAMP", 1, SampleStd)
+
+    def connect(self, **kwargs):
+        return SQLiteConnection(self.db)
+
+
+class SampleStd:
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return statistics.stdev(self.values) if len(self.values) > 1 else None
+
+
+class SQLiteCursor:
+    def __init__(self, db):
+        self.cursor = db.cursor()
+
+    def execute(self, query, values=()):
+        query = query.replace("%s", "?").replace("/ 2)", "/ 2.0)").replace(" ON UPDATE CURRENT_TIMESTAMP", "")
+        try:
+            self.cursor.execute(query, [str(value) if isinstance(value, datetime) else value for value in values or ()])
+        except sqlite3.Error as error:
+            raise mysql.connector.ProgrammingError(msg=str(error))
+
+    def executemany(self, query, seq_values):
+        for values in seq_values:
+            self.execute(query, values)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        pass
+
+
+class SQLiteConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, prepared=False):
+        return SQLiteCursor(self.db)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def summary_rows(connection, table='crypto'):
+    rows = connection.query_extract(f"{table}_summary")
+    return {(row[0], row[1], row[2]): row[3:] for row in rows}
+
+
+def test_summary_sql_matches_python_statistics(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    server = SQLiteServer()
+    connection = Connection(connector=server.connect)
+    connection.query_create_bars_table('crypto')
+    connection.query_create_summary_table('crypto')
+
+    start = datetime(2024, 1, 3)
+    closes = {'BTC': [5.0, 1.0, 4.0, 2.0, 3.0, 9.0, 7.0], 'ETH': [7.0, 2.0, 8.0, None, 1.0, 4.0, 6.0], 'SOL': [1.0, 2.0]}
+    rows = [
+        (ticker, datetime(2024, 1, 1) + timedelta(days=day), close)
+        for ticker, values in closes.items() for day, close in enumerate(values)
+    ]
+    assert connection.query_submit_many('crypto_bars', ['ticker', 'ts', 'close'], rows) == 201
+
+    refreshed_at = datetime(2024, 2, 1, 12)
+    assert connection.query_refresh_summary('crypto', ['BTC', 'ETH'], '30d', start, refreshed_at=refreshed_at) == 201
+    summary = summary_rows(connection)
+
+    # SOL was not asked for; only bars from `start` on count, NULLs are skipped
+    assert {key[0] for key in summary} == {'BTC', 'ETH'}
+    for ticker in ('BTC', 'ETH'):
+        values = [value for value in closes[ticker][2:] if value is not None]
+        mean, median, std, low, high, count, stored_at = summary[(ticker, 'close', '30d')]
+        assert (mean, median, low, high, count) == (statistics.mean(values), statistics.median(values), min(values), max(values), len(values))
+        assert abs(std - statistics.stdev(values)) < 1e-12
+        assert stored_at == str(refreshed_at)
+    # an odd count (BTC: 4, 2, 3, 9, 7) takes the middle value, an even one (ETH: 8, 1, 4, 6) averages the middle two
+    assert summary[('BTC', 'close', '30d')][1] == 4.0 and summary[('ETH', 'close', '30d')][1] == 5.0
+    # metrics without any value produce no row
+    assert ('BTC', 'open', '30d') not in summary
+
+
+def test_refresh_skips_tickers_without_new_bars_and_recomputes_expired_windows(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    server = SQLiteServer()
+    provider = StandInProvider(history=5, seed=0)
+    commander = Commander(connection_options={'connector': server.connect}, stock_fetcher=provider.fetch_stocks, crypto_fetcher=provider.fetch_crypto)
+    commander.query_create_bars_table('crypto')
+    commander.query_create_summary_table('crypto')
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    recent, old = now - timedelta(days=2), now - timedelta(days=200)
+    rows = [(ticker, ts, 1.0) for ticker in ('BTC', 'ETH', 'SOL') for ts in (old, recent)]
+    assert commander.query_submit_many('crypto_bars', ['ticker', 'ts', 'close'], rows) == 201
+
+    # first refresh: everything is new
+    commander.pending_refresh['crypto'] = {'BTC': recent, 'ETH': recent, 'SOL': old}
+    assert commander.refresh_summaries('crypto') == 201
+    first = summary_rows(commander)
+    assert first[('BTC', 'close', '30d')][5] == 1 and first[('BTC', 'close', 'all')][5] == 2
+    # SOL's only new bar is older than the trailing windows, so only 'all' (and nothing trailing) was computed
+    assert ('SOL', 'close', 'all') in first and ('SOL', 'close', '30d') not in first
+
+    # ETH's 30d row is two days old; BTC receives a bar; SOL gets nothing
+    commander.cursor.execute("UPDATE crypto_summary SET refreshed_at = %s WHERE ticker = %s AND window_name = %s", (now - timedelta(days=2), 'ETH', '30d'))
+    commander.conn.commit()
+    assert commander.query_submit_many('crypto_bars', ['ticker', 'ts', 'close'], [('BTC', now - timedelta(hours=1), 4.0)]) == 201
+    commander.pending_refresh['crypto'] = {'BTC': now - timedelta(hours=1)}
+    assert commander.refresh_summaries('crypto') == 201
+    second = summary_rows(commander)
+
+    assert second[('BTC', 'close', '30d')][0] == 2.5 and second[('BTC', 'close', 'all')][5] == 3
+    # ETH had no new bars, but its expired trailing window was recomputed; its fresh windows were left alone
+    assert second[('ETH', 'close', '30d')][6] > first[('ETH', 'close', '30d')][6]
+    assert second[('ETH', 'close', 'all')] == first[('ETH', 'close', 'all')]
+    assert second[('SOL', 'close', 'all')] == first[('SOL', 'close', 'all')]
+
+
+def test_alerts_are_stored_not_queued(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    commander = make_commander()
+    steady = [{'time': 1_700_000_000 + day * 86_400, 'close': 100.0 + (day % 2), 'volumeto': 1e6} for day in range(30)]
+    shock = {'time': steady[-1]['time'] + 86_400, 'close': 300.0, 'volumeto': 1e6}
+
+    assert commander.store_bars('crypto', 'SHOCK', steady + [shock]) == 201
+
+    # the table is the only sink: nothing piles up in memory waiting for a consumer
+    assert [(row[0], row[2]) for row in commander.get_alerts('crypto', 'SHOCK')] == [('SHOCK', 'price')]
+    assert all(detector.sink is None for detector in commander.detectors.values())
+
+
+def test_expired_trailing_windows_are_refreshed_without_new_bars(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    commander = make_commander()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = [
+        ('BTC', 'close', '30d', 1.0, 1.0, 0.0, 1.0, 1.0, 1, now - timedelta(days=3)),
+        ('ETH', 'close', '30d', 1.0, 1.0, 0.0, 1.0, 1.0, 1, now - timedelta(hours=1)),
+        ('BTC', 'close', 'all', 1.0, 1.0, 0.0, 1.0, 1.0, 1, now - timedelta(days=3)),
+    ]
+    columns = ['ticker', 'metric', 'window_name', 'mean', 'median', 'std', 'low', 'max', 'count', 'refreshed_at']
+    assert commander.query_submit_many('crypto_summary', columns, rows) == 201
+
+    calls = record_refreshes(commander)
+    assert commander.refresh_summaries('crypto') == 201
+    # only the trailing window that is more than a day old; 'all' never slides
+    assert calls == [('crypto', '30d', ['BTC'])]
+
+
+def test_pending_tickers_are_refreshed_once_per_window(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    commander = make_commander()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    commander.pending_refresh['crypto'] = {'BTC': now, 'OLD': now - timedelta(days=60)}
+
+    calls = record_refreshes(commander)
+    assert commander.refresh_summaries('crypto') == 201
+    assert ('crypto', 'all', ['BTC', 'OLD']) in calls
+    assert ('crypto', '30d', ['BTC']) in calls
+    assert commander.pending_refresh['crypto'] == {}
+
+
+def test_percentile_range_end_is_exclusive(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    commander = make_commander()
+    rows = [
+        ('BTC', 'close', period, TDigest().add_many([value] * 10).to_json(), 10)
+        for period, value in (('2024-05', 1.0), ('2024-06', 2.0), ('2024-07', 3.0))
+    ]
+    assert commander.query_submit_many('crypto_sketches', ['ticker', 'metric', 'period', 'sketch', 'count'], rows) == 201
+
+    # [May 1, Jul 1) is May and June only
+    result = commander.get_percentiles('crypto', 'BTC', 'close', [0.0, 1.0], datetime(2024, 5, 1), datetime(2024, 7, 1))
+    assert result['count'] == 20 and result[1.0] == 2.0
+    # an end inside July rounds out to the whole month
+    assert commander.get_percentiles('crypto', 'BTC', 'close', [1.0], datetime(2024, 5, 1), datetime(2024, 7, 2))['count'] == 30
+    assert commander.get_percentiles('crypto', 'BTC', 'close', [1.0], end=datetime(2024, 6, 1))['count'] == 10
+
+
+class CountingProvider(StandInProvider):
+    '''
+    Stand-in provider that counts fetches and can be told to fail them.
+    '''
+
+    def __init__(self, error=None, **options):
+        super().__init__(history=5, seed=1, **options)
+        self.fetches = []
+        self.error = error
+
+    def fetch_stocks(self, params):
+        self.fetches.append('stocks')
+        if self.error:
+            raise self.error
+        return super().fetch_stocks(params)
+
+    def fetch_crypto(self, symbol, days=30):
+        self.fetches.append('crypto')
+        if self.error:
+            raise self.error
+        return super().fetch_crypto(symbol, days)
+
+
+def test_fresh_snapshot_starts_warm_with_pending_work(monkeypatch, tmp_path):
+    monkeypatch.setenv("db_password", "stand-in")
+    path = str(tmp_path / "commander.json")
+    database = StandInDatabase()
+    first = make_commander(database, snapshot_path=path)
+    first.pending_refresh['crypto']['BTC'] = datetime(2024, 5, 1)
+    first.pending_sketches['crypto']['BTC'] = {'2024-05'}
+    first.detectors['crypto'].update('BTC', {'time': 1, 'close': 10.0, 'volumeto': 5.0})
+    assert first.save_snapshot() == 201
+
+    provider = CountingProvider()
+    second = make_commander(database, provider, snapshot_path=path)
+
+    assert provider.fetches == [] and second.revalidated.is_set()
+    assert second.crypto_data == {key: value for key, value in first.crypto_data.items() if key != 'bars'}
+    assert second.pending_refresh['crypto'] == {'BTC': datetime(2024, 5, 1)}
+    assert second.pending_sketches['crypto'] == {'BTC': {'2024-05'}}
+    assert second.detectors['crypto'].state == first.detectors['crypto'].state
+
+
+def test_snapshot_taken_with_other_parameters_is_ignored(monkeypatch, tmp_path):
+    monkeypatch.setenv("db_password", "stand-in")
+    path = str(tmp_path / "commander.json")
+    make_commander(snapshot_path=path).save_snapshot()
+
+    provider = CountingProvider()
+    commander = make_commander(provider=provider, snapshot_path=path, crypto_ticker='ETH')
+
+    # cold start: both datasets are fetched before the constructor returns
+    assert sorted(provider.fetches) == ['crypto', 'stocks']
+    assert 'ETH' in commander.crypto_data and commander.revalidated.is_set()
+
+
+def test_stale_snapshot_is_refetched_and_stored_in_the_background(monkeypatch, tmp_path):
+    monkeypatch.setenv("db_password", "stand-in")
+    path = str(tmp_path / "commander.json")
+    database = StandInDatabase()
+    make_commander(database, snapshot_path=path).save_snapshot()
+
+    provider = CountingProvider()
+    commander = make_commander(database, provider, snapshot_path=path, snapshot_max_age=0)
+
+    assert commander.revalidated.wait(timeout=10)
+    assert commander.revalidate_error is None
+    assert sorted(provider.fetches) == ['crypto', 'stocks']
+    # the refetched bars reached the database, the detectors and the summary queue
+    bars = len(commander.crypto_data['bars'])
+    assert len(commander.get_bars('crypto', 'BTC', as_frame=False)['ts']) == bars
+    assert len(commander.get_bars('stocks', 'IBM', as_frame=False)['ts']) == len(commander.stock_data['bars'])
+    assert commander.detectors['crypto'].state['BTC'][0] == bars
+    assert commander.pending_refresh['crypto'] == {}
+
+
+def test_failed_revalidation_still_sets_the_event(monkeypatch, tmp_path):
+    monkeypatch.setenv("db_password", "stand-in")
+    path = str(tmp_path / "commander.json")
+    make_commander(snapshot_path=path).save_snapshot()
+
+    provider = CountingProvider(error=ValueError("error payload"))
+    commander = make_commander(provider=provider, snapshot_path=path, snapshot_max_age=0)
+
+    assert commander.revalidated.wait(timeout=10)
+    assert isinstance(commander.revalidate_error, ValueError)
+    assert commander.stock_data is not None # the restored copy is kept
+
+
+def test_snapshot_can_be_saved_while_bars_are_stored(monkeypatch, tmp_path):
+    monkeypatch.setenv("db_password", "stand-in")
+    commander = make_commander(snapshot_path=str(tmp_path / "commander.json"))
+    # a long pending list keeps every save iterating long enough to overlap the writes
+    commander.pending_sketches['crypto'] = {f"OLD{number}": {'2024-01'} for number in range(20_000)}
+    statuses = []
+    done = threading.Event()
+
+    def save():
+        while not done.is_set():
+            statuses.append(commander.save_snapshot())
+
+    saver = threading.Thread(target=save)
+    saver.start()
+    try:
+        for number in range(100):
+            commander.store_bars('crypto', f"T{number}", [{'time': 1_700_000_000 + number, 'close': 1.0, 'volumeto': 1.0}])
+    finally:
+        done.set()
+        saver.join()
+
+    assert statuses and set(statuses) == {201}
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
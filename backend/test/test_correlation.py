@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from backend.analysis.correlation import CorrelationEngine, align_prices, rolling_correlation
+
+
+def make_universe():
+    rng = np.random.default_rng(7)
+    days = pd.date_range("2023-01-01", periods=120, freq="D")
+    weekdays = days[days.dayofweek < 5]
+
+    stock = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(weekdays)))), index=weekdays)
+    stock = stock.drop(weekdays[10]) # a market holiday
+    coin = pd.Series(20_000 * np.exp(np.cumsum(rng.normal(0, 0.03, len(days)))), index=days)
+    late_coin = coin.iloc[60:] * 0.01 + rng.normal(0, 1, len(days) - 60)
+
+    return {"IBM": stock, "BTC": coin, "NEW": late_coin}
+
+
+def expected_returns(prices):
+    log_prices = np.log(prices)
+    return log_prices - log_prices.ffill().shift(1)
+
+
+def test_align_prices_business_calendar_drops_weekends():
+    prices = align_prices(make_universe())
+    assert (prices.index.dayofweek < 5).all()
+    assert prices["IBM"].isna().sum() == 1
+    assert len(align_prices(make_universe(), calendar="daily")) == 120
+
+
+def test_matches_pandas_pairwise_statistics():
+    prices = align_prices(make_universe())
+    engine = CorrelationEngine()
+    engine.update(prices)
+
+    returns = expected_returns(prices)
+    pd.testing.assert_frame_equal(engine.covariance(), returns.cov(), check_names=False)
+    pd.testing.assert_frame_equal(engine.correlation(), returns.corr(), check_names=False)
+
+
+def test_incremental_updates_match_batch():
+    prices = align_prices(make_universe())
+
+    batch = CorrelationEngine()
+    batch.update(prices)
+
+    incremental = CorrelationEngine()
+    for start in range(0, len(prices), 7):
+        incremental.update(prices.iloc[:start + 7]) # already seen rows are skipped
+
+    assert incremental.tickers == batch.tickers
+    np.testing.assert_allclose(incremental.correlation(), batch.correlation())
+
+
+def test_rolling_window_matches_last_window():
+    prices = align_prices(make_universe())
+    window = 30
+
+    *_, (last_date, correlation) = rolling_correlation(prices, window=window, step=5)
+
+    returns = expected_returns(prices).iloc[-window:]
+    assert last_date == prices.index[-1]
+    np.testing.assert_allclose(correlation.to_numpy(), returns.corr().to_numpy())
+
+
+if __name__ == "__main__":
+    test_align_prices_business_calendar_drops_weekends()
+    test_matches_pandas_pairwise_statistics()
+    test_incremental_updates_match_batch()
+    test_rolling_window_matches_last_window()
+    print("--- Correlation tests complete ---")
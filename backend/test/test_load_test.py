@@ -0,0 +1,107 @@
+import sys
+import json
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+from backend.utils.load_test import api_operations, check_slo, commander_operations, compare_reports, run_load, standin_commander
+from backend.utils.snapshot import write_json_atomic
+from backend.utils.standins import StandInDatabase, StandInProvider
+
+
+def test_standin_database_round_trip():
+    database = StandInDatabase()
+    cursor = database.connect().cursor()
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quotes (
+                ticker VARCHAR(10) NOT NULL,
+                ts DATETIME NOT NULL,
+                close DOUBLE,
+                PRIMARY KEY (ticker, ts)
+            )
+            """)
+    cursor.executemany(
+        "INSERT INTO quotes (ticker, ts, close) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE close = VALUES(close)",
+        [("IBM", 2, 10.0), ("IBM", 1, 9.0), ("MSFT", 1, 5.0), ("IBM", 2, 11.0)]
+    )
+    cursor.execute("SELECT ts, close FROM quotes WHERE ticker = %s AND ts >= %s ORDER BY ts", ("IBM", 1))
+    assert cursor.fetchmany(1) == [(1, 9.0)] and cursor.fetchall() == [(2, 11.0)]
+
+    # multi-row INSERT, as sent for the full batches of query_submit_many
+    cursor.execute("INSERT INTO quotes (ticker, ts, close) VALUES (%s, %s, %s), (%s, %s, %s)", ("AAPL", 1, 3.0, "AAPL", 2, 4.0))
+    assert cursor.rowcount == 2
+    cursor.execute("DELETE FROM quotes WHERE ticker = %s", ("AAPL",))
+
+    cursor.execute("DELETE FROM quotes WHERE ticker IN (%s, %s)", ("IBM", "AAPL"))
+    cursor.execute("SELECT * FROM quotes")
+    assert cursor.fetchall() == [("MSFT", 1, 5.0)]
+    cursor.execute("SHOW TABLES")
+    assert cursor.fetchall() == [("quotes",)]
+
+
+def test_commander_mix_against_standins():
+    database = StandInDatabase(latency=0.0005)
+    provider = StandInProvider(seed=1)
+    mix = {'extract_record': 5, 'extract_table': 3, 'window_stats': 1, 'refresh': 1}
+
+    report = run_load(lambda number, rng: commander_operations(standin_commander(database, provider), rng), mix, concurrency=3, requests=120)
+
+    assert report['total']['requests'] == 120 and report['total']['errors'] == 0
+    assert set(report['operations']) == set(mix)
+    assert report['total']['p50_ms'] <= report['total']['p95_ms'] <= report['total']['p99_ms']
+    assert database.statements > 120
+    # window stats and summary refreshes are aggregate SQL the stand-in only charges latency for
+    assert database.unmodeled > 0
+
+
+def test_errors_are_counted():
+    database = StandInDatabase(failure_rate=1.0)
+    operations = lambda number, rng: {'ping': lambda: database.connect().ping(), 'status': lambda: 503}
+
+    report = run_load(operations, {'ping': 1, 'status': 1}, concurrency=2, requests=20)
+    assert report['total']['error_rate'] == 1.0
+    assert sum(report['errors'].values()) == 20
+
+
+def test_unknown_operation_fails_fast():
+    with pytest.raises(ValueError):
+        run_load(lambda number, rng: {'a': lambda: None}, {'b': 1}, concurrency=2, requests=1)
+
+
+def test_api_mix_against_standins():
+    pytest.importorskip("flask")
+    from backend.run_app import create_app
+
+    database, provider = StandInDatabase(), StandInProvider(seed=2)
+    report = run_load(
+        lambda number, rng: api_operations(create_app(standin_commander(database, provider)).test_client()),
+        {'series': 2, 'series_resampled': 1, 'series_revalidate': 2}, concurrency=2, requests=40
+    )
+    assert report['total']['errors'] == 0
+
+
+def test_slo_and_comparison(tmp_path):
+    report = {'total': {'throughput': 50.0, 'p99_ms': 300.0, 'error_rate': 0.0}, 'operations': {}}
+    assert check_slo(report, {'p99_ms': 250, 'error_rate': 0.01, 'throughput': 100}) == [
+        "p99_ms 300.000 above 250", "throughput 50.0/s below 100/s"
+    ]
+
+    write_json_atomic(str(tmp_path / "before.json"), report)
+    baseline = json.loads((tmp_path / "before.json").read_text())
+    faster = {'total': {'throughput': 100.0, 'p99_ms': 150.0, 'error_rate': 0.0}, 'operations': {}}
+    change = compare_reports(baseline, faster)['total']
+    assert change['throughput']['change_pct'] == 100.0 and change['p99_ms']['change_pct'] == -50.0
+
+
+if __name__ == "__main__":
+    import tempfile
+    test_standin_database_round_trip()
+    test_commander_mix_against_standins()
+    test_errors_are_counted()
+    test_unknown_operation_fails_fast()
+    test_api_mix_against_standins()
+    test_slo_and_comparison(Path(tempfile.mkdtemp()))
+    print("--- Load test harness tests complete ---")
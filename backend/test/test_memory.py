@@ -0,0 +1,117 @@
+import sys
+import json
+import warnings
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+from backend.data import fetch_stocks
+from backend.database.Commander import Commander
+from backend.utils import memory
+from backend.utils.memory import MemoryBudgetWarning, MemoryProfiler
+from backend.utils.standins import StandInDatabase, StandInProvider
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = MemoryProfiler()
+    with profiler.stage('stats'):
+        blob = bytearray(1024 * 1024)
+    assert profiler.records == []
+
+
+def test_stage_peak_nesting_and_top_sites():
+    profiler = MemoryProfiler(enabled=True, top=5)
+
+    with profiler.stage('refresh'):
+        with profiler.stage('decode'):
+            temporary = [bytearray(1024) for _ in range(4096)] # ~4 MB, freed before the stage ends
+            del temporary
+        with profiler.stage('parse'):
+            kept = [bytearray(1024) for _ in range(1024)]      # ~1 MB, still alive at the end
+
+    decode, parse, refresh = profiler.records
+    assert (decode['stage'], parse['stage'], refresh['stage']) == ('decode', 'parse', 'refresh')
+    assert decode['depth'] == 1 and refresh['depth'] == 0
+    assert decode['peak_mb'] > 3.5 and abs(decode['traced_delta_mb']) < 0.5
+    assert parse['traced_delta_mb'] > 0.9
+    # the outer stage saw the inner peak even though the peak counter was reset in between
+    assert refresh['peak_mb'] >= decode['peak_mb']
+    assert any('test_memory.py' in site['site'] for site in parse['top'])
+    assert kept
+
+
+def test_budget_warning():
+    profiler = MemoryProfiler(enabled=True, budgets={'stats': 1}, top=0)
+    with pytest.warns(MemoryBudgetWarning, match="'stats'"):
+        with profiler.stage('stats'):
+            blob = bytearray(3 * 1024 * 1024)
+            del blob
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        with profiler.stage('stats'):
+            small = bytearray(1024)
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return json.loads(self.payload)
+
+
+def test_stock_pipeline_stages_within_budget(monkeypatch, tmp_path):
+    series = {
+        f"{2000 + i // 12}-{i % 12 + 1:02d}-28": {'1. open': '1.0', '2. high': '2.0', '3. low': '0.5', '4. close': '1.5', '5. volume': '100'}
+        for i in range(300)
+    }
+    payload = json.dumps({'Meta Data': {'2. Symbol': 'IBM'}, 'Monthly Time Series': series})
+    monkeypatch.setenv('APIKEY', 'test')
+    monkeypatch.setattr(fetch_stocks.requests, 'get', lambda url: FakeResponse(payload))
+
+    # budgets are generous; the point is a regression that multiplies memory shows up here
+    profiler = memory.enable_profiling(budgets={'decode': 10, 'stats': 10, 'parse': 10})
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', MemoryBudgetWarning)
+            details = fetch_stocks.fetch_stock_data('function=TIME_SERIES_MONTHLY&symbol=IBM')
+    finally:
+        profiler.enabled = False
+
+    assert len(details['bars']) == 300
+    assert details['IBM']['close']['mean'] == 1.5 and details['count'] == 300
+    # rows are converted in 'parse' only; 'stats' aggregates what it produced
+    assert [record['stage'] for record in profiler.records] == ['fetch', 'decode', 'parse', 'stats']
+    assert profiler.summary()['decode']['budget_mb'] == 10
+
+    profiler.save(str(tmp_path / "memory.json"))
+    assert set(json.loads((tmp_path / "memory.json").read_text())) == {'summary', 'records'}
+
+
+def test_db_write_covers_every_write(monkeypatch):
+    monkeypatch.setenv('db_password', 'stand-in')
+    provider = StandInProvider(history=5, seed=0)
+    commander = Commander(connection_options={'connector': StandInDatabase().connect}, stock_fetcher=provider.fetch_stocks, crypto_fetcher=provider.fetch_crypto)
+    commander._Commander__init_tables()
+
+    profiler = memory.enable_profiling(top=0)
+    try:
+        commander.store_bars('crypto', 'BTC', [{'time': 1_800_000_000, 'close': 1.0, 'volumeto': 1.0}])
+        commander.refresh_summaries('crypto')
+        commander.refresh_sketches('crypto')
+    finally:
+        profiler.enabled = False
+
+    # bars and alerts, the summary refresh and the sketch refresh
+    assert [record['stage'] for record in profiler.records] == ['db_write'] * 3
+
+
+if __name__ == "__main__":
+    # some tests use pytest's monkeypatch and tmp_path fixtures, so the file runs through pytest
+    sys.exit(pytest.main([__file__, "-q"]))
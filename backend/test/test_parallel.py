@@ -0,0 +1,55 @@
+import sys
+import warnings
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from backend.analysis.parallel import STOCK_COLUMNS, compute_stats, compute_universe_stats
+
+
+def make_universe():
+    rng = np.random.default_rng(3)
+    return {f"T{number}": rng.lognormal(3, 0.2, size=(rng.integers(5, 400), len(STOCK_COLUMNS))) for number in range(12)}
+
+
+def test_stats_match_pandas():
+    universe = make_universe()
+    details = compute_universe_stats(universe, STOCK_COLUMNS, processes=1)
+
+    frame = pd.DataFrame(universe["T4"], columns=STOCK_COLUMNS)
+    close = details["T4"]["T4"]["close"]
+    assert details["T4"]["count"] == len(frame)
+    assert np.isclose(close["mean"], frame["close"].mean())
+    assert np.isclose(close["std"], frame["close"].std())
+    assert np.isclose(close["median"], frame["close"].median())
+    assert details["T4"]["standing"] in ("risky", "improving", "declining", "stable")
+
+
+def test_process_pool_matches_in_process():
+    universe = make_universe()
+
+    parallel = compute_universe_stats(universe, STOCK_COLUMNS, processes=3)
+
+    assert list(parallel) == list(universe)
+    assert parallel == compute_universe_stats(universe, STOCK_COLUMNS, processes=1)
+
+
+def test_single_bar_has_no_std_and_no_warning():
+    bars = np.array([[1.0, 2.0, 0.5, 1.5, np.nan]])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        stats = compute_stats(bars, STOCK_COLUMNS)
+
+    assert np.isnan(stats["close"]["std"]) and stats["close"]["mean"] == 1.5
+    assert np.isnan(stats["volume"]["mean"])
+
+
+if __name__ == "__main__":
+    test_stats_match_pandas()
+    test_process_pool_matches_in_process()
+    test_single_bar_has_no_std_and_no_warning()
+    print("--- Parallel stats tests complete ---")
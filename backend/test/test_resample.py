@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from backend.analysis.resample import Resampler, bucket_labels, resample_bars
+
+
+def make_bars(days=120, start="2024-01-01"):
+    rng = np.random.default_rng(5)
+    ts = pd.date_range(start, periods=days, freq="D")
+    close = 100 + np.cumsum(rng.normal(0, 1, days))
+    return {
+        "ts": ts.to_numpy(),
+        "open": close + rng.normal(0, 0.5, days),
+        "high": close + 2,
+        "low": close - 2,
+        "close": close,
+        "volume": rng.integers(100, 1000, days).astype(float),
+    }
+
+
+def expected(bars, period):
+    frame = pd.DataFrame({column: values for column, values in bars.items() if column != "ts"}, index=pd.DatetimeIndex(bars["ts"]))
+    grouped = frame.groupby(frame.index.to_period(period))
+    return grouped.agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+
+
+def test_weekly_and_monthly_match_pandas():
+    bars = make_bars()
+    for rule, period in (("W", "W"), ("M", "M")):
+        result = resample_bars(bars, rule)
+        reference = expected(bars, period)
+        assert len(result["ts"]) == len(reference)
+        assert (pd.DatetimeIndex(result["ts"]) == reference.index.start_time).all()
+        for column in reference.columns:
+            np.testing.assert_allclose(result[column], reference[column].to_numpy())
+
+
+def test_exchange_calendar_skips_weekends_and_fixed_widths():
+    bars = make_bars(days=14)
+    weekly = resample_bars(bars, "W", calendar="exchange")
+    assert weekly["bars"].tolist() == [5, 5]
+
+    labels = bucket_labels(np.array(["2024-01-01T05:59:59", "2024-01-01T06:00:00"], dtype="datetime64[s]"), "6h")
+    assert labels.astype(str).tolist() == ["2024-01-01T00:00:00", "2024-01-01T06:00:00"]
+
+
+def test_incremental_updates_match_full_resample():
+    bars = make_bars(days=100)
+    resampler = Resampler()
+    key = ("crypto", "BTC", "W")
+
+    for stop in (10, 11, 40, 100, 100):
+        result = resampler.update(key, {column: values[:stop] for column, values in bars.items()}, "W")
+
+    full = resample_bars(bars, "W")
+    for column in full:
+        np.testing.assert_allclose(result[column].astype(float), full[column].astype(float))
+
+    resampler.invalidate(("crypto", "BTC"))
+    assert resampler.get(key) is None
+
+
+if __name__ == "__main__":
+    test_weekly_and_monthly_match_pandas()
+    test_exchange_calendar_skips_weekends_and_fixed_widths()
+    test_incremental_updates_match_full_resample()
+    print("--- Resample tests complete ---")
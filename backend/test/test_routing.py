@@ -0,0 +1,209 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import mysql.connector
+
+from backend.database.Connection import Connection
+from backend.database.Routing import ReplicaPool, parse_endpoints
+
+
+class FakeServers:
+    '''
+    Stand-in connector: every host is a separate "server" that records the statements it ran.
+    '''
+
+    def __init__(self):
+        self.queries = {}
+        self.down = set()      # refuse connections
+        self.broken = set()    # accept connections but fail queries
+
+    def connect(self, host, port, **kwargs):
+        name = f"{host}:{port}"
+        if name in self.down:
+            raise mysql.connector.Error(msg=f"Can't connect to {name}", errno=2003)
+        servers = self
+
+        class FakeCursor:
+            with_rows = False
+            rowcount = 1
+
+            def execute(self, query, values=()):
+                if name in servers.down | servers.broken:
+                    raise mysql.connector.Error(msg="Lost connection", errno=2013)
+                if "bogus" in query:
+                    raise mysql.connector.ProgrammingError(msg="Unknown column 'bogus' in 'where clause'", errno=1054)
+                servers.queries.setdefault(name, []).append(query)
+                self.rows = [(name,)]
+
+            def fetchall(self):
+                return [(name,)]
+
+            def fetchmany(self, size=1):
+                rows, self.rows = self.rows, []
+                return rows
+
+            def close(self):
+                pass
+
+        class FakeConn:
+            def cursor(self, prepared=False):
+                return FakeCursor()
+
+            def commit(self):
+                pass
+
+            def is_connected(self):
+                return name not in servers.down
+
+            def ping(self, reconnect=False):
+                if name in servers.down | servers.broken:
+                    raise mysql.connector.Error(msg="Ping failed", errno=2013)
+
+            def close(self):
+                pass
+
+        return FakeConn()
+
+
+def make_connection(monkeypatch, servers, **options):
+    monkeypatch.setenv("db_password", "test")
+    return Connection(host="primary", replicas="replica-a,replica-b:3307", connector=servers.connect, **options)
+
+
+def test_parse_endpoints():
+    assert parse_endpoints("a, b:3307,") == [("a", 3306), ("b", 3307)]
+    assert parse_endpoints(["c", ("d", 1)]) == [("c", 3306), ("d", 1)]
+    assert parse_endpoints(None) == []
+
+
+def test_reads_are_balanced_over_replicas_and_writes_hit_the_primary(monkeypatch):
+    servers = FakeServers()
+    db = make_connection(monkeypatch, servers)
+
+    readers = [db.query_extract("stocks", "ticker = %s", ("IBM",))[0][0] for _ in range(4)]
+    assert readers == ["replica-a:3306", "replica-b:3307"] * 2
+    assert db.show_tables() == ["replica-a:3306"]
+
+    assert db.query_submit("stocks", ticker="IBM") == 201
+    assert servers.queries["primary:3306"] == ["INSERT INTO stocks (ticker) VALUES (%s)"]
+    assert all("INSERT" not in query for name in ("replica-a:3306", "replica-b:3307") for query in servers.queries[name])
+
+
+def test_reads_stick_to_the_primary_after_a_write(monkeypatch):
+    servers = FakeServers()
+    db = make_connection(monkeypatch, servers, sticky_seconds=60)
+
+    assert db.query_extract("stocks")[0][0] == "replica-a:3306"
+    db.query_submit("stocks", ticker="IBM")
+    assert db.query_extract("stocks")[0][0] == "primary:3306"
+
+    db.last_write -= 61
+    assert db.query_extract("stocks")[0][0].startswith("replica")
+
+
+def test_failed_replica_is_skipped_until_it_passes_a_health_check(monkeypatch):
+    servers = FakeServers()
+    db = make_connection(monkeypatch, servers)
+    db.query_extract("stocks")
+
+    servers.broken.add("replica-b:3307")
+    readers = [db.query_extract("stocks")[0][0] for _ in range(4)]
+    # the read that hit the broken replica is retried on the primary, then the replica is skipped
+    assert readers == ["primary:3306", "replica-a:3306", "replica-a:3306", "replica-a:3306"]
+    assert db.check_replicas() == {"replica-a:3306": True, "replica-b:3307": False}
+
+    servers.broken.clear()
+    assert db.check_replicas() == {"replica-a:3306": True, "replica-b:3307": True}
+    assert {db.query_extract("stocks")[0][0] for _ in range(2)} == {"replica-a:3306", "replica-b:3307"}
+
+
+def test_unreachable_replica_is_passed_over(monkeypatch):
+    servers = FakeServers()
+    servers.down.add("replica-a:3306")
+    db = make_connection(monkeypatch, servers)
+
+    assert [db.query_extract("stocks")[0][0] for _ in range(3)] == ["replica-b:3307"] * 3
+
+
+def test_all_replicas_down_falls_back_to_the_primary(monkeypatch):
+    servers = FakeServers()
+    servers.down.update({"replica-a:3306", "replica-b:3307"})
+    db = make_connection(monkeypatch, servers)
+
+    assert db.query_extract("stocks")[0][0] == "primary:3306"
+    assert db.show_tables() == ["primary:3306"]
+
+
+def test_query_errors_do_not_mark_replicas_down(monkeypatch):
+    servers = FakeServers()
+    db = make_connection(monkeypatch, servers)
+
+    for _ in range(4):
+        assert db.query_extract("stocks", "bogus = %s", (1,)) == []
+
+    # the bad query is neither blamed on the replicas nor retried on the primary
+    assert [endpoint.failures for endpoint in db.replicas.endpoints] == [0, 0]
+    assert "primary:3306" not in servers.queries
+    assert db.query_extract("stocks")[0][0].startswith("replica")
+
+
+def test_reconnected_replica_drops_its_prepared_statements(monkeypatch):
+    servers = FakeServers()
+    db = make_connection(monkeypatch, servers)
+    replica = db.replicas.endpoints[0]
+    db.query_extract("stocks")
+    cached = db.statements[("select", "stocks", None, None, "replica-a:3306")][1]
+
+    # the session dropped: the next read reconnects and prepares the statement on the new session
+    replica.conn.is_connected = lambda: False
+    db.query_extract("stocks")
+    db.query_extract("stocks")
+    assert db.statements[("select", "stocks", None, None, "replica-a:3306")][1] is not cached
+    assert replica.failures == 0
+
+    # a health check that has to reconnect drops them as well
+    def lost(reconnect=False):
+        raise mysql.connector.Error(msg="Lost connection", errno=2013)
+    replica.conn.ping = lost
+    assert db.check_replicas() == {"replica-a:3306": True, "replica-b:3307": True}
+    assert not any(key[4] == "replica-a:3306" for key in db.statements)
+
+
+def test_bar_streams_are_routed_like_other_reads(monkeypatch):
+    servers = FakeServers()
+    db = make_connection(monkeypatch, servers)
+
+    readers = [list(db.query_bars("crypto", "BTC"))[0][0][0] for _ in range(2)]
+    assert readers == ["replica-a:3306", "replica-b:3307"]
+    assert list(db.query_bars("crypto", "BTC", use_replica=False))[0][0][0] == "primary:3306"
+
+    # a replica failing before the first chunk is marked down and the stream comes from the primary
+    servers.broken.add("replica-a:3306")
+    assert list(db.query_bars("crypto", "BTC"))[0][0][0] == "primary:3306"
+    assert db.replicas.endpoints[0].failures == 1
+    assert servers.queries["primary:3306"][-1].startswith("SELECT ts, open, high, low, close, volumefrom, volumeto FROM crypto_bars")
+
+
+def test_replica_retry_after_uses_the_pool_clock():
+    now = [0.0]
+    attempts = []
+
+    def connect(host, port):
+        attempts.append(host)
+        raise mysql.connector.Error(msg="down", errno=2003)
+
+    pool = ReplicaPool([("a", 3306)], connect, retry_after=10, clock=lambda: now[0])
+    assert pool.choose() is None
+    assert pool.choose() is None
+    now[0] = 11
+    assert pool.choose() is None
+    assert attempts == ["a", "a"]
+
+
+if __name__ == "__main__":
+    # most tests use pytest's monkeypatch fixture, so the file runs through pytest
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
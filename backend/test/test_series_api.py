@@ -0,0 +1,214 @@
+import sys
+import gzip
+import io
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+import pytest
+
+pytest.importorskip("flask")
+
+from backend.analysis.resample import resample_bars
+from backend.database.Connection import Connection
+from backend.run_app import create_app
+from backend.utils.columnar import benchmark_formats, encode, encode_rows, negotiate
+from backend.utils.load_test import standin_commander
+from backend.utils.standins import StandInDatabase, StandInProvider
+
+
+class StandInCommander:
+    '''
+    In-memory replacement for Commander: hourly crypto bars, counting how often and how many bars are read.
+    '''
+
+    def __init__(self, count=2_000):
+        rng = np.random.default_rng(5)
+        ts = np.datetime64('2024-01-01T00:00:00', 's') + np.arange(count) * np.timedelta64(3600, 's')
+        close = 40_000 * np.exp(np.cumsum(rng.normal(0, 0.002, count)))
+        self.bars = {
+            'ts': ts, 'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+            'volumefrom': rng.lognormal(5, 0.3, count), 'volumeto': rng.lognormal(13, 0.3, count),
+        }
+        self.version = 0
+        self.reads = 0
+        self.rows_read = 0
+
+    def data_version(self, table, ticker):
+        return f"test.{self.version}"
+
+    def get_bars(self, table, ticker, start=None, end=None, columns=None, as_frame=False, limit=None, use_replica=True):
+        self.reads += 1
+        keep = np.ones(len(self.bars['ts']), dtype=bool)
+        if start is not None:
+            keep &= self.bars['ts'] >= np.datetime64(start, 's')
+        if end is not None:
+            keep &= self.bars['ts'] < np.datetime64(end, 's')
+        keep = np.flatnonzero(keep)[:limit]
+        self.rows_read += len(keep)
+        return {column: self.bars[column][keep] for column in ['ts', *(columns or list(self.bars)[1:])]}
+
+    def get_resampled(self, table, ticker, rule='W', start=None, end=None, as_frame=False, use_replica=True):
+        return resample_bars(self.get_bars(table, ticker), rule)
+
+
+@pytest.fixture
+def setup():
+    commander = StandInCommander()
+    return commander, create_app(commander).test_client()
+
+
+def test_columnar_json_with_range_and_columns(setup):
+    _, client = setup
+    response = client.get("/api/series/crypto/BTC?start=2024-01-02&end=2024-01-03&columns=close")
+
+    assert response.status_code == 200 and response.mimetype == "application/json"
+    payload = response.get_json()
+    assert list(payload) == ["ts", "close"]
+    assert len(payload["ts"]) == 24
+    assert payload["ts"][0] == 1704153600 # 2024-01-02T00:00:00Z
+
+
+def test_pagination_walks_the_whole_series(setup):
+    commander, client = setup
+    seen, after = [], None
+    while True:
+        url = "/api/series/crypto/BTC?columns=close&limit=700" + (f"&after={after}" if after else "")
+        response = client.get(url)
+        seen += response.get_json()["ts"]
+        after = response.headers.get("X-Next-After")
+        if not after:
+            break
+
+    assert len(seen) == len(commander.bars["ts"]) and seen == sorted(set(seen))
+    # every page reads its own bars plus one, not the rest of the series
+    assert commander.rows_read <= len(seen) + commander.reads
+
+
+def test_offset_times_are_converted_to_utc(setup):
+    _, client = setup
+    # 2024-01-02T02:00+02:00 is midnight UTC; combined with `after` it used to compare aware with naive times
+    response = client.get("/api/series/crypto/BTC?start=2024-01-02T02:00:00%2B02:00&after=1704153600&columns=close&limit=2")
+    assert response.status_code == 200
+    assert response.get_json()["ts"] == [1704157200, 1704160800]
+
+    response = client.get("/api/series/crypto/BTC?start=2024-01-02T00:00:00Z&end=2024-01-02T03:00:00Z&columns=close")
+    assert response.get_json()["ts"] == [1704153600, 1704157200, 1704160800]
+
+
+def test_etag_revalidation_skips_the_read(setup):
+    commander, client = setup
+    first = client.get("/api/series/crypto/BTC?rule=1d")
+    etag = first.headers["ETag"]
+    reads = commander.reads
+
+    cached = client.get("/api/series/crypto/BTC?rule=1d", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and not cached.data and commander.reads == reads
+
+    commander.version += 1 # new bars stored
+    fresh = client.get("/api/series/crypto/BTC?rule=1d", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["ETag"] != etag
+
+
+def test_etag_follows_writes_from_any_process(monkeypatch):
+    monkeypatch.setenv("db_password", "stand-in")
+    database, provider = StandInDatabase(), StandInProvider(history=20, seed=6)
+    first_worker = create_app(standin_commander(database, provider)).test_client()
+    second_worker = create_app(standin_commander(database, provider)).test_client()
+    path = "/api/series/crypto/BTC?columns=close"
+
+    etag = first_worker.get(path).headers["ETag"]
+    # the version lives in the database, so every worker labels the same bars alike
+    assert second_worker.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    # e.g. the bulk loader, writing through a connection of its own
+    loader = Connection(connector=database.connect)
+    row = ('BTC', datetime(2030, 1, 1), 1.0)
+    assert loader.query_submit_many('crypto_bars', ['ticker', 'ts', 'close'], [row], upsert=True, versions=('crypto', ['BTC'])) == 201
+    fresh = first_worker.get(path, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.get_json()["close"][-1] == 1.0
+
+
+def test_npz_and_gzip(setup):
+    commander, client = setup
+    response = client.get("/api/series/crypto/BTC", headers={"Accept": "application/x-npz", "Accept-Encoding": "gzip, br"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    arrays = np.load(io.BytesIO(gzip.decompress(response.data)))
+    np.testing.assert_allclose(arrays["close"], commander.bars["close"][:5_000])
+    assert arrays["ts"].dtype == np.int64
+
+    # a wildcard fallback does not override the named format
+    mixed = client.get("/api/series/crypto/BTC?limit=10", headers={"Accept": "application/x-npz, */*;q=0.1"})
+    assert mixed.mimetype == "application/x-npz"
+
+
+def test_concurrent_requests_share_one_commander():
+    database = StandInDatabase(latency=0.002)
+    app = create_app(standin_commander(database, StandInProvider(history=50, seed=4)))
+    results = []
+
+    def fetch():
+        client = app.test_client()
+        for path in ("/api/series/crypto/BTC?limit=20", "/api/series/stocks/IBM?limit=20", "/api/series/crypto/BTC?rule=W"):
+            response = client.get(path)
+            results.append((response.status_code, len(response.get_json()["ts"]) > 0))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # the stand-in connection fails any statement sent while another one is running on it,
+    # which would surface as errors or empty series
+    assert results == [(200, True)] * 24
+
+
+def test_bad_requests(setup):
+    _, client = setup
+    assert client.get("/api/series/bonds/X").status_code == 404
+    assert client.get("/api/series/crypto/BTC?columns=volume").status_code == 400
+    assert client.get("/api/series/crypto/BTC?start=yesterday").status_code == 400
+    assert client.get("/api/series/crypto/BTC", headers={"Accept": "text/csv"}).status_code == 406
+    assert client.get("/api/series/crypto/BTC?rule=fortnight").status_code == 400
+    assert client.get("/api/series/crypto/BTC?rule=0h").status_code == 400
+    # epochs past what datetime can hold overflow instead of raising ValueError
+    for parameter in ("start", "end", "after"):
+        assert client.get(f"/api/series/crypto/BTC?{parameter}=99999999999999999999").status_code == 400
+    assert client.get("/api/series/crypto/BTC?after=253402300799").status_code == 400 # year 9999, no next second
+
+
+def test_negotiation_and_nan_handling():
+    assert negotiate("application/x-npz;q=0.5, application/json") == "json"
+    assert negotiate("application/x-npz, application/json;q=0.9") == "npz"
+    assert negotiate(None, "npz") == "npz"
+    # wildcards are only a fallback, whatever their q-value
+    assert negotiate("application/x-npz, */*;q=0.1") == "npz"
+    assert negotiate("*/*, application/x-npz;q=0.2") == "npz"
+    assert negotiate("text/html, */*;q=0.8") == "json"
+    assert negotiate("application/json;q=0, application/*") == "npz"
+    assert negotiate("application/x-npz;q=0, text/csv") is None
+    assert json.loads(encode({'ts': np.array(['2024-01-01'], dtype='datetime64[s]'), 'close': np.array([np.nan])}, 'json')) == {
+        'ts': [1704067200], 'close': [None]
+    }
+
+
+def test_columnar_payload_is_smaller_than_rows():
+    bars = StandInCommander().bars
+    results = benchmark_formats(bars, repeat=3)
+
+    assert results['json']['bytes'] < len(encode_rows(bars)) * 0.8
+    assert results['json']['gzip_bytes'] < results['rows']['gzip_bytes']
+    assert results['npz']['bytes'] < results['rows']['bytes'] / 2
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_formats(StandInCommander(20_000).bars).items():
+        print(f"{name:>6}: {result['bytes']:>9} B  gzip {result['gzip_bytes']:>9} B  p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms")
+    print("--- Series API tests complete ---")
@@ -0,0 +1,42 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+
+from backend.analysis.sketch import TDigest, month_bounds, month_key
+
+
+def test_small_inputs_are_exact():
+    assert TDigest().add_many([1, 2, 3]).quantile(0.5) == 2
+    assert TDigest().add_many([4, 1, 3, 2]).quantile(0.5) == 2.5
+    assert TDigest().add_many([7]).quantile(0.99) == 7
+    assert np.isnan(TDigest().quantile(0.5))
+
+
+def test_merged_monthly_sketches_have_bounded_rank_error():
+    rng = np.random.default_rng(11)
+    months = [rng.lognormal(10, 1, 2_000) for _ in range(12)]
+    merged = TDigest.merge_all([TDigest.from_json(TDigest().add_many(values).to_json()) for values in months])
+
+    everything = np.concatenate(months)
+    assert merged.count == len(everything)
+    assert len(merged.means) <= 60
+    for q in (0.01, 0.25, 0.5, 0.95, 0.99):
+        rank = (everything < merged.quantile(q)).mean()
+        assert abs(rank - q) < 0.005
+
+
+def test_month_partitions():
+    assert month_key(datetime(2024, 12, 31, 23, 59)) == "2024-12"
+    assert month_bounds("2024-12") == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+
+
+if __name__ == "__main__":
+    test_small_inputs_are_exact()
+    test_merged_monthly_sketches_have_bounded_rank_error()
+    test_month_partitions()
+    print("--- Sketch tests complete ---")
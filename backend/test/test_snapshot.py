@@ -0,0 +1,64 @@
+import sys
+import json
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.utils.snapshot import write_snapshot, read_snapshot, write_json_atomic
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "state" / "commander.json"
+    state = {"datasets": {"stocks": {"IBM": {"average": 1.5}}}, "pending_sketches": {"stocks": {"IBM": ["2024-05"]}}}
+
+    write_snapshot(str(path), state)
+    restored, saved_at = read_snapshot(str(path))
+
+    assert restored == state
+    assert saved_at is not None
+    # only the final file is left behind, no temporary files
+    assert [entry.name for entry in path.parent.iterdir()] == ["commander.json"]
+
+
+def test_snapshot_version_mismatch_is_ignored(tmp_path):
+    path = str(tmp_path / "commander.json")
+    write_snapshot(path, {"a": 1}, version=0)
+
+    assert read_snapshot(path) == (None, None)
+
+
+def test_missing_or_corrupt_snapshot(tmp_path):
+    path = tmp_path / "commander.json"
+    assert read_snapshot(str(path)) == (None, None)
+
+    path.write_text('{"version": 1, "state": ')
+    assert read_snapshot(str(path)) == (None, None)
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "cache.json")
+    write_json_atomic(path, {"old": True})
+
+    class Unprintable:
+        def __str__(self):
+            raise TypeError("cannot serialize")
+
+    try:
+        write_json_atomic(path, {"bad": Unprintable()})
+    except TypeError:
+        pass
+
+    with open(path) as file:
+        assert json.load(file) == {"old": True}
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    for test in (test_snapshot_round_trip, test_snapshot_version_mismatch_is_ignored, test_missing_or_corrupt_snapshot, test_failed_write_keeps_previous_file):
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+
+    print("--- Snapshot tests complete ---")
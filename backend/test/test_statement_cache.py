@@ -0,0 +1,171 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from backend
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import mysql.connector
+import pytest
+
+from backend.database import Connection as connection_module
+from backend.database.Connection import Connection, ER_NEED_REPREPARE
+
+
+class FakeCursor:
+    '''
+    Stands in for a server-side prepared cursor and counts how often the server would parse a statement.
+    '''
+
+    def __init__(self, server, prepared):
+        self.server = server
+        self.prepared = prepared
+        self.executed = None
+        self.closed = False
+        self.rowcount = 1
+        self.with_rows = False
+
+    def execute(self, query, values=()):
+        if self.prepared and query is not self.executed:
+            self.server.prepares.append(query)
+            self.executed = query
+        if self.server.fail_next:
+            self.server.fail_next = False
+            self.executed = None
+            raise mysql.connector.Error(msg="Prepared statement needs to be re-prepared", errno=ER_NEED_REPREPARE)
+        self.server.executions.append((query, tuple(values)))
+
+    def executemany(self, query, seq_values):
+        self.server.executions.append((query, tuple(seq_values)))
+
+    def fetchall(self):
+        return [("IBM", "open")]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer:
+
+    def __init__(self):
+        self.prepares = []
+        self.executions = []
+        self.cursors = []
+        self.fail_next = False
+        self.connections = 0
+
+    def connect(self, **kwargs):
+        self.connections += 1
+        server = self
+
+        class FakeConn:
+            def cursor(self, prepared=False):
+                cursor = FakeCursor(server, prepared)
+                server.cursors.append(cursor)
+                return cursor
+
+            def commit(self):
+                pass
+
+            def is_connected(self):
+                return True
+
+            def close(self):
+                pass
+
+        return FakeConn()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeServer()
+    monkeypatch.setenv("db_password", "test")
+    monkeypatch.setattr(connection_module.mysql.connector, "connect", fake.connect)
+    return fake
+
+
+def test_repeated_statements_are_prepared_once(server):
+    db = Connection()
+
+    for price in (1.0, 2.0, 3.0):
+        assert db.query_submit("stocks", ticker="IBM", metric="open", mean=price) == 201
+    for ticker in ("IBM", "MSFT"):
+        assert db.query_extract("stocks", "ticker = %s", (ticker,)) == [("IBM", "open")]
+
+    assert server.prepares == [
+        "INSERT INTO stocks (ticker, metric, mean) VALUES (%s, %s, %s)",
+        "SELECT * FROM stocks WHERE ticker = %s",
+    ]
+    assert len(server.executions) == 5
+    assert len(db.statements) == 2
+
+
+def test_bulk_inserts_prepare_one_statement_per_batch_shape(server):
+    db = Connection()
+    rows = [("BTC", day, float(day)) for day in range(5)]
+
+    for _ in range(2):
+        assert db.query_submit_many("crypto_bars", ["ticker", "ts", "close"], rows, upsert=True, batch_size=2) == 201
+
+    # full batches share one prepared two-row INSERT across calls; the odd row goes through executemany
+    assert server.prepares == [
+        "INSERT INTO crypto_bars (ticker, ts, close) VALUES (%s, %s, %s), (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE ticker = VALUES(ticker), ts = VALUES(ts), close = VALUES(close)"
+    ]
+    assert [len(values) for _, values in server.executions] == [6, 6, 1] * 2
+    assert server.executions[1][1] == ("BTC", 2, 2.0, "BTC", 3, 3.0)
+    assert server.executions[2][0].startswith("INSERT INTO crypto_bars (ticker, ts, close) VALUES (%s, %s, %s) ON DUPLICATE")
+
+    assert db.query_submit_many("crypto_bars; --", ["ticker"], [("BTC",)]) == 400
+    assert len(server.prepares) == 1
+
+
+def test_identifiers_are_validated_before_preparing(server):
+    db = Connection()
+
+    assert db.query_submit("stocks; DROP TABLE stocks", ticker="IBM") == 400
+    assert db.query_submit("stocks", **{"mean) VALUES (1); --": 1}) == 400
+    assert db.query_extract("stocks`", "ticker = %s", ("IBM",)) == []
+    assert server.prepares == []
+    assert not db.statements
+
+
+def test_cache_is_invalidated_on_reconnect_and_schema_change(server):
+    db = Connection()
+    db.query_extract("stocks", "ticker = %s", ("IBM",))
+    db.query_extract("crypto", "ticker = %s", ("BTC",))
+
+    db.custom_query("ALTER TABLE stocks ADD COLUMN note TEXT")
+    assert not db.statements
+
+    db.query_extract("stocks", "ticker = %s", ("IBM",))
+    cached = list(db.statements.values())[0][1]
+    db.reconnect()
+    assert cached.closed
+    assert not db.statements
+    assert server.connections == 2
+
+
+def test_stale_statement_is_prepared_again(server):
+    db = Connection()
+    db.query_extract("stocks", "ticker = %s", ("IBM",))
+
+    server.fail_next = True
+    assert db.query_extract("stocks", "ticker = %s", ("IBM",)) == [("IBM", "open")]
+    # the first prepare, then one more after the server rejected the stale statement
+    assert len(server.prepares) == 2
+    assert server.cursors[1].closed
+
+
+def test_least_recently_used_statements_are_evicted(server):
+    db = Connection(max_statements=2)
+    for table in ("a", "b", "c"):
+        db.query_extract(table)
+
+    assert [key[1] for key in db.statements] == ["b", "c"]
+    assert server.cursors[1].closed
+
+
+if __name__ == "__main__":
+    # the tests use pytest fixtures, so the file runs through pytest
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,179 @@
+
+# _____________________________________ Columnar Encoding _____________________________________ #
+
+# Time series leave the API as one array per column instead of one JSON object per bar. The column
+# names are written once, numbers stay in contiguous arrays, and the result compresses far better.
+# Three encodings are offered:
+# - json:  {"ts": [...epoch seconds...], "close": [...], ...}, NaN written as null
+# - npz:   NumPy .npz archive, one array per column (ts as int64 epoch seconds)
+# - arrow: Apache Arrow IPC stream, only when pyarrow is installed
+
+import gzip
+import hashlib
+import io
+import json
+import time
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError: # optional, only needed for the Arrow format
+    pa = None
+
+FORMATS = {
+    'json': 'application/json',
+    'npz': 'application/x-npz',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def available_formats() -> list:
+    return [name for name in FORMATS if name != 'arrow' or pa is not None]
+
+
+def to_epoch(ts) -> np.ndarray:
+    return np.asarray(ts).astype('datetime64[s]').astype(np.int64)
+
+
+# ___________________ Encoders ___________________ #
+
+def encode(bars:dict, fmt:str) -> bytes:
+    '''
+    Encodes a dictionary of column arrays ('ts' as datetime64, the rest numeric).
+
+    Parameters:
+    - bars (dict): column -> np.ndarray, as returned by `Commander.get_bars(as_frame=False)`
+    - fmt (str): one of `available_formats()`
+    '''
+    columns = {column: (to_epoch(values) if column == 'ts' else np.asarray(values)) for column, values in bars.items()}
+
+    if fmt == 'json':
+        payload = {}
+        for column, values in columns.items():
+            if values.dtype.kind == 'f' and np.isnan(values).any():
+                payload[column] = [None if value != value else value for value in values.tolist()]
+            else:
+                payload[column] = values.tolist()
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+    if fmt == 'npz':
+        buffer = io.BytesIO()
+        np.savez(buffer, **columns)
+        return buffer.getvalue()
+
+    if fmt == 'arrow':
+        if pa is None:
+            raise ValueError("The Arrow format needs pyarrow (pip install pyarrow)")
+        table = pa.table({column: pa.array(values) for column, values in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    raise ValueError(f"Unknown format '{fmt}'. Use one of {available_formats()}")
+
+
+def encode_rows(bars:dict) -> bytes:
+    '''
+    Row-wise JSON (one object per bar), the layout columnar responses replace. Kept for comparisons.
+    '''
+    columns = {column: (to_epoch(values) if column == 'ts' else np.asarray(values)).tolist() for column, values in bars.items()}
+    names = list(columns)
+    rows = [dict(zip(names, values)) for values in zip(*columns.values())]
+    return json.dumps(rows).encode('utf-8')
+
+
+def gzip_body(body:bytes, level:int = 6) -> bytes:
+    return gzip.compress(body, compresslevel=level)
+
+
+# ___________________ HTTP Helpers ___________________ #
+
+def negotiate(accept:str = None, requested:str = None):
+    '''
+    Picks a response format from an explicit `format` parameter or the Accept header.
+    Media types the API serves are ranked by their q-values (header order breaks ties). Wildcards
+    ('*/*', 'application/*') only decide when no served type is named, and then give JSON.
+    Returns the format name, or None if nothing acceptable is available (HTTP 406).
+
+    Example:
+    - negotiate('application/x-npz, */*;q=0.1') -> 'npz'
+    '''
+    formats = available_formats()
+    if requested:
+        return requested if requested in formats else None
+    if not accept:
+        return 'json'
+
+    preferences = []
+    for position, part in enumerate(accept.split(',')):
+        media, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        preferences.append((-quality, position, media.lower()))
+
+    by_media = {FORMATS[name]: name for name in formats}
+    named = sorted(preference for preference in preferences if preference[2] in by_media)
+    for quality, _, media in named:
+        if quality < 0:
+            return by_media[media]
+
+    # only wildcards left; formats named with q=0 stay refused
+    refused = {by_media[media] for _, _, media in named}
+    if any(quality < 0 and media in ('*/*', 'application/*') for quality, _, media in preferences):
+        return next((name for name in formats if name not in refused), None)
+    return None
+
+
+def make_etag(*parts) -> str:
+    '''
+    Strong ETag derived from the data version and everything that shapes the response.
+    '''
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match:str, etag:str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+# ___________________ Benchmark ___________________ #
+
+def benchmark_formats(bars:dict, repeat:int = 50) -> dict:
+    '''
+    Payload size and encode latency of row-wise JSON against every columnar format.
+
+    Returns:
+    - dict: format -> {'bytes', 'gzip_bytes', 'p50_ms', 'p99_ms'} (latency includes gzip)
+
+    Example:
+    - benchmark_formats(commander.get_bars('crypto', 'BTC', as_frame=False))
+    '''
+    encoders = {'rows': encode_rows, **{name: (lambda data, name=name: encode(data, name)) for name in available_formats()}}
+
+    results = {}
+    for name, encoder in encoders.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = encoder(bars)
+            compressed = gzip_body(body)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'bytes': len(body),
+            'gzip_bytes': len(compressed),
+            'p50_ms': float(np.percentile(timings, 50)),
+            'p99_ms': float(np.percentile(timings, 99)),
+        }
+    return results
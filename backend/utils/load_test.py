@@ -0,0 +1,369 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path for imports to work when running directly
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.utils.snapshot import write_json_atomic
+from backend.utils.standins import StandInDatabase, StandInProvider
+
+# _____________________________________ Load Test _____________________________________ #
+
+# Drives Commander directly, or the web API, from many concurrent workers with a weighted mix of
+# operations, and reports throughput, latency percentiles and error rates per operation.
+# Every worker owns its Commander (and so its own database connection), the way each web server
+# worker process would. Against the stand-ins nothing outside this process is needed:
+#
+#   python -m backend.utils.load_test --mode commander --concurrency 16 --duration 30 --db-latency-ms 2
+#   python -m backend.utils.load_test --mode api --output after.json --baseline before.json --slo p99_ms=250
+#
+# Reports are JSON so that runs can be compared (--baseline) and checked against latency SLOs (--slo).
+#
+# The stand-in database does not run aggregate SQL (see backend/utils/standins.py). Operations that rely on
+# it are listed under 'latency_only' in the report and starred in the printed table: their numbers show
+# the injected latency and the client-side work, not what MySQL would spend computing the aggregates.
+
+# one worker fills a fresh stand-in database while the others wait
+_SCHEMA_LOCK = threading.Lock()
+
+# operations whose server-side aggregates the stand-in database answers with latency only
+LATENCY_ONLY = {
+    'window_stats': "the stand-in skips the UNION ALL window statistics (latency only, no rows)",
+    'refresh': "bars are upserted, but the stand-in skips the summary INSERT ... SELECT (latency only)",
+}
+
+DEFAULT_MIX = {
+    'commander': {'extract_record': 6, 'extract_table': 3, 'refresh': 1},
+    'api': {'series': 6, 'series_resampled': 3, 'series_revalidate': 1},
+}
+
+
+# ___________________ Targets ___________________ #
+
+def standin_commander(database:StandInDatabase, provider:StandInProvider):
+    '''
+    A Commander wired to the stand-ins. Creates and fills the tables the first time a database is used.
+    '''
+    from backend.database.Commander import Commander
+
+    os.environ.setdefault('db_password', 'stand-in') # Connection refuses to start without one
+    commander = Commander(
+        connection_options={'connector': database.connect},
+        stock_fetcher=provider.fetch_stocks,
+        crypto_fetcher=provider.fetch_crypto,
+    )
+    with _SCHEMA_LOCK:
+        if 'stocks' not in database.tables:
+            commander._Commander__init_tables()
+    commander.tables = commander.show_tables()
+    return commander
+
+
+def commander_operations(commander, rng:random.Random) -> dict:
+    '''
+    Operations on one Commander. Each returns a status code or rows; exceptions and codes >= 400 count as errors.
+    '''
+    stock_metrics = ['open', 'high', 'low', 'close', 'volume']
+
+    def refresh():
+        details = commander.crypto_fetcher(commander.crypto_ticker, commander.crypto_limit)
+        status = commander.store_bars('crypto', commander.crypto_ticker, (details or {}).get('bars', [])[-5:])
+        return status if status != 201 else commander.refresh_summaries('crypto')
+
+    tickers = [key for key in (commander.stock_data or {}) if key not in ('count', 'standing', 'bars')] or ['IBM']
+    return {
+        'extract_record': lambda: commander.extract_record('stocks', 'ticker = %s AND metric = %s', (rng.choice(tickers), rng.choice(stock_metrics))),
+        'extract_table': lambda: commander.extract_table(rng.choice(['stocks', 'crypto'])),
+        'window_stats': lambda: commander.get_window_stats('crypto', commander.crypto_ticker, '30d'),
+        'refresh': refresh,
+    }
+
+
+def api_operations(client, ticker:str = 'BTC') -> dict:
+    '''
+    Operations against the series API. `client` is a Flask test client or an `HttpClient`.
+    '''
+    etags = {}
+
+    def revalidate():
+        path = f"/api/series/crypto/{ticker}?columns=close&limit=1000"
+        response = client.get(path, headers={'If-None-Match': etags.get(path, ''), 'Accept-Encoding': 'gzip'})
+        etags[path] = response.headers.get('ETag', '')
+        return response.status_code
+
+    return {
+        'series': lambda: client.get(f"/api/series/crypto/{ticker}?limit=1000", headers={'Accept-Encoding': 'gzip'}).status_code,
+        'series_resampled': lambda: client.get(f"/api/series/crypto/{ticker}?rule=W").status_code,
+        'series_revalidate': revalidate,
+    }
+
+
+class HttpClient:
+    '''
+    Minimal client with the Flask test client's `get` signature, for load testing a running server.
+    '''
+
+    def __init__(self, base_url:str) -> None:
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path:str, headers:dict = None):
+        return self.session.get(self.base_url + path, headers=headers, timeout=30)
+
+
+# ___________________ Runner ___________________ #
+
+def run_load(make_operations, mix:dict, concurrency:int = 8, duration:float = 10.0, requests:int = None, seed:int = 0, quiet:bool = True) -> dict:
+    '''
+    Runs the operation mix from `concurrency` threads until `duration` seconds passed or `requests` calls were made.
+
+    Parameters:
+    - make_operations (callable): (worker number, random.Random) -> {name: callable}, called once per worker
+    - mix (dict): name -> weight; names missing from the operations are an error
+    - concurrency (int): Number of workers
+    - duration (float): Seconds to run (ignored when `requests` is given)
+    - requests (int): Total number of calls across workers
+    - seed (int): Makes the operation sequence repeatable
+    - quiet (bool): Silences what the operations print (Commander reports every call) during the run
+
+    Returns:
+    - Report dictionary (see `summarize`)
+    '''
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    messages = {}
+    lock = threading.Lock()
+    budget = [requests]
+    ready = threading.Barrier(concurrency + 1)
+    go = threading.Event()
+    started = [0.0]
+    setup_errors = []
+
+    def worker(number:int):
+        rng = random.Random(seed + number)
+        try:
+            operations = make_operations(number, rng)
+            missing = [name for name in names if name not in operations]
+            if missing:
+                raise ValueError(f"Unknown operations in mix: {missing}. Available: {list(operations)}")
+        except Exception as error:
+            setup_errors.append(error)
+            return
+        finally:
+            ready.wait()
+
+        go.wait()
+        deadline = started[0] + duration
+        while True:
+            with lock:
+                if budget[0] is not None:
+                    if budget[0] <= 0:
+                        return
+                    budget[0] -= 1
+            if budget[0] is None and time.perf_counter() >= deadline:
+                return
+
+            name = rng.choices(names, weights)[0]
+            began = time.perf_counter()
+            failed = None
+            try:
+                result = operations[name]()
+                if isinstance(result, int) and not isinstance(result, bool) and result >= 400:
+                    failed = f"status {result}"
+            except Exception as error:
+                failed = f"{type(error).__name__}: {error}"
+            elapsed = time.perf_counter() - began
+
+            with lock:
+                samples[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+                    messages.setdefault(failed, 0)
+                    messages[failed] += 1
+
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(concurrency)]
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        for thread in threads:
+            thread.start()
+        ready.wait() # workers are built; setup time is not measured
+        started[0] = time.perf_counter()
+        go.set()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started[0]
+    if setup_errors:
+        raise setup_errors[0]
+
+    report = summarize(samples, errors, elapsed)
+    report['config'] = {'mix': mix, 'concurrency': concurrency, 'duration': duration, 'requests': requests, 'seed': seed}
+    report['errors'] = dict(sorted(messages.items(), key=lambda item: -item[1])[:10])
+    return report
+
+
+def summarize(samples:dict, errors:dict, elapsed:float) -> dict:
+    '''
+    Throughput, latency percentiles (ms) and error rate per operation and in total.
+    '''
+    def stats(latencies:list, failed:int) -> dict:
+        if not latencies:
+            return {'requests': 0, 'errors': 0, 'error_rate': 0.0, 'throughput': 0.0}
+        values = np.asarray(latencies) * 1000
+        return {
+            'requests': len(values),
+            'errors': failed,
+            'error_rate': failed / len(values),
+            'throughput': len(values) / elapsed if elapsed else 0.0,
+            'mean_ms': float(values.mean()),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'max_ms': float(values.max()),
+        }
+
+    everything = [latency for latencies in samples.values() for latency in latencies]
+    return {
+        'created_at': time.time(),
+        'elapsed_s': elapsed,
+        'total': stats(everything, sum(errors.values())),
+        'operations': {name: stats(samples[name], errors[name]) for name in samples},
+    }
+
+
+# ___________________ Reporting ___________________ #
+
+def check_slo(report:dict, slo:dict) -> list:
+    '''
+    Compares the totals of a report against objectives such as {'p99_ms': 250, 'error_rate': 0.01, 'throughput': 100}.
+    Latency and error objectives are upper bounds, throughput is a lower bound.
+
+    Returns:
+    - List of violated objectives as readable strings (empty when all are met)
+    '''
+    violations = []
+    total = report['total']
+    for metric, target in slo.items():
+        value = total.get(metric)
+        if value is None:
+            violations.append(f"{metric}: not measured")
+        elif metric == 'throughput' and value < target:
+            violations.append(f"throughput {value:.1f}/s below {target}/s")
+        elif metric != 'throughput' and value > target:
+            violations.append(f"{metric} {value:.3f} above {target}")
+    return violations
+
+
+def compare_reports(baseline:dict, current:dict) -> dict:
+    '''
+    Relative change (%) of the main numbers between two reports, per operation and in total.
+    '''
+    metrics = ['throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate']
+
+    def delta(before:dict, after:dict) -> dict:
+        changes = {}
+        for metric in metrics:
+            if metric in before and metric in after:
+                change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else None
+                changes[metric] = {'before': before[metric], 'after': after[metric], 'change_pct': change}
+        return changes
+
+    comparison = {'total': delta(baseline['total'], current['total'])}
+    for name in current['operations']:
+        if name in baseline.get('operations', {}):
+            comparison[name] = delta(baseline['operations'][name], current['operations'][name])
+    return comparison
+
+
+def print_report(report:dict):
+    latency_only = report.get('latency_only', {})
+    print(f"{'operation':<20}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, stats in [*report['operations'].items(), ('TOTAL', report['total'])]:
+        if not stats['requests']:
+            continue
+        label = f"{name}*" if name in latency_only else name
+        print(f"{label:<20}{stats['requests']:>10}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['error_rate']:>8.1%}")
+    for name, reason in latency_only.items():
+        print(f"* {name}: {reason}")
+
+
+def parse_pairs(text:str, cast=float) -> dict:
+    '''
+    'a=1,b=2' -> {'a': 1.0, 'b': 2.0}
+    '''
+    pairs = {}
+    for part in filter(None, (piece.strip() for piece in (text or '').split(','))):
+        name, _, value = part.partition('=')
+        pairs[name.strip()] = cast(value)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Commander or the series API")
+    parser.add_argument('--mode', choices=['commander', 'api'], default='commander')
+    parser.add_argument('--url', help="Load test a running server instead of in-process stand-ins (api mode)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--requests', type=int, help="Stop after this many calls instead of after --duration")
+    parser.add_argument('--mix', help="Weights, e.g. extract_record=6,extract_table=3,refresh=1")
+    parser.add_argument('--db-latency-ms', type=float, default=1.0)
+    parser.add_argument('--db-jitter-ms', type=float, default=0.0)
+    parser.add_argument('--db-failure-rate', type=float, default=0.0)
+    parser.add_argument('--provider-latency-ms', type=float, default=50.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--slo', help="Objectives, e.g. p99_ms=250,error_rate=0.01,throughput=100")
+    parser.add_argument('--output', help="Write the report to this JSON file")
+    parser.add_argument('--baseline', help="Compare against a previous JSON report")
+    args = parser.parse_args()
+
+    mix = parse_pairs(args.mix) or DEFAULT_MIX[args.mode]
+    database = StandInDatabase(args.db_latency_ms / 1000, args.db_jitter_ms / 1000, args.db_failure_rate, seed=args.seed)
+    provider = StandInProvider(args.provider_latency_ms / 1000, seed=args.seed)
+
+    if args.mode == 'commander':
+        make_operations = lambda number, rng: commander_operations(standin_commander(database, provider), rng)
+    elif args.url:
+        make_operations = lambda number, rng: api_operations(HttpClient(args.url))
+    else:
+        from backend.run_app import create_app
+        make_operations = lambda number, rng: api_operations(create_app(standin_commander(database, provider)).test_client())
+
+    report = run_load(make_operations, mix, args.concurrency, args.duration, args.requests, args.seed)
+    report['config'].update({key: value for key, value in vars(args).items() if key not in ('output', 'baseline')})
+    if not args.url:
+        report['latency_only'] = {name: LATENCY_ONLY[name] for name in mix if name in LATENCY_ONLY}
+        report['standins'] = {'statements': database.statements, 'unmodeled': database.unmodeled}
+    print_report(report)
+
+    if args.slo:
+        report['slo'] = {'objectives': parse_pairs(args.slo), 'violations': check_slo(report, parse_pairs(args.slo))}
+        print("SLO met" if not report['slo']['violations'] else f"SLO violated: {report['slo']['violations']}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            report['comparison'] = compare_reports(json.load(file), report)
+        total = report['comparison']['total']
+        print("vs baseline: " + ", ".join(
+            f"{metric} {values['change_pct']:+.1f}%" for metric, values in total.items() if values['change_pct'] is not None
+        ))
+    if args.output:
+        write_json_atomic(args.output, report)
+        print(f"Report written to {args.output}")
+
+    return 1 if report.get('slo', {}).get('violations') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+
+# _____________________________________ Memory Profiling _____________________________________ #
+
+# Opt-in memory instrumentation for the refresh pipeline. Code marks its stages:
+#
+#   with stage('decode'):
+#       data = response.json()
+#
+# When profiling is off (the default) a stage costs next to nothing. Turn it on with the environment
+# variable MEMORY_PROFILE=1 (optionally MEMORY_BUDGETS="decode=50,stats=20" in MB) or in code:
+#
+#   profiler = enable_profiling(budgets={'decode': 50})
+#   ... run a refresh ...
+#   profiler.print_report(); profiler.save('memory.json')
+#
+# For every stage the profiler records the peak traced (tracemalloc) memory above the level at stage
+# start, the traced and RSS deltas, and the top allocation sites still alive at the end of the stage.
+# A stage whose peak exceeds its budget raises a MemoryBudgetWarning.
+#
+# Measure one pipeline at a time. tracemalloc and RSS are process-wide: a stage running while another
+# thread allocates is charged for that thread's memory too, and tracemalloc has a single peak counter,
+# which every stage start and end resets. A stage on one thread can therefore wipe the peak of a stage still
+# open on another, so peaks (and the budgets checked against them) are unreliable under concurrency.
+
+import os
+import threading
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager
+
+from backend.utils.snapshot import write_json_atomic
+
+try:
+    import psutil
+except ImportError: # optional, RSS is read from /proc without it
+    psutil = None
+
+MB = 1024 * 1024
+
+
+class MemoryBudgetWarning(ResourceWarning):
+    '''
+    A profiled stage used more memory than its budget allows.
+    '''
+
+
+def rss_bytes():
+    '''
+    Resident set size of this process, or None when it cannot be read on this platform.
+    '''
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryProfiler:
+    '''
+    Records memory use per named stage.
+
+    Parameters:
+    - enabled (bool): Off means stages are not measured at all
+    - budgets (dict): stage -> MB the stage's peak may reach before a MemoryBudgetWarning
+    - top (int): Allocation sites kept per stage (0 skips the snapshots, which are the slow part)
+    - frames (int): Traceback depth tracemalloc records per allocation
+    '''
+
+    def __init__(self, enabled:bool = False, budgets:dict = None, top:int = 10, frames:int = 1) -> None:
+
+        self.enabled = enabled
+        self.budgets = dict(budgets or {})
+        self.top = top
+        self.frames = frames
+
+        self.records:list = []
+        self.__local = threading.local() # per thread: stages currently running, innermost last
+        self.__active = 0 # open stages across all threads
+        self.__lock = threading.Lock()
+        self.__ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        self.__started_tracing = False
+
+    @classmethod
+    def from_env(cls) -> "MemoryProfiler":
+        budgets = {}
+        for part in filter(None, (piece.strip() for piece in os.getenv('MEMORY_BUDGETS', '').split(','))):
+            name, _, limit = part.partition('=')
+            budgets[name.strip()] = float(limit)
+        return cls(enabled=os.getenv('MEMORY_PROFILE', '') not in ('', '0', 'false'), budgets=budgets)
+
+    # ___________________ Measuring ___________________ #
+
+    @property
+    def __open(self) -> list:
+        if not hasattr(self.__local, 'stages'):
+            self.__local.stages = []
+        return self.__local.stages
+
+    @contextmanager
+    def stage(self, name:str):
+        if not self.enabled:
+            yield
+            return
+
+        with self.__lock:
+            self.__active += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self.__started_tracing = True
+
+        self.__fold_peak()
+        before = tracemalloc.take_snapshot().filter_traces(self.__ignore) if self.top else None
+        record = {
+            'stage': name,
+            'depth': len(self.__open),
+            'started': time.perf_counter(),
+            'traced_start': tracemalloc.get_traced_memory()[0],
+            'peak': 0,
+            'rss_start': rss_bytes(),
+        }
+        self.__open.append(record)
+        try:
+            yield
+        finally:
+            self.__fold_peak()
+            self.__open.pop()
+            self.__finish(record, before)
+
+    def __fold_peak(self):
+        # tracemalloc has one peak counter; credit it to every open stage of this thread before resetting it.
+        # Stages open on other threads lose what they peaked at so far (see the module comment)
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self.__open:
+            record['peak'] = max(record['peak'], peak)
+        tracemalloc.reset_peak()
+
+    def __finish(self, record:dict, before):
+        traced_end = tracemalloc.get_traced_memory()[0]
+        rss_end = rss_bytes()
+
+        result = {
+            'stage': record['stage'],
+            'depth': record['depth'],
+            'duration_s': time.perf_counter() - record['started'],
+            'peak_mb': max(record['peak'] - record['traced_start'], 0) / MB,
+            'traced_delta_mb': (traced_end - record['traced_start']) / MB,
+            'rss_delta_mb': (rss_end - record['rss_start']) / MB if rss_end is not None and record['rss_start'] is not None else None,
+            'rss_mb': rss_end / MB if rss_end is not None else None,
+            'top': [],
+        }
+        if before is not None:
+            after = tracemalloc.take_snapshot().filter_traces(self.__ignore)
+            for difference in after.compare_to(before, 'lineno')[:self.top]:
+                if difference.size_diff <= 0:
+                    continue
+                frame = difference.traceback[0]
+                result['top'].append({
+                    'site': f"{frame.filename}:{frame.lineno}",
+                    'size_kb': difference.size_diff / 1024,
+                    'count': difference.count_diff,
+                })
+        self.records.append(result)
+
+        budget = self.budgets.get(record['stage'])
+        if budget is not None and result['peak_mb'] > budget:
+            warnings.warn(
+                f"Stage '{record['stage']}' peaked at {result['peak_mb']:.1f} MB, over its {budget:.1f} MB budget",
+                MemoryBudgetWarning,
+                stacklevel=3
+            )
+
+        with self.__lock:
+            self.__active -= 1
+            if not self.__active and self.__started_tracing:
+                tracemalloc.stop()
+                self.__started_tracing = False
+
+    # ___________________ Reporting ___________________ #
+
+    def summary(self) -> dict:
+        '''
+        Worst peak, total traced growth and run count per stage.
+        '''
+        stages = {}
+        for record in self.records:
+            entry = stages.setdefault(record['stage'], {'runs': 0, 'peak_mb': 0.0, 'traced_delta_mb': 0.0})
+            entry['runs'] += 1
+            entry['peak_mb'] = max(entry['peak_mb'], record['peak_mb'])
+            entry['traced_delta_mb'] += record['traced_delta_mb']
+            if record['stage'] in self.budgets:
+                entry['budget_mb'] = self.budgets[record['stage']]
+        return stages
+
+    def save(self, path:str):
+        write_json_atomic(path, {'summary': self.summary(), 'records': self.records})
+
+    def print_report(self):
+        for record in self.records:
+            rss = f"{record['rss_delta_mb']:+.1f}" if record['rss_delta_mb'] is not None else "n/a"
+            print(f"{'  ' * record['depth']}{record['stage']}: peak {record['peak_mb']:.2f} MB, "
+                  f"traced {record['traced_delta_mb']:+.2f} MB, rss {rss} MB, {record['duration_s'] * 1000:.1f} ms")
+            for site in record['top'][:5]:
+                print(f"{'  ' * record['depth']}    {site['size_kb']:>10.1f} KB  {site['count']:>7}  {site['site']}")
+
+    def reset(self):
+        self.records.clear()
+
+
+# The profiler the pipeline stages report to
+PROFILER = MemoryProfiler.from_env()
+
+
+def stage(name:str):
+    '''
+    Marks a pipeline stage for the shared profiler. A no-op unless profiling is enabled.
+    '''
+    return PROFILER.stage(name)
+
+
+def enable_profiling(budgets:dict = None, top:int = 10) -> MemoryProfiler:
+    '''
+    Turns the shared profiler on (clearing earlier records) and returns it.
+    '''
+    PROFILER.enabled = True
+    PROFILER.top = top
+    if budgets is not None:
+        PROFILER.budgets = dict(budgets)
+    PROFILER.reset()
+    return PROFILER
@@ -0,0 +1,49 @@
+import threading
+import time
+
+
+class RateLimiter:
+    '''
+    Thread-safe token bucket. Each request takes one token; tokens refill at `rate` per second
+    up to `burst`. Used to keep concurrent API calls under a provider's requests-per-second limit.
+    '''
+
+    def __init__(self, rate:float, burst:int = 1, clock=time.monotonic) -> None:
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+
+        self.__tokens = float(self.burst)
+        self.__updated = clock()
+        self.__lock = threading.Lock()
+
+    def acquire(self, timeout:float = None, cancel_event:threading.Event = None) -> bool:
+        '''
+        Blocks until a token is available. Returns False if `timeout` passes or `cancel_event` is set first.
+        '''
+        deadline = None if timeout is None else self.clock() + timeout
+
+        while True:
+            with self.__lock:
+                now = self.clock()
+                self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+                self.__updated = now
+
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return True
+                wait = (1 - self.__tokens) / self.rate
+
+            if deadline is not None:
+                if now >= deadline:
+                    return False
+                wait = min(wait, deadline - now)
+
+            if cancel_event is not None:
+                if cancel_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
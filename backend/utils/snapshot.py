@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import time
+
+# Bump whenever the layout of a snapshot changes; older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+
+
+def write_json_atomic(path:str, data) -> None:
+    '''
+    Writes JSON to a temporary file in the same directory and renames it over `path`,
+    so readers only ever see the old file or the complete new one.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as file:
+            json.dump(data, file, default=str)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_snapshot(path:str, state:dict, version:int = SNAPSHOT_VERSION) -> None:
+    '''
+    Saves a versioned snapshot of computed state.
+    '''
+    write_json_atomic(path, {"version": version, "saved_at": time.time(), "state": state})
+
+
+def read_snapshot(path:str, version:int = SNAPSHOT_VERSION):
+    '''
+    Loads a snapshot written by `write_snapshot`.
+
+    Returns:
+    - (state, saved_at), or (None, None) if the file is missing, unreadable or from another version
+    '''
+    if not path or not os.path.exists(path):
+        return None, None
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            snapshot = json.load(file)
+    except (OSError, ValueError) as error:
+        print(f"Could not read snapshot {path}. Error: {error}")
+        return None, None
+
+    if snapshot.get("version") != version:
+        print(f"Ignoring snapshot {path}: version {snapshot.get('version')} != {version}")
+        return None, None
+
+    return snapshot.get("state"), snapshot.get("saved_at")
@@ -0,0 +1,331 @@
+
+# _____________________________________ Stand-ins _____________________________________ #
+
+# Local replacements for MySQL and the market-data providers, so Commander and the API can be exercised
+# (load tests, demos) without a database server or API keys. Both inject a configurable latency.
+#
+# StandInDatabase understands the statements Connection issues for its CRUD and bar paths: CREATE TABLE,
+# SHOW TABLES, INSERT (multi-row, with ON DUPLICATE KEY UPDATE), SELECT with simple AND-ed conditions, ORDER BY and LIMIT,
+# DELETE and DROP TABLE. Anything else only costs its latency and returns no rows: the aggregate SQL
+# (summary INSERT ... SELECT, the UNION ALL window statistics), ALTER and LOAD DATA. Load test numbers for
+# operations built on those statements measure latency only, not the server's work; they are counted in
+# `unmodeled`. There are no transactions: writes are visible as soon as they are executed.
+# Like a real session, a connection runs one statement at a time: a statement sent while another one on
+# the same connection is still running fails with "Commands out of sync", so unsynchronized sharing shows up.
+
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+import numpy as np
+
+from backend.analysis.parallel import ticker_details, STOCK_COLUMNS, CRYPTO_COLUMNS
+
+CREATE = re.compile(r"^\s*CREATE TABLE IF NOT EXISTS (\w+)\s*\(", re.IGNORECASE)
+INSERT = re.compile(r"^\s*INSERT INTO (\w+) \(([^)]*)\) VALUES \([^)]*\)(?:\s*,\s*\([^)]*\))*(\s+ON DUPLICATE KEY UPDATE .*)?$", re.IGNORECASE | re.DOTALL)
+SELECT = re.compile(r"^\s*SELECT (.+?) FROM (\w+)(?: WHERE (.+?))?(?: ORDER BY (\w+))?(?: LIMIT (%s|\d+))?\s*$", re.IGNORECASE | re.DOTALL)
+DELETE = re.compile(r"^\s*DELETE FROM (\w+)(?: WHERE (.+))?$", re.IGNORECASE | re.DOTALL)
+DROP = re.compile(r"^\s*DROP TABLE IF EXISTS (\w+)", re.IGNORECASE)
+SHOW = re.compile(r"^\s*SHOW TABLES", re.IGNORECASE)
+CONDITION = re.compile(r"^(\w+)\s*(=|>=|<=|<|>)\s*%s$|^(\w+) IN \(([%s, ]+)\)$|^(\w+) IS NOT NULL$", re.IGNORECASE)
+NOT_COLUMNS = {'PRIMARY', 'UNIQUE', 'KEY', 'INDEX', 'CONSTRAINT'}
+
+
+class StandInDatabase:
+    '''
+    In-memory "server" shared by every connection made through `connect`.
+
+    Parameters:
+    - latency (float): Seconds every statement (or executemany batch) takes
+    - jitter (float): Extra random seconds, uniform in [0, jitter]
+    - failure_rate (float): Share of statements that fail with a lost-connection error
+    - seed (int): Seed for jitter and failures
+
+    Example:
+    - database = StandInDatabase(latency=0.002)
+    - Connection(connector=database.connect)
+    '''
+
+    def __init__(self, latency:float = 0.0, jitter:float = 0.0, failure_rate:float = 0.0, seed:int = None) -> None:
+
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+        self.tables:dict = {}
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.unmodeled = 0 # statements that only cost latency, see the module comment
+
+    def connect(self, **kwargs):
+        return StandInConnection(self)
+
+    # ___________________ Execution ___________________ #
+
+    def delay(self):
+        with self.lock:
+            self.statements += 1
+            pause = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self.failure_rate and self.random.random() < self.failure_rate
+        if pause:
+            time.sleep(pause)
+        if failed:
+            raise mysql.connector.OperationalError(msg="Lost connection to stand-in server", errno=2013)
+
+    def run(self, query:str, values:list):
+        '''
+        Executes one statement. Returns (rows or None, rowcount).
+        '''
+        query = query.strip()
+        with self.lock:
+            if SHOW.match(query):
+                return [(name,) for name in self.tables], len(self.tables)
+
+            match = CREATE.match(query)
+            if match:
+                if match.group(1) not in self.tables:
+                    self.tables[match.group(1)] = self.__table_definition(query[match.end():])
+                return None, 0
+
+            match = DROP.match(query)
+            if match:
+                return None, int(self.tables.pop(match.group(1), None) is not None)
+
+            match = INSERT.match(query)
+            if match:
+                # one statement may carry many rows: VALUES (...), (...)
+                columns = [column.strip() for column in match.group(2).split(',')]
+                return None, sum(
+                    self.__insert(match.group(1), columns, values[start:start + len(columns)], bool(match.group(3)))
+                    for start in range(0, max(len(values), 1), len(columns))
+                )
+
+            match = SELECT.match(query)
+            if match and 'UNION' not in query.upper() and '(' not in match.group(1):
+                limit = match.group(5) and int(values.pop() if match.group(5) == '%s' else match.group(5))
+                return self.__select(match.group(2), match.group(1), match.group(3), values, match.group(4), limit), None
+
+            match = DELETE.match(query)
+            if match:
+                return None, self.__delete(match.group(1), match.group(2), values)
+
+            # statements the stand-in does not model (aggregate refreshes, ALTER, LOAD DATA) succeed without effect
+            self.unmodeled += 1
+        return ([] if query.upper().startswith(('SELECT', '(')) else None), 0
+
+    # ___________________ Support ___________________ #
+
+    def __table_definition(self, body:str) -> dict:
+        # the column list ends at the parenthesis matching the one CREATE opened
+        depth, end = 1, 0
+        for end, character in enumerate(body):
+            depth += {'(': 1, ')': -1}.get(character, 0)
+            if depth == 0:
+                break
+        definitions = [line.strip().rstrip(',') for line in body[:end].splitlines() if line.strip()]
+
+        columns, key, auto = [], [], None
+        for definition in definitions:
+            name = definition.split()[0]
+            if name.upper() in NOT_COLUMNS:
+                if definition.upper().startswith('PRIMARY KEY'):
+                    key = [column.strip() for column in definition[definition.index('(') + 1:definition.rindex(')')].split(',')]
+                continue
+            columns.append(name)
+            if 'PRIMARY KEY' in definition.upper():
+                key = [name]
+            if 'AUTO_INCREMENT' in definition.upper():
+                auto = name
+        return {'columns': columns, 'key': key, 'auto': auto, 'next_id': 1, 'rows': {}}
+
+    def __table(self, name:str) -> dict:
+        table = self.tables.get(name)
+        if table is None:
+            raise mysql.connector.ProgrammingError(msg=f"Table 'Fullstack.{name}' doesn't exist", errno=1146)
+        return table
+
+    def __insert(self, name:str, columns:list, values:list, upsert:bool) -> int:
+        table = self.__table(name)
+        row = [None] * len(table['columns'])
+        for column, value in zip(columns, values):
+            row[table['columns'].index(column)] = value
+        if table['auto'] and row[table['columns'].index(table['auto'])] is None:
+            row[table['columns'].index(table['auto'])] = table['next_id']
+            table['next_id'] += 1
+
+        key = tuple(row[table['columns'].index(column)] for column in table['key']) or (id(row),)
+        if key in table['rows'] and not upsert:
+            raise mysql.connector.IntegrityError(msg=f"Duplicate entry '{key}' for key 'PRIMARY'", errno=1062)
+        table['rows'][key] = row
+        return 1
+
+    def __matching(self, table:dict, where:str, values:list) -> list:
+        tests = []
+        values = list(values)
+        for condition in (part.strip() for part in re.split(r"\s+AND\s+", where or "", flags=re.IGNORECASE) if part.strip()):
+            match = CONDITION.match(condition)
+            if not match:
+                raise mysql.connector.ProgrammingError(msg=f"Stand-in cannot evaluate '{condition}'", errno=1064)
+            if match.group(1):
+                position, operator, value = table['columns'].index(match.group(1)), match.group(2), values.pop(0)
+                tests.append(lambda row, p=position, o=operator, v=value: row[p] is not None and {
+                    '=': row[p] == v, '>=': row[p] >= v, '<=': row[p] <= v, '<': row[p] < v, '>': row[p] > v
+                }[o])
+            elif match.group(3):
+                count = match.group(4).count('%s')
+                options, values = set(values[:count]), values[count:]
+                tests.append(lambda row, p=table['columns'].index(match.group(3)), o=options: row[p] in o)
+            else:
+                tests.append(lambda row, p=table['columns'].index(match.group(5)): row[p] is not None)
+        return [row for row in table['rows'].values() if all(test(row) for test in tests)]
+
+    def __select(self, name:str, projection:str, where:str, values:list, order:str, limit:int = None) -> list:
+        table = self.__table(name)
+        rows = self.__matching(table, where, values)
+        if order:
+            position = table['columns'].index(order)
+            rows.sort(key=lambda row: row[position])
+        if limit is not None:
+            rows = rows[:limit]
+        if projection.strip() == '*':
+            return [tuple(row) for row in rows]
+        positions = [table['columns'].index(column.strip()) for column in projection.split(',')]
+        return [tuple(row[position] for position in positions) for row in rows]
+
+    def __delete(self, name:str, where:str, values:list) -> int:
+        table = self.__table(name)
+        doomed = {id(row) for row in self.__matching(table, where, values)}
+        table['rows'] = {key: row for key, row in table['rows'].items() if id(row) not in doomed}
+        return len(doomed)
+
+
+class StandInCursor:
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.database = connection.database
+        self.rows = None
+        self.position = 0
+        self.rowcount = -1
+        self.with_rows = False
+
+    def execute(self, query, values=()):
+        with self.connection.session():
+            self.database.delay()
+            rows, count = self.database.run(query, list(values or ()))
+        self.rows, self.position = rows, 0
+        self.with_rows = rows is not None
+        self.rowcount = len(rows) if rows is not None else count
+
+    def executemany(self, query, seq_values):
+        with self.connection.session():
+            self.database.delay()
+            self.rowcount = sum(self.database.run(query, list(values))[1] for values in seq_values)
+        self.rows, self.with_rows = None, False
+
+    def fetchmany(self, size:int = 1):
+        chunk = (self.rows or [])[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows or []))
+
+    def close(self):
+        self.rows = None
+
+
+class StandInConnection:
+
+    def __init__(self, database:StandInDatabase) -> None:
+        self.database = database
+        self.open = True
+        self.__busy = threading.Lock()
+
+    def cursor(self, prepared:bool = False):
+        return StandInCursor(self)
+
+    @contextmanager
+    def session(self):
+        # one statement at a time per connection, like the MySQL protocol
+        if not self.__busy.acquire(blocking=False):
+            raise mysql.connector.InternalError(msg="Commands out of sync; you can't run this command now", errno=2014)
+        try:
+            yield
+        finally:
+            self.__busy.release()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect:bool = False):
+        self.database.delay()
+
+    def is_connected(self):
+        return self.open
+
+    def close(self):
+        self.open = False
+
+
+class StandInProvider:
+    '''
+    Synthetic market data shaped exactly like `fetch_stock_data` / `fetch_crypto_data` results.
+    Every call returns one more bar than the previous one, like a provider that keeps publishing.
+
+    Parameters:
+    - latency, jitter (float): Seconds every fetch takes (plus uniform [0, jitter])
+    - history (int): Bars in the first response
+    - seed (int): Seed for the random walks
+
+    Example:
+    - provider = StandInProvider(latency=0.2)
+    - Commander(stock_fetcher=provider.fetch_stocks, crypto_fetcher=provider.fetch_crypto)
+    '''
+
+    def __init__(self, latency:float = 0.0, jitter:float = 0.0, history:int = 240, seed:int = None) -> None:
+
+        self.latency = latency
+        self.jitter = jitter
+        self.history = history
+        self.rng = np.random.default_rng(seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def fetch_stocks(self, params:str) -> dict:
+        symbol = re.search(r"symbol=(\w+)", params or "")
+        return self.__details(symbol.group(1) if symbol else 'IBM', STOCK_COLUMNS, step=30 * 86_400, price=150.0)
+
+    def fetch_crypto(self, symbol:str, days:int = 30) -> dict:
+        return self.__details(symbol, CRYPTO_COLUMNS, step=86_400, price=40_000.0)
+
+    def __details(self, ticker:str, columns:list, step:int, price:float) -> dict:
+        with self.lock:
+            self.calls += 1
+            count = self.history + self.calls - 1
+            pause = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            close = price * np.exp(np.cumsum(self.rng.normal(0, 0.02, count)))
+            volume = self.rng.lognormal(14, 0.3, count)
+        if pause:
+            time.sleep(pause)
+
+        spread = np.abs(close) * 0.01
+        values = {'open': close - spread / 2, 'high': close + spread, 'low': close - spread, 'close': close}
+        for column in columns[4:]:
+            values[column] = volume if column != 'volumeto' else volume * close
+        bars = np.column_stack([values[column] for column in columns])
+
+        first = int(time.time()) // step * step - (count - 1) * step
+        details = ticker_details(ticker, bars, columns)
+        details['bars'] = [
+            {'time': first + position * step, **dict(zip(columns, (float(value) for value in row)))}
+            for position, row in enumerate(bars)
+        ]
+        return details